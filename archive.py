@@ -0,0 +1,96 @@
+# archive.py
+"""
+Архив прошедших событий.
+
+Прошедшие события раньше оставались в events навсегда: списки и
+event_recipients росли с каждым годом. Теперь ежедневная задача (после
+advance_all) переносит события старше ARCHIVE_AFTER_DAYS дней вместе с
+напоминаниями и получателями в events_archive, reminders_archive и
+event_recipients_archive, а из рабочих таблиц их удаляет — с расписанием и
+неотправленными уведомлениями (repository.delete_events).
+
+Повторяющееся событие хранит в event_date ближайшее вхождение, поэтому в
+архив оно попадает только когда серия закончилась (repeat_until прошёл).
+
+Перенос идёт порциями по ARCHIVE_CHUNK событий, каждая в своей транзакции:
+фиксированное число запросов на порцию, и поток-писатель БД не занят надолго
+даже при первой архивации многолетней истории.
+
+Списки событий показывают только предстоящие; архив — отдельный список
+(archive_page), по индексу (event_date, id) таблицы events_archive.
+"""
+import os
+from datetime import date, timedelta
+
+from sqlalchemy import and_, insert, or_, select
+
+import reminders
+import repository
+from models import (
+    SessionLocal, User, Event, Reminder, event_recipients,
+    EventArchive, ReminderArchive, event_recipients_archive,
+)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '0'))  # 0 — всё, что раньше сегодняшнего дня
+ARCHIVE_CHUNK      = int(os.getenv('ARCHIVE_CHUNK', '500'))
+
+_archive = EventArchive.__table__
+
+
+def cutoff(today: date) -> date:
+    """События раньше этой даты уходят в архив."""
+    return today - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+
+def past_events(before: date):
+    """Условие «событие прошло»: разовое — по дате, повторяющееся — после конца серии."""
+    return and_(
+        Event.event_date < before,
+        or_(Event.repeat.is_(None), and_(Event.repeat_until.isnot(None), Event.repeat_until < before)),
+    )
+
+
+def archive_chunk(before: date, limit: int = ARCHIVE_CHUNK, now=None) -> int:
+    """Переносит в архив до limit прошедших событий одной транзакцией; возвращает их число."""
+    now = now or reminders.utc_now()
+    session = SessionLocal()
+    rows = session.execute(
+        select(Event.id, Event.title, Event.description, Event.event_date, Event.creator_id,
+               User.full_name, Event.repeat, Event.repeat_every, Event.repeat_anchor, Event.repeat_until)
+        .outerjoin(User, User.id == Event.creator_id)
+        .where(past_events(before))
+        .order_by(Event.event_date, Event.id)
+        .limit(limit)
+    ).all()
+    if not rows:
+        session.close()
+        return 0
+
+    evt_ids = [r.id for r in rows]
+    archive_ids = dict(session.execute(
+        insert(_archive).returning(_archive.c.event_id, _archive.c.id),
+        [{
+            'event_id': r.id, 'title': r.title, 'description': r.description, 'event_date': r.event_date,
+            'creator_id': r.creator_id, 'creator_name': r.full_name, 'repeat': r.repeat,
+            'repeat_every': r.repeat_every, 'repeat_anchor': r.repeat_anchor,
+            'repeat_until': r.repeat_until, 'archived_at': now,
+        } for r in rows],
+    ).all())
+
+    kept = session.execute(
+        select(Reminder.event_id, Reminder.interval_days).where(Reminder.event_id.in_(evt_ids))
+    ).all()
+    if kept:
+        session.execute(insert(ReminderArchive.__table__), [
+            {'archive_id': archive_ids[eid], 'interval_days': days} for eid, days in kept
+        ])
+    links = session.execute(select(event_recipients).where(event_recipients.c.event_id.in_(evt_ids))).all()
+    if links:
+        session.execute(insert(event_recipients_archive), [
+            {'archive_id': archive_ids[eid], 'user_id': uid} for eid, uid in links
+        ])
+
+    repository.delete_events(session, evt_ids)
+    session.commit()
+    session.close()
+    return len(rows)
@@ -0,0 +1 @@
+# benchmarks — офлайн-замеры производительности бота (без сети)
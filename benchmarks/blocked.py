@@ -0,0 +1,134 @@
+# benchmarks/blocked.py
+"""
+Рассылки пользователям, заблокировавшим бота (см. reachability.py).
+
+--users пользователей, из них --blocked заблокировали бота: FakeBot отвечает
+им Forbidden. Каждый «день» всем получателям из
+repository.notification_targets() ставится по два уведомления — сразу и
+через секунду — и очередь отправляется через outbox.drain(). Первое же
+Forbidden помечает получателя недоступным и отменяет его второе
+уведомление; со второго дня заблокировавшие в рассылки не попадают. На
+--return-day один из них снова пишет боту и должен снова получать
+уведомления. Код возврата 1 — если после первого дня остались запросы впустую.
+
+    python -m benchmarks.blocked --users 2000 --blocked 0.1 --days 3
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import timedelta
+
+from benchmarks.common import fresh_db
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/botlaba_blocked.db', help="файл SQLite, пересоздаётся")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--blocked', type=float, default=0.1, help="доля заблокировавших бота")
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--return-day', type=int, default=3, help="в какой день один из них снова пишет")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+fresh_db(ARGS)
+
+from sqlalchemy import func, select
+from telegram.error import Forbidden
+
+import metrics
+import outbox
+import reachability
+import repository
+from broadcast import Broadcaster
+from cache import user_cache
+from migrations import run_migrations
+from models import engine, SessionLocal, User
+from reminders import utc_now
+from benchmarks.fakes import FakeBot, FakeContext, FakeUpdate
+from benchmarks.seed import seed
+
+
+class BlockingBot(FakeBot):
+    """FakeBot, которому часть чатов отвечает «бот заблокирован»."""
+
+    def __init__(self, blocked: set):
+        super().__init__(latency=0, enforce=False)
+        self.blocked = blocked
+        self.wasted = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.blocked:
+            self.wasted += 1
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        await super().send_message(chat_id, text, **kwargs)
+
+
+def targets() -> list:
+    session = SessionLocal()
+    rows = repository.notification_targets(session)
+    session.close()
+    return [tg for _, tg, *_ in rows]
+
+
+def unreachable() -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(User).where(User.unreachable_at.isnot(None))).scalar()
+
+
+def cancelled() -> float:
+    return metrics.REGISTRY.counters.get(("bot_outbox_messages_total", (("result", "cancelled"),)), 0)
+
+
+async def run_day(day: int, bot: BlockingBot) -> dict:
+    chats = targets()
+    now = utc_now()
+    outbox.enqueue_all([
+        outbox.message(f"blocked:{day}:{n}:{tg}", tg, f"🔔 Уведомление {n}", deliver_at=now + timedelta(seconds=n))
+        for tg in chats for n in (0, 1)
+    ])
+    wasted, sent, before = bot.wasted, len(bot.sent), cancelled()
+    await outbox.drain(bot, limit=len(chats) * 2)
+    await asyncio.sleep(1.1)
+    await outbox.drain(bot, limit=len(chats) * 2)
+    return {
+        'targets': len(chats),
+        'sent': len(bot.sent) - sent,
+        'wasted': bot.wasted - wasted,
+        'cancelled': cancelled() - before,
+        'unreachable': unreachable(),
+    }
+
+
+async def main() -> int:
+    logging.disable(logging.WARNING)  # «Не доставлено в чат ...» на каждого заблокировавшего
+    run_migrations()
+    seed(ARGS.users, 0, 0, 0, ["доцент", "профессор"])
+    user_cache.invalidate()
+    step = max(1, round(1 / ARGS.blocked)) if ARGS.blocked else ARGS.users + 1
+    blocked = set(range(2, ARGS.users + 1, step))
+    returning = min(blocked) if blocked else None
+    bot = BlockingBot(blocked)
+    outbox.broadcaster = Broadcaster(global_rate=100_000, per_chat_rate=100_000)
+
+    print(f"{ARGS.users} пользователей, заблокировали бота {len(blocked)}")
+    print(f"{'день':>4} {'получателей':>11} {'доставлено':>10} {'впустую':>8} {'отменено':>8} {'недоступных':>11}")
+    ok = True
+    for day in range(1, ARGS.days + 1):
+        if day == ARGS.return_day and returning is not None:
+            bot.blocked.discard(returning)
+            await reachability.check(FakeUpdate(returning, "Меню"), FakeContext())
+        r = await run_day(day, bot)
+        print(f"{day:>4} {r['targets']:>11} {r['sent']:>10} {r['wasted']:>8} {r['cancelled']:>8g} {r['unreachable']:>11}")
+        if day > 1:
+            ok &= r['wasted'] == 0
+        if day >= ARGS.return_day and returning is not None:
+            ok &= returning in {chat for _, chat in bot.sent[-r['sent']:]} if r['sent'] else False
+    print("OK" if ok else "ПЛОХО: недоступные получатели всё ещё в рассылках или вернувшийся пропущен")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
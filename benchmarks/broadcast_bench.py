@@ -0,0 +1,28 @@
+# benchmarks/broadcast_bench.py
+"""
+Замер рассылки на FakeBot: скорость и соблюдение лимитов.
+
+    python -m benchmarks.broadcast_bench --recipients 2000 --latency 0.05
+"""
+import argparse
+import asyncio
+
+from broadcast import Broadcaster, GLOBAL_RATE
+from benchmarks.fakes import FakeBot
+
+
+async def run(recipients: int, latency: float) -> None:
+    bot = FakeBot(latency=latency)
+    report = await Broadcaster().broadcast(bot, range(1, recipients + 1), "test")
+    peak = bot.max_per_second()
+    print(f"Отчёт: {report}")
+    print(f"Пик за 1 с: {peak} (лимит {GLOBAL_RATE}), RetryAfter от сервера: {bot.flood_errors}")
+    print("Лимиты соблюдены" if peak <= GLOBAL_RATE and not bot.flood_errors else "ЛИМИТ НАРУШЕН")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipients', type=int, default=600)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args.recipients, args.latency))
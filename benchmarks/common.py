@@ -0,0 +1,21 @@
+# benchmarks/common.py
+"""
+Общая подготовка окружения для сценариев benchmarks/*.
+
+Вызывается до импорта models и bot: движок БД создаётся при импорте по
+DATABASE_URL.
+"""
+import os
+
+
+def use_db(path: str, fresh: bool = False) -> None:
+    """Направить бота на файл SQLite path; fresh — пересоздать его пустым."""
+    if fresh and os.path.exists(path):
+        os.remove(path)
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    os.environ.setdefault('ADMIN_TELEGRAM_ID', '1')
+
+
+def fresh_db(args) -> None:
+    """Пустая БД в args.db — для сценариев, которые сами засевают данные."""
+    use_db(args.db, fresh=True)
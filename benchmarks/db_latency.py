@@ -0,0 +1,106 @@
+# benchmarks/db_latency.py
+"""
+Задержка хэндлеров при параллельных апдейтах: запросы в event loop против пула.
+
+Хэндлер start вызывается конкурентно, пока фоновые задачи выполняют медленные
+записи (--write-delay имитирует медленный диск). Режим «inline» — как было до
+db.run_db: синхронный запрос прямо в корутине.
+
+    python -m benchmarks.db_latency --updates 500 --writers 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault('ADMIN_TELEGRAM_ID', '1')
+
+import bot
+import db
+import models
+from benchmarks.fakes import FakeContext, FakeUpdate
+
+
+async def _inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def _slow_write(n: int, delay: float) -> None:
+    session = models.SessionLocal()
+    session.add(models.User(
+        telegram_id=10_000_000 + n, full_name=f"Writer {n}",
+        position="ассистент", birth_date=date(1990, 1, 1),
+    ))
+    session.flush()
+    time.sleep(delay)  # «медленный диск» внутри транзакции
+    session.commit()
+    session.close()
+
+
+async def run_mode(mode: str, updates: int, writers: int, delay: float, gap: float) -> list[float]:
+    """
+    Апдейты приходят каждые gap секунд независимо от того, успел ли бот
+    ответить на предыдущие; задержка считается от момента прихода.
+    """
+    if mode == 'pool':
+        bot.run_db, bot.run_db_write = db.run_db, db.run_db_write
+    else:
+        bot.run_db = bot.run_db_write = _inline
+    latencies = []
+    write_every = max(1, updates // writers)
+
+    async def one_update(i: int, arrived: float):
+        await bot.start(FakeUpdate(1 + i % 100), FakeContext())
+        latencies.append(time.perf_counter() - arrived)
+
+    tasks = []
+    for i in range(updates):
+        arrived = time.perf_counter()
+        if i % write_every == 0:
+            tasks.append(asyncio.create_task(
+                bot.run_db_write(_slow_write, hash((mode, i)) & 0xFFFFFF, delay)
+            ))
+        tasks.append(asyncio.create_task(one_update(i, arrived)))
+        await asyncio.sleep(gap)
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=500)
+    parser.add_argument('--writers', type=int, default=20)
+    parser.add_argument('--write-delay', type=float, default=0.05)
+    parser.add_argument('--gap', type=float, default=0.002, help="интервал между апдейтами, с")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(models.engine)
+    session = models.SessionLocal()
+    if not session.query(models.User).count():
+        session.add_all(
+            models.User(telegram_id=i, full_name=f"User {i}", position="доцент",
+                        birth_date=date(1980, 1, 1 + i % 28))
+            for i in range(1, 101)
+        )
+        session.commit()
+    session.close()
+
+    for mode in ('inline', 'pool'):
+        lat = asyncio.run(run_mode(mode, args.updates, args.writers, args.write_delay, args.gap))
+        print(
+            f"{mode:>6}: p50 {statistics.median(lat) * 1000:7.1f} мс, "
+            f"p99 {percentile(lat, 99) * 1000:7.1f} мс, max {max(lat) * 1000:7.1f} мс"
+        )
+
+
+if __name__ == '__main__':
+    main()
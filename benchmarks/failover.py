@@ -0,0 +1,155 @@
+# benchmarks/failover.py
+"""
+Проверка выбора ведущего на нескольких локальных процессах с общей БД.
+
+Запускает --instances процессов, каждый из которых крутит leader.Leadership
+так же, как бот (tick каждые LEASE_RENEW секунд), и сообщает о своём
+статусе. Затем --kills раз убивает текущего ведущего (SIGKILL — без
+освобождения аренды) и замеряет, через сколько секунд его место займёт
+другой. Проверяется, что два ведущих никогда не существовали одновременно.
+
+    python -m benchmarks.failover --db /tmp/failover.db --instances 3 --ttl 3 --renew 1
+    DATABASE_URL=postgresql://... python -m benchmarks.failover
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/botlaba_failover.db', help="файл SQLite, если не задан DATABASE_URL")
+    parser.add_argument('--instances', type=int, default=3)
+    parser.add_argument('--kills', type=int, default=3)
+    parser.add_argument('--ttl', type=float, default=3.0)
+    parser.add_argument('--renew', type=float, default=1.0)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{ARGS.db}")
+os.environ['LEASE_TTL'] = str(ARGS.ttl)
+os.environ['LEASE_RENEW'] = str(ARGS.renew)
+
+
+def child() -> None:
+    """Один «экземпляр бота»: печатает JSON-строку после каждого tick."""
+    import asyncio
+    import leader
+
+    async def loop():
+        while True:
+            await leader.leadership.tick()
+            # до какого момента (по часам) этот процесс считает себя ведущим
+            left = leader.leadership.valid_until - time.monotonic()
+            print(json.dumps({
+                'pid': os.getpid(), 't': time.time(),
+                'until': time.time() + left if left > 0 else None,
+            }), flush=True)
+            await asyncio.sleep(ARGS.renew)
+
+    asyncio.run(loop())
+
+
+class Cluster:
+    def __init__(self):
+        self.procs = {}
+        self.leader_spans = {}        # pid -> [[начало, конец], ...]
+        self.lock = threading.Lock()
+
+    def spawn(self) -> None:
+        cmd = [sys.executable, '-m', 'benchmarks.failover', '--child',
+               '--ttl', str(ARGS.ttl), '--renew', str(ARGS.renew)]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        self.procs[proc.pid] = proc
+        threading.Thread(target=self._read, args=(proc,), daemon=True).start()
+
+    def _read(self, proc) -> None:
+        for line in proc.stdout:
+            status = json.loads(line)
+            with self.lock:
+                spans = self.leader_spans.setdefault(status['pid'], [])
+                if status['until'] is None:
+                    continue
+                if spans and spans[-1][1] >= status['t']:
+                    spans[-1][1] = status['until']      # продлил аренду
+                else:
+                    spans.append([status['t'], status['until']])
+
+    def current_leader(self):
+        now = time.time()
+        with self.lock:
+            for pid, spans in self.leader_spans.items():
+                if pid in self.procs and spans and spans[-1][0] <= now <= spans[-1][1]:
+                    return pid
+        return None
+
+    def overlaps(self) -> list:
+        with self.lock:
+            spans = sorted((s, e, pid) for pid, ss in self.leader_spans.items() for s, e in ss)
+        return [(a, b) for a, b in zip(spans, spans[1:]) if b[0] < a[1] and a[2] != b[2]]
+
+    def stop(self) -> None:
+        for proc in self.procs.values():
+            proc.kill()
+
+
+def wait_for(predicate, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.05)
+    return None
+
+
+def main():
+    from migrations import run_migrations
+    run_migrations()
+
+    cluster = Cluster()
+    for _ in range(ARGS.instances):
+        cluster.spawn()
+    try:
+        first = wait_for(cluster.current_leader, ARGS.ttl * 3)
+        print(f"{ARGS.instances} экземпляров, LEASE_TTL={ARGS.ttl} с, LEASE_RENEW={ARGS.renew} с")
+        print(f"Ведущий: {first}")
+
+        takeovers = []
+        for _ in range(ARGS.kills):
+            victim = cluster.current_leader()
+            if victim is None:
+                break
+            killed_at = time.time()
+            os.kill(victim, signal.SIGKILL)
+            del cluster.procs[victim]
+            cluster.spawn()  # «перезапуск» упавшего экземпляра
+            successor = wait_for(lambda: cluster.current_leader(), ARGS.ttl * 3)
+            if successor is None:
+                print(f"  {victim} убит, нового ведущего нет!")
+                break
+            with cluster.lock:
+                started = cluster.leader_spans[successor][-1][0]
+            takeovers.append(started - killed_at)
+            print(f"  {victim} убит → ведущий {successor} через {takeovers[-1]:.2f} с")
+            time.sleep(ARGS.renew * 2)
+
+        overlaps = cluster.overlaps()
+        if takeovers:
+            print(f"Переключение: среднее {sum(takeovers) / len(takeovers):.2f} с, "
+                  f"максимум {max(takeovers):.2f} с (не больше LEASE_TTL + LEASE_RENEW)")
+        print("Двух ведущих одновременно не было" if not overlaps else f"ПЕРЕСЕЧЕНИЯ: {overlaps}")
+        sys.exit(1 if overlaps or len(takeovers) < ARGS.kills else 0)
+    finally:
+        cluster.stop()
+
+
+if __name__ == '__main__':
+    child() if ARGS.child else main()
@@ -0,0 +1,153 @@
+# benchmarks/fakes.py
+"""Подставные объекты Telegram для замеров без сети."""
+import asyncio
+import time
+from collections import defaultdict, deque
+
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+
+
+class FakeBot:
+    """
+    Имитирует bot.send_message: ждёт latency секунд и записывает время отправки.
+    Если включён enforce, сам следит за лимитами Telegram и бросает RetryAfter.
+    """
+
+    def __init__(self, latency: float = 0.05, global_limit: int = 30,
+                 per_chat_interval: float = 1.0, enforce: bool = True):
+        self.latency = latency
+        self.global_limit = global_limit
+        self.per_chat_interval = per_chat_interval
+        self.enforce = enforce
+        self.sent = []                       # (monotonic, chat_id)
+        self.flood_errors = 0
+        self._window = deque()
+        self._last_by_chat = defaultdict(lambda: float('-inf'))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        now = time.monotonic()
+        if self.enforce:
+            while self._window and now - self._window[0] >= 1:
+                self._window.popleft()
+            too_fast = now - self._last_by_chat[chat_id] < self.per_chat_interval
+            if len(self._window) >= self.global_limit or too_fast:
+                self.flood_errors += 1
+                raise RetryAfter(1)
+            self._window.append(now)
+        self._last_by_chat[chat_id] = now
+        self.sent.append((now, chat_id))
+        await asyncio.sleep(self.latency)
+
+    def max_per_second(self) -> int:
+        """Максимум отправок в любом скользящем окне длиной 1 с."""
+        times = sorted(t for t, _ in self.sent)
+        best, left = 0, 0
+        for right, t in enumerate(times):
+            while t - times[left] >= 1:
+                left += 1
+            best = max(best, right - left + 1)
+        return best
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    """Сообщение пользователя; ответы бота складываются в replies."""
+
+    def __init__(self, text: str = ""):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class FakeCallbackQuery:
+    """Нажатие inline-кнопки; новые тексты сообщения складываются в edits."""
+
+    def __init__(self, user_id: int, data: str):
+        self.from_user = FakeUser(user_id)
+        self.data = data
+        self.edits = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+class FakeUpdate:
+    def __init__(self, user_id: int, text: str = "", callback_data: str = None):
+        self.effective_user = FakeUser(user_id)
+        self.message = FakeMessage(text)
+        self.callback_query = FakeCallbackQuery(user_id, callback_data) if callback_data else None
+
+    @property
+    def effective_message(self):
+        return self.message
+
+
+class FakeJob:
+    def __init__(self, data=None, name=None):
+        self.data = data
+        self.name = name
+
+
+class FakeJobQueue:
+    """Записывает запланированные задачи, но не запускает их."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def run_once(self, callback, when, data=None, name=None, **kwargs):
+        self.scheduled.append((callback, when, data, name))
+        return FakeJob(data, name)
+
+
+class FakeApplication:
+    def __init__(self):
+        self.job_queue = FakeJobQueue()
+
+
+class FakeContext:
+    """Минимальный ContextTypes.DEFAULT_TYPE для прямого вызова хэндлеров и задач."""
+
+    def __init__(self, bot=None, user_data=None, job=None, application=None, args=None):
+        self.bot = bot or FakeBot(latency=0, enforce=False)
+        self.args = args
+        self.user_data = user_data if user_data is not None else {}
+        self.job = job
+        self.application = application or FakeApplication()
+        self.job_queue = self.application.job_queue
+
+
+class OfflineBot(ExtBot):
+    """
+    Настоящий ExtBot, у которого запросы к Bot API не уходят в сеть: каждый
+    вызов ждёт latency секунд и возвращает правдоподобный ответ. Подходит для
+    прогона апдейтов через Application целиком.
+    """
+
+    def __init__(self, latency: float = 0.05):
+        super().__init__(token="123456:offline")
+        with self._unfrozen():
+            self.latency = latency
+            self.calls = []                  # (monotonic, метод, chat_id)
+
+    async def _do_post(self, endpoint, data, **kwargs):
+        if endpoint == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': "Bench", 'username': "bench_bot"}
+        await asyncio.sleep(self.latency)
+        chat_id = data.get('chat_id')
+        self.calls.append((time.monotonic(), endpoint, chat_id))
+        if endpoint in ('sendMessage', 'editMessageText'):
+            return {
+                'message_id': len(self.calls), 'date': int(time.time()),
+                'chat': {'id': chat_id or 0, 'type': 'private'}, 'text': data.get('text', ""),
+            }
+        return True
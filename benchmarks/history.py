@@ -0,0 +1,109 @@
+# benchmarks/history.py
+"""
+Списки событий при растущей истории и архивация (см. archive.py).
+
+Для каждого --years в БД кладётся --per-year прошедших событий за год
+(с напоминанием и --recipients получателями) и --upcoming предстоящих.
+Затем меряется первая страница списка событий (pagination.events_page) и
+«моих событий», архивируются прошедшие события — порциями, как ежедневная
+задача, — и списки меряются снова. Должны оставаться ровными и задержка
+списков, и размер рабочих таблиц.
+
+    python -m benchmarks.history --years 1 5 10 --per-year 5000
+"""
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import fresh_db
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/botlaba_history.db', help="файл SQLite, пересоздаётся")
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--per-year', type=int, default=5000)
+    parser.add_argument('--upcoming', type=int, default=200)
+    parser.add_argument('--recipients', type=int, default=10)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50, help="замеров на список")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+fresh_db(ARGS)
+
+from sqlalchemy import func, insert, select
+
+import archive
+import models
+from models import engine, Event, Reminder, event_recipients
+from migrations import run_migrations
+from pagination import events_page
+from benchmarks.seed import seed, _batches
+
+
+def fill(years: int) -> None:
+    """Пустые рабочие таблицы событий и история за years лет плюс предстоящие события."""
+    today = date.today()
+    with engine.begin() as conn:
+        for table in (event_recipients, Reminder.__table__, models.ReminderSchedule.__table__, Event.__table__,
+                      models.event_recipients_archive, models.ReminderArchive.__table__,
+                      models.EventArchive.__table__):
+            conn.execute(table.delete())
+        past = years * ARGS.per_year
+        total = past + ARGS.upcoming
+        days = [today - timedelta(days=1 + i * 365 * years // past) for i in range(past)]
+        days += [today + timedelta(days=i % 60) for i in range(ARGS.upcoming)]
+        for batch in _batches({'id': i + 1, 'title': f"Событие {i}", 'description': "Описание",
+                               'event_date': day, 'creator_id': 2 + i % (ARGS.users - 1)}
+                              for i, day in enumerate(days)):
+            conn.execute(insert(Event.__table__), batch)
+        for batch in _batches({'id': i, 'event_id': i, 'interval_days': 1} for i in range(1, total + 1)):
+            conn.execute(insert(Reminder.__table__), batch)
+        for batch in _batches({'event_id': i, 'user_id': 1 + (i + k) % ARGS.users}
+                              for i in range(1, total + 1) for k in range(ARGS.recipients)):
+            conn.execute(insert(event_recipients), batch)
+
+
+def timed(fn, *args, **kwargs) -> float:
+    """Медиана времени вызова, мс."""
+    samples = []
+    for _ in range(ARGS.repeat):
+        started = time.perf_counter()
+        fn(*args, **kwargs)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def sizes() -> tuple:
+    with engine.connect() as conn:
+        return tuple(conn.execute(select(func.count()).select_from(t)).scalar()
+                     for t in (Event.__table__, event_recipients))
+
+
+def main() -> None:
+    run_migrations()
+    seed(ARGS.users, 0, 0, 0, ["доцент", "профессор"])
+    print(f"{ARGS.per_year} прошедших событий в год, {ARGS.upcoming} предстоящих, "
+          f"по {ARGS.recipients} получателей; медиана из {ARGS.repeat}, мс")
+    print(f"{'лет':>4} {'этап':<10} {'events':>8} {'получатели':>10} {'список':>7} {'мои':>6} {'архивация, с':>13}")
+    for years in ARGS.years:
+        fill(years)
+        for stage in ("до", "после"):
+            elapsed = ""
+            if stage == "после":
+                started = time.perf_counter()
+                before = archive.cutoff(date.today())
+                while archive.archive_chunk(before) == archive.ARCHIVE_CHUNK:
+                    pass
+                elapsed = f"{time.perf_counter() - started:.1f}"
+            events, links = sizes()
+            listing = timed(events_page)
+            mine = timed(events_page, creator_id=2)
+            print(f"{years:>4} {stage:<10} {events:>8} {links:>10} {listing:>7.2f} {mine:>6.2f} {elapsed:>13}")
+
+
+if __name__ == '__main__':
+    main()
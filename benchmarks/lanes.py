@@ -0,0 +1,106 @@
+# benchmarks/lanes.py
+"""
+Задержка ответов пользователям во время большой рассылки.
+
+Broadcaster рассылает --recipients сообщений через FakeBot с лимитами
+Telegram, а параллельно «пользователи» жмут кнопки: --interactive-rate
+ответов в секунду в другие чаты. Режимы:
+
+    none    ответы идут мимо лимитера (как было): Telegram отвечает RetryAfter
+    fifo    общий бюджет без приоритетов: ответ ждёт в одной очереди с рассылкой
+    lanes   общий бюджет с полосами (broadcast.OutboundRateLimiter)
+
+Для каждого режима — p50/p99 задержки ответа, неудачные ответы, RetryAfter
+от «сервера», длительность рассылки и её доля бюджета.
+
+    python -m benchmarks.lanes --recipients 5000 --interactive-rate 3
+    python -m benchmarks.lanes --modes lanes --interactive-rate 40   # рассылка не должна встать
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+from telegram.error import RetryAfter
+
+from broadcast import BULK, Broadcaster, OutboundRateLimiter, PriorityLimiter
+from benchmarks.fakes import FakeBot
+
+INTERACTIVE_CHATS = 10_000_000      # id чатов, не пересекающиеся с рассылкой
+
+
+async def run(mode: str, args) -> dict:
+    bot = FakeBot(latency=args.latency, global_limit=args.rate)
+    limiter = PriorityLimiter(args.rate)
+    rate_limiter = OutboundRateLimiter(limiter)
+    broadcaster = Broadcaster(limiter=limiter)
+    rnd = random.Random(1)
+    latencies, failed = [], 0
+
+    async def reply(chat_id: int) -> None:
+        nonlocal failed
+        started = time.monotonic()
+        try:
+            if mode == 'none':
+                await bot.send_message(chat_id, "Меню")
+            elif mode == 'fifo':
+                await limiter.acquire(BULK)
+                await bot.send_message(chat_id, "Меню")
+            else:
+                await rate_limiter.process_request(
+                    callback=bot.send_message, args=(chat_id, "Меню"), kwargs={},
+                    endpoint='sendMessage', data={'chat_id': chat_id}, rate_limit_args=None,
+                )
+        except RetryAfter:
+            failed += 1
+            return
+        latencies.append(time.monotonic() - started)
+
+    async def users(stop: asyncio.Event) -> list:
+        tasks, n = [], 0
+        while not stop.is_set():
+            await asyncio.sleep(rnd.expovariate(args.interactive_rate))
+            tasks.append(asyncio.create_task(reply(INTERACTIVE_CHATS + n)))
+            n += 1
+        return tasks
+
+    stop = asyncio.Event()
+    load = asyncio.create_task(users(stop))
+    report = await broadcaster.broadcast(bot, range(1, args.recipients + 1), "🎂 День рождения")
+    stop.set()
+    await asyncio.gather(*await load)
+
+    latencies.sort()
+    return {
+        'p50': statistics.median(latencies) if latencies else 0.0,
+        'p99': latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else 0.0,
+        'replies': len(latencies) + failed,
+        'failed': failed,
+        'flood': bot.flood_errors,
+        'elapsed': report.elapsed,
+        'bulk_rate': report.sent / report.elapsed if report.elapsed else 0.0,
+    }
+
+
+async def main(args) -> None:
+    logging.disable(logging.WARNING)  # «Flood control: пауза ...» на каждый RetryAfter
+    print(f"Рассылка {args.recipients} получателям, лимит {args.rate}/с, "
+          f"ответов пользователям {args.interactive_rate}/с")
+    print(f"{'режим':<6} {'ответ p50, мс':>13} {'p99, мс':>8} {'ответов':>8} {'неудач':>7} "
+          f"{'RetryAfter':>10} {'рассылка, с':>11} {'рассылка/с':>10}")
+    for mode in args.modes:
+        r = await run(mode, args)
+        print(f"{mode:<6} {r['p50'] * 1000:>13.0f} {r['p99'] * 1000:>8.0f} {r['replies']:>8} {r['failed']:>7} "
+              f"{r['flood']:>10} {r['elapsed']:>11.1f} {r['bulk_rate']:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', type=int, default=5000)
+    parser.add_argument('--interactive-rate', type=float, default=3.0, help="ответов в секунду")
+    parser.add_argument('--rate', type=int, default=30, help="глобальный лимит, сообщений в секунду")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--modes', nargs='+', default=['none', 'fifo', 'lanes'])
+    asyncio.run(main(parser.parse_args()))
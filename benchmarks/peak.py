@@ -0,0 +1,126 @@
+# benchmarks/peak.py
+"""
+Пик ежедневной рассылки: все уведомления в одну секунду против окна доставки.
+
+Для --users получателей в outbox ставится по уведомлению со слотом
+delivery.slot_offset() внутри окна, затем очередь отправляется так же, как
+в боте: outbox.drain() каждые --tick секунд через настоящий Broadcaster и
+FakeBot с лимитами Telegram. --fail-rate — доля временных сетевых ошибок.
+Для каждого окна считаются: длительность, пик отправок в секунду,
+RetryAfter от «сервера», повторы через outbox и отставание доставки от
+слота (p50/p99).
+
+    python -m benchmarks.peak --users 1200 --windows 0 40 --fail-rate 0.02
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from benchmarks.common import use_db
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/botlaba_peak.db', help="файл SQLite")
+    parser.add_argument('--users', type=int, default=1200)
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 40], help="окна в секундах")
+    parser.add_argument('--tick', type=float, default=1.0, help="период outbox.drain(), секунд")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+use_db(ARGS.db)
+os.environ.setdefault('OUTBOX_BACKOFF_BASE', '2')
+
+from sqlalchemy import delete, func, select
+from telegram.error import TimedOut
+
+import delivery
+import metrics
+import outbox
+from broadcast import Broadcaster
+from migrations import run_migrations
+from models import engine, OutboxMessage
+from reminders import utc_now
+from benchmarks.fakes import FakeBot
+
+rnd = random.Random(42)
+
+
+class PeakBot(FakeBot):
+    """FakeBot, который запоминает момент доставки (UTC) и иногда теряет запрос."""
+
+    def __init__(self, fail_rate: float, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_rate = fail_rate
+        self.delivered = {}                  # chat_id -> naive UTC
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if rnd.random() < self.fail_rate:
+            await asyncio.sleep(self.latency)
+            raise TimedOut()
+        await super().send_message(chat_id, text, **kwargs)
+        self.delivered.setdefault(chat_id, utc_now())
+
+
+def pending() -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(OutboxMessage).where(OutboxMessage.next_attempt_at.isnot(None))
+        ).scalar()
+
+
+async def run(window: float) -> dict:
+    with engine.begin() as conn:
+        conn.execute(delete(OutboxMessage))
+    start = utc_now() + timedelta(seconds=1)
+    slots = {tg: start + timedelta(seconds=delivery.slot_offset(tg, window))
+             for tg in range(1_000_001, 1_000_001 + ARGS.users)}
+    outbox.enqueue_all([
+        outbox.message(f"peak:{window}:{tg}", tg, "🔔 Напоминание", deliver_at=at)
+        for tg, at in slots.items()
+    ])
+
+    bot = PeakBot(ARGS.fail_rate, latency=ARGS.latency)
+    outbox.broadcaster = Broadcaster()
+    retries = metrics.REGISTRY.counters.get(("bot_outbox_messages_total", (("result", "retry"),)), 0)
+    started = time.monotonic()
+    while await asyncio.to_thread(pending):
+        tick = time.monotonic()
+        await outbox.drain(bot)
+        await asyncio.sleep(max(0.0, ARGS.tick - (time.monotonic() - tick)))
+    elapsed = time.monotonic() - started
+
+    lags = sorted((bot.delivered[tg] - at).total_seconds() for tg, at in slots.items() if tg in bot.delivered)
+    return {
+        'elapsed': elapsed,
+        'peak': bot.max_per_second(),
+        'flood': bot.flood_errors,
+        'retries': metrics.REGISTRY.counters.get(("bot_outbox_messages_total", (("result", "retry"),)), 0) - retries,
+        'delivered': len(lags),
+        'p50': statistics.median(lags) if lags else 0.0,
+        'p99': lags[int(len(lags) * 0.99) - 1] if lags else 0.0,
+    }
+
+
+async def main():
+    logging.disable(logging.WARNING)  # отчёты рассылок и недоставленные чаты
+    run_migrations()
+    print(f"{ARGS.users} получателей, drain каждые {ARGS.tick} с, ошибки {ARGS.fail_rate:.0%}")
+    print(f"{'окно, с':>8} {'длит., с':>9} {'пик/с':>6} {'RetryAfter':>10} {'повторы':>8} "
+          f"{'доставлено':>10} {'лаг p50':>8} {'лаг p99':>8}")
+    for window in ARGS.windows:
+        r = await run(window)
+        print(f"{window:>8g} {r['elapsed']:>9.1f} {r['peak']:>6} {r['flood']:>10} {r['retries']:>8g} "
+              f"{r['delivered']:>10} {r['p50']:>8.1f} {r['p99']:>8.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+# benchmarks/queries.py
+"""Подсчёт SQL-запросов через события движка SQLAlchemy."""
+import threading
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """
+    Считает выполненные SQL-запросы (в любых потоках) на время блока with:
+
+        with QueryCounter(engine) as qc:
+            ...
+        print(qc.count, qc.statements)
+    """
+
+    def __init__(self, engine, keep_statements: bool = False):
+        self.engine = engine
+        self.keep_statements = keep_statements
+        self.count = 0
+        self.statements = []
+        self._lock = threading.Lock()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.count += 1
+            if self.keep_statements:
+                self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
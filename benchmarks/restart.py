@@ -0,0 +1,126 @@
+# benchmarks/restart.py
+"""
+Черновики событий переживают перезапуск бота (см. persistence.py).
+
+Настоящее приложение бота с OfflineBot проводит --drafts пользователей через
+создание события до выбора получателей (название, описание, периодичность,
+дата, повторение, отметка получателя) и останавливается. Затем поднимается
+новое приложение на той же БД, и каждый пользователь только жмёт «Готово».
+
+Печатается число SQL-записей во время диалогов (должно быть 0: хэндлеры не
+коммитят), число запросов финальной записи при остановке и сколько событий
+сохранено после перезапуска. Код возврата 1 — если черновики потерялись.
+
+    python -m benchmarks.restart --drafts 200
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import fresh_db
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/botlaba_restart.db', help="файл SQLite, пересоздаётся")
+    parser.add_argument('--drafts', type=int, default=200)
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+fresh_db(ARGS)
+
+from sqlalchemy import func, select
+from telegram import Update
+
+import bot
+import models
+from migrations import run_migrations
+from persistence import DbPersistence
+from benchmarks.fakes import OfflineBot
+from benchmarks.queries import QueryCounter
+from benchmarks.seed import seed
+
+RECIPIENT = 2
+WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+def message(update_id: int, user_id: int, text: str) -> dict:
+    chat = {'id': user_id, 'type': 'private'}
+    sender = {'id': user_id, 'is_bot': False, 'first_name': f"U{user_id}"}
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': int(time.time()), 'text': text, 'chat': chat, 'from': sender,
+    }}
+
+
+def callback(update_id: int, user_id: int, data: str) -> dict:
+    chat = {'id': user_id, 'type': 'private'}
+    sender = {'id': user_id, 'is_bot': False, 'first_name': f"U{user_id}"}
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': sender, 'chat_instance': str(user_id), 'data': data,
+        'message': {'message_id': 1, 'date': int(time.time()), 'text': "…", 'chat': chat},
+    }}
+
+
+def draft(user_id: int) -> list:
+    day = (date.today() + timedelta(days=30)).strftime("%d.%m.%Y")
+    texts = ["Создать событие", f"Семинар {user_id}", "Описание", bot.INTERVAL_OPTIONS[0][0], day,
+             bot.REPEAT_OPTIONS[-1][0]]
+    return [lambda n, t=t: message(n, user_id, t) for t in texts] + [
+        lambda n: callback(n, user_id, f"pick:t:{RECIPIENT}"),
+    ]
+
+
+async def run_app(steps: list) -> tuple:
+    """Прогоняет апдейты через новое приложение и останавливает его; (записей в диалогах, запросов при остановке)."""
+    app = bot.build_application(bot=OfflineBot(latency=0), persistence=DbPersistence(update_interval=3600))
+    await app.initialize()
+    await app.start()
+    with QueryCounter(models.engine, keep_statements=True) as qc:
+        for n, step in enumerate(steps, 1):
+            await app.process_update(Update.de_json(step(n), app.bot))
+    writes = sum(s.lstrip().upper().startswith(WRITES) for s in qc.statements)
+    with QueryCounter(models.engine) as stop:
+        await app.stop()
+        await app.shutdown()
+    return writes, stop.count
+
+
+def saved_events() -> tuple:
+    with models.engine.connect() as conn:
+        events = conn.execute(select(func.count()).select_from(models.Event)).scalar()
+        linked = conn.execute(
+            select(func.count()).select_from(models.event_recipients)
+            .where(models.event_recipients.c.user_id == RECIPIENT)
+        ).scalar()
+        repeating = conn.execute(
+            select(func.count()).select_from(models.Event).where(models.Event.repeat.isnot(None))
+        ).scalar()
+    return events, linked, repeating
+
+
+async def main() -> int:
+    logging.disable(logging.WARNING)
+    run_migrations()
+    seed(ARGS.drafts + 2, 0, 0, 0, bot.POSITIONS)
+    users = range(3, ARGS.drafts + 3)
+
+    steps = [step for uid in users for step in draft(uid)]
+    writes, flush = await run_app(steps)
+    print(f"{len(steps)} апдейтов черновиков: записей в БД во время диалогов {writes}, "
+          f"запросов при остановке {flush}")
+
+    await run_app([lambda n, uid=uid: message(n, uid, "Готово") for uid in users])
+    events, linked, repeating = saved_events()
+    print(f"После перезапуска сохранено событий {events} из {ARGS.drafts}, "
+          f"с отмеченным получателем {linked}, повторяющихся {repeating}")
+    ok = writes == 0 and events == linked == repeating == ARGS.drafts
+    print("OK" if ok else "ПЛОХО")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
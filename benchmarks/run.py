@@ -0,0 +1,235 @@
+# benchmarks/run.py
+"""
+Офлайн-бенчмарк хэндлеров бота на синтетических данных.
+
+Настоящие хэндлеры (start, events_list, event_users, send_reminder,
+send_birthday_reminder) вызываются с подставными Update/Bot/Context, без сети.
+Для каждого сценария считаются пропускная способность, p50/p99 задержки и
+число SQL-запросов на вызов. Результат сохраняется в JSON, а --compare
+показывает изменения относительно прошлого прогона.
+
+    python -m benchmarks.run --db /tmp/bench.db --users 100000 --events 1000000 \\
+        --out bench.json --compare previous.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_db
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/botlaba_bench.db', help="файл SQLite; засевается, если пуст")
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--events', type=int, default=10_000)
+    parser.add_argument('--recipients', type=int, default=20, help="получателей на событие")
+    parser.add_argument('--due', type=int, default=100, help="напоминаний к отправке за тик")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10, help="параллельных апдейтов")
+    parser.add_argument('--scenarios', nargs='*', help="только эти сценарии")
+    parser.add_argument('--real-limits', action='store_true', help="рассылка с лимитами Telegram")
+    parser.add_argument('--out', help="куда сохранить JSON")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+use_db(ARGS.db)
+# уведомления уходят сразу, а не в слоты получателей (см. delivery.py)
+os.environ.setdefault('DELIVERY_HOUR', '0')
+os.environ.setdefault('DELIVERY_WINDOW', '0')
+
+import bot
+import models
+import outbox
+from broadcast import Broadcaster
+from cache import user_cache
+from migrations import run_migrations
+from benchmarks.fakes import FakeBot, FakeContext, FakeJob, FakeUpdate
+from benchmarks.queries import QueryCounter
+from benchmarks.seed import seed, is_seeded
+
+rnd = random.Random(42)
+
+
+def random_user() -> int:
+    return rnd.randint(1, ARGS.users)
+
+
+# --- Сценарии: (подготовка вне замера, сам вызов) ---
+async def no_setup():
+    return None
+
+async def start_warm(_):
+    # повторные нажатия «Меню» небольшой группой активных пользователей
+    await bot.start(FakeUpdate(rnd.randint(1, min(50, ARGS.users))), FakeContext())
+
+async def setup_cold():
+    user_cache.invalidate()
+
+async def start_cold(_):
+    await bot.start(FakeUpdate(random_user()), FakeContext())
+
+async def events_list(_):
+    await bot.events_list(FakeUpdate(random_user()), FakeContext())
+
+async def setup_event_users():
+    return {
+        'evt_title': "Бенчмарк", 'evt_desc': "Описание",
+        'evt_date': datetime.now().date() + timedelta(days=30), 'evt_interval': 7,
+        'evt_notify_ids': set(rnd.sample(range(1, ARGS.users + 1), min(ARGS.recipients, ARGS.users))),
+    }
+
+async def event_users(user_data):
+    await bot.event_users(FakeUpdate(random_user(), "Готово"), FakeContext(user_data=user_data))
+
+def _mark_due():
+    from reminders import utc_now
+    with models.engine.begin() as conn:
+        conn.execute(
+            models.ReminderSchedule.__table__.update()
+            .where(models.ReminderSchedule.reminder_id <= ARGS.due)
+            .values(next_run_at=utc_now() - timedelta(minutes=1))
+        )
+
+async def setup_send_reminder():
+    _mark_due()
+    return FakeBot(latency=0, enforce=False)
+
+async def send_reminder(fake_bot):
+    await bot.send_reminder(FakeContext(bot=fake_bot, job=FakeJob()))
+
+async def setup_birthday():
+    # очищаем outbox, иначе повторные поздравления отсекут ключи идемпотентности
+    with models.engine.begin() as conn:
+        conn.execute(models.OutboxMessage.__table__.delete())
+    return FakeBot(latency=0, enforce=False)
+
+async def send_birthday_reminder(fake_bot):
+    await bot.send_birthday_reminder(FakeContext(bot=fake_bot, job=FakeJob()))
+
+
+# имя → (подготовка, вызов, параллельно ли, число итераций; None — из --iterations)
+SCENARIOS = {
+    'start':                  (no_setup, start_warm, True, None),
+    'start_cold_cache':       (setup_cold, start_cold, True, None),
+    'events_list':            (no_setup, events_list, True, None),
+    'event_users':            (setup_event_users, event_users, True, None),
+    'send_reminder':          (setup_send_reminder, send_reminder, False, 5),
+    'send_birthday_reminder': (setup_birthday, send_birthday_reminder, False, 1),
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run_scenario(name: str) -> dict:
+    setup, call, parallel, iterations = SCENARIOS[name]
+    iterations = iterations or ARGS.iterations
+    group = ARGS.concurrency if parallel else 1
+    latencies, busy = [], 0.0
+    sent = 0
+
+    async def timed(arg):
+        started = time.perf_counter()
+        await call(arg)
+        latencies.append(time.perf_counter() - started)
+
+    setup_queries = 0
+    with QueryCounter(models.engine) as qc:
+        done = 0
+        while done < iterations:
+            n = min(group, iterations - done)
+            before = qc.count
+            args = [await setup() for _ in range(n)]
+            setup_queries += qc.count - before  # подготовка в замер не входит
+
+            started = time.perf_counter()
+            await asyncio.gather(*(timed(a) for a in args))
+            busy += time.perf_counter() - started
+            done += n
+            sent += sum(len(a.sent) for a in args if isinstance(a, FakeBot))
+    queries = qc.count - setup_queries
+
+    return {
+        'iterations': iterations,
+        'throughput_per_s': iterations / busy if busy else 0.0,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_call': queries / iterations,
+        'messages_sent': sent,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous_path: str) -> None:
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)['results']
+    print(f"\nСравнение с {previous_path}:")
+    for name, res in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        parts = []
+        for metric in ('throughput_per_s', 'p99_ms', 'queries_per_call'):
+            if old.get(metric):
+                delta = (res[metric] - old[metric]) / old[metric] * 100
+                parts.append(f"{metric} {delta:+.0f}%")
+        print(f"  {name:<24} " + ", ".join(parts))
+
+
+async def main():
+    run_migrations()
+    if not is_seeded():
+        print(f"Засеваем {ARGS.db}: {ARGS.users} пользователей, {ARGS.events} событий…")
+        started = time.perf_counter()
+        seed(ARGS.users, ARGS.events, ARGS.recipients, ARGS.due, bot.POSITIONS)
+        print(f"  за {time.perf_counter() - started:.1f} с")
+    if not ARGS.real_limits:
+        # меряем сам бот, а не паузы рассылки под лимиты Telegram
+        outbox.broadcaster = Broadcaster(global_rate=1e9, per_chat_rate=1e9, concurrency=64)
+
+    results = {}
+    for name in ARGS.scenarios or SCENARIOS:
+        res = results[name] = await run_scenario(name)
+        print(
+            f"{name:<24} {res['throughput_per_s']:9.1f}/с  p50 {res['p50_ms']:8.2f} мс  "
+            f"p99 {res['p99_ms']:8.2f} мс  SQL/вызов {res['queries_per_call']:6.1f}"
+            + (f"  сообщений {res['messages_sent']}" if res['messages_sent'] else "")
+        )
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'python': sys.version.split()[0],
+            **{k: v for k, v in vars(ARGS).items() if k not in ('out', 'compare')},
+        },
+        'results': results,
+    }
+    if ARGS.out:
+        with open(ARGS.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {ARGS.out}")
+    if ARGS.compare:
+        compare(results, ARGS.compare)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+# benchmarks/search.py
+"""
+Полнотекстовый поиск событий на большой таблице (см. search.py).
+
+В БД кладётся --events событий со случайными названиями и описаниями из
+словаря кафедральной тематики; часть слов частая, часть редкая. Для
+запросов разной избирательности печатается число совпадений и медиана
+времени первой и далёкой страницы (search_page), а также время той же
+выборки перебором events через LIKE — то, что было бы без индекса.
+
+Затем проверяется синхронизация индекса: новое, переименованное и
+удалённое событие находятся (или нет) сразу после commit. Код возврата
+1 — если индекс разошёлся с таблицей.
+
+    python -m benchmarks.search --events 300000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import fresh_db
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/botlaba_search.db', help="файл SQLite, пересоздаётся")
+    parser.add_argument('--events', type=int, default=300_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20, help="замеров на запрос")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+fresh_db(ARGS)
+
+from sqlalchemy import func, insert, literal_column, or_, select
+
+import search
+from models import engine, SessionLocal, Event
+from migrations import run_migrations
+from benchmarks.seed import seed, _batches
+
+COMMON = ["Семинар", "Заседание", "Совещание", "Встреча", "Консультация", "Лекция"]
+TOPICS = ["кафедры", "лаборатории", "аспирантов", "студентов", "совета", "деканата", "учёного совета"]
+RARE   = ["диссертации", "аккредитации", "олимпиады", "конференции", "практики", "экзамена"]
+WORDS  = ["обсуждение", "план", "работ", "отчёт", "итоги", "график", "подготовка", "вопросы", "проект"]
+
+QUERIES = ["семинар", "семинары кафедры", "аккредитация", "олимпиада студентов", "ёлка", "событие 123457"]
+
+
+def fill() -> None:
+    rnd = random.Random(7)
+    today = date.today()
+
+    def rows():
+        for i in range(1, ARGS.events + 1):
+            title = f"{rnd.choice(COMMON)} {rnd.choice(TOPICS)}"
+            if rnd.random() < 0.02:
+                title += f" по вопросу {rnd.choice(RARE)}"
+            description = " ".join(rnd.choice(WORDS) for _ in range(8)) + f" (событие {i})"
+            yield {'id': i, 'title': title, 'description': description,
+                   'event_date': today + timedelta(days=rnd.randrange(365)),
+                   'creator_id': rnd.randint(1, ARGS.users)}
+
+    with engine.begin() as conn:
+        for batch in _batches(rows()):
+            conn.execute(insert(Event.__table__), batch)
+
+
+def timed(fn, *args) -> tuple:
+    """(результат, медиана времени вызова в мс)."""
+    samples = []
+    for _ in range(ARGS.repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        samples.append(time.perf_counter() - started)
+    return result, statistics.median(samples) * 1000
+
+
+def matches(query: str) -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(search._fts)
+            .where(literal_column('events_fts').op('MATCH')(search.fts_query(search.terms(query))))
+        ).scalar()
+
+
+def like_scan(query: str) -> list:
+    """Без индекса: LIKE по обоим полям, первая страница."""
+    session = SessionLocal()
+    conds = [or_(Event.title.ilike(f"%{w}%"), Event.description.ilike(f"%{w}%")) for w in search.terms(query)]
+    rows = session.execute(select(Event.id).where(*conds).order_by(Event.id).limit(11)).all()
+    session.close()
+    return rows
+
+
+def found(query: str, evt_id: int) -> bool:
+    return any(hit.id == evt_id for hit in search.search_page(query, 0, 100).rows)
+
+
+def check_sync() -> bool:
+    session = SessionLocal()
+    evt = Event(title="Ёлка кафедры", description="Новогодний праздник", event_date=date.today(), creator_id=1)
+    session.add(evt)
+    session.commit()
+    added = found("елка", evt.id)
+    evt.title = "Утренник кафедры"
+    session.commit()
+    renamed = found("утренник", evt.id) and not found("елка", evt.id)
+    session.delete(evt)
+    session.commit()
+    deleted = not found("утренник", evt.id)
+    session.close()
+    print(f"синхронизация: вставка {added}, переименование {renamed}, удаление {deleted}")
+    return added and renamed and deleted
+
+
+def main() -> int:
+    run_migrations()
+    seed(ARGS.users, 0, 0, 0, ["доцент", "профессор"])
+    started = time.perf_counter()
+    fill()
+    print(f"{ARGS.events} событий загружено с индексом за {time.perf_counter() - started:.1f} с; "
+          f"медиана из {ARGS.repeat}, мс")
+    print(f"{'запрос':<22} {'совпадений':>10} {'стр. 1':>8} {'стр. 101':>9} {'LIKE':>8}")
+    for query in QUERIES:
+        _, first = timed(search.search_page, query)
+        _, deep = timed(search.search_page, query, 1000)
+        _, scan = timed(like_scan, query)
+        print(f"{query:<22} {matches(query):>10} {first:>8.2f} {deep:>9.2f} {scan:>8.2f}")
+    ok = check_sync()
+    print("OK" if ok else "ПЛОХО")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# benchmarks/seed.py
+"""
+Наполнение схемы models.py синтетическими данными заданного объёма.
+
+Вставка идёт пачками через Core (executemany), минуя ORM, поэтому даже
+миллион событий загружается за десятки секунд.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.seed --users 100000 --events 1000000
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+
+BATCH = 10_000
+
+FIRST = ["Иван", "Пётр", "Анна", "Мария", "Олег", "Елена", "Сергей", "Ольга"]
+LAST  = ["Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов"]
+
+
+def _batches(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(users: int, events: int, recipients: int, due: int, positions: list, seed_value: int = 1) -> None:
+    """
+    users пользователей (telegram_id = 1..users), events событий с напоминанием,
+    по recipients получателей у каждого; due строк расписания — «уже пора».
+    """
+    from models import (
+        engine, User, Event, Reminder, ReminderSchedule, event_recipients,
+        birth_md_key, name_search_key,
+    )
+    from reminders import utc_now
+
+    rnd = random.Random(seed_value)
+    today = date.today()
+
+    def user_rows():
+        for i in range(1, users + 1):
+            name = f"{rnd.choice(LAST)} {rnd.choice(FIRST)} {i}"
+            bday = date(1960, 1, 1) + timedelta(days=rnd.randrange(40 * 365))
+            yield {
+                'id': i, 'telegram_id': i, 'full_name': name, 'name_key': name_search_key(name),
+                'position': rnd.choice(positions), 'birth_date': bday,
+                'birth_md': birth_md_key(bday), 'is_admin': i == 1,
+            }
+
+    def event_rows():
+        for i in range(1, events + 1):
+            yield {
+                'id': i, 'title': f"Событие {i}", 'description': "Описание " * 10,
+                'event_date': today + timedelta(days=rnd.randrange(-365, 365)),
+                'creator_id': rnd.randint(1, users),
+            }
+
+    def recipient_rows():
+        for i in range(1, events + 1):
+            for uid in rnd.sample(range(1, users + 1), min(recipients, users)):
+                yield {'event_id': i, 'user_id': uid}
+
+    now = utc_now()
+
+    def schedule_rows():
+        for i in range(1, events + 1):
+            yield {
+                'reminder_id': i, 'event_id': i, 'interval_days': 1,
+                'next_run_at': now - timedelta(minutes=1) if i <= due else now + timedelta(days=1 + i % 30),
+            }
+
+    with engine.begin() as conn:
+        for table, rows in (
+            (User.__table__, user_rows()),
+            (Event.__table__, event_rows()),
+            (Reminder.__table__, ({'id': i, 'event_id': i, 'interval_days': 1} for i in range(1, events + 1))),
+            (event_recipients, recipient_rows()),
+            (ReminderSchedule.__table__, schedule_rows()),
+        ):
+            for batch in _batches(rows):
+                conn.execute(table.insert(), batch)
+
+
+def is_seeded() -> bool:
+    from models import SessionLocal, User
+    session = SessionLocal()
+    seeded = session.query(User.id).first() is not None
+    session.close()
+    return seeded
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--events', type=int, default=10_000)
+    parser.add_argument('--recipients', type=int, default=20)
+    parser.add_argument('--due', type=int, default=100)
+    args = parser.parse_args()
+
+    from migrations import run_migrations
+    from bot import POSITIONS
+    run_migrations()
+    started = datetime.now()
+    seed(args.users, args.events, args.recipients, args.due, POSITIONS)
+    print(f"Готово за {(datetime.now() - started).total_seconds():.1f} с")
@@ -0,0 +1,116 @@
+# benchmarks/storage_profiles.py
+"""
+Сравнение профилей хранилища (storage.PROFILES) на смешанной нагрузке.
+
+Несколько потоков-читателей выполняют запросы хэндлеров (пользователь по
+telegram_id, страница событий), один поток-писатель регистрирует новых
+пользователей — как db.run_db / db.run_db_write в работающем боте.
+
+    python -m benchmarks.storage_profiles --seconds 5 --readers 4
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault('ADMIN_TELEGRAM_ID', '1')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+import bot
+import cache
+import models
+import pagination
+import storage
+
+
+def seed(users: int, events: int) -> None:
+    session = models.SessionLocal()
+    session.add_all(
+        models.User(telegram_id=i, full_name=f"User {i}", position="доцент",
+                    birth_date=date(1980, 1, 1) + timedelta(days=i % 365))
+        for i in range(1, users + 1)
+    )
+    session.flush()
+    session.add_all(
+        models.Event(title=f"Event {i}", description="...", creator_id=1 + i % users,
+                     event_date=date(2030, 1, 1) + timedelta(days=i % 700))
+        for i in range(events)
+    )
+    session.commit()
+    session.close()
+
+
+def run_profile(name: str, seconds: float, readers: int, users: int, events: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    engine = storage.make_engine(f"sqlite:///{path}", profile=name)
+    models.SessionLocal.configure(bind=engine)
+    models.Base.metadata.create_all(engine)
+    seed(users, events)
+
+    stop = time.perf_counter() + seconds
+    read_lat, write_lat = [], []
+
+    def reader():
+        rnd = random.Random()
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            if rnd.random() < 0.7:
+                cache._load_from_db(rnd.randint(1, users))
+            else:
+                pagination.events_page()
+            read_lat.append(time.perf_counter() - started)
+
+    def writer():
+        n = 0
+        while time.perf_counter() < stop:
+            n += 1
+            started = time.perf_counter()
+            bot.register_user(10_000_000 + n, f"New {n}", "ассистент", date(1990, 1, 1))
+            write_lat.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    def p99(values):
+        return sorted(values)[int(len(values) * 0.99)] * 1000 if values else 0.0
+
+    return {
+        'profile': name,
+        'reads_per_s': len(read_lat) / seconds,
+        'writes_per_s': len(write_lat) / seconds,
+        'read_p50_ms': statistics.median(read_lat) * 1000 if read_lat else 0.0,
+        'read_p99_ms': p99(read_lat),
+        'write_p99_ms': p99(write_lat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--profiles', nargs='*', default=list(storage.PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'профиль':>9} {'чтений/с':>10} {'записей/с':>10} "
+          f"{'чтение p50, мс':>15} {'чтение p99, мс':>15} {'запись p99, мс':>15}")
+    for name in args.profiles:
+        r = run_profile(name, args.seconds, args.readers, args.users, args.events)
+        print(
+            f"{r['profile']:>9} {r['reads_per_s']:>10.0f} {r['writes_per_s']:>10.0f} "
+            f"{r['read_p50_ms']:>15.2f} {r['read_p99_ms']:>15.2f} {r['write_p99_ms']:>15.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/webhook_load.py
+"""
+Нагрузочный генератор для webhook-режима.
+
+Поднимает настоящее приложение бота (все хэндлеры из bot.py) со встроенным
+webhook-сервером на localhost и OfflineBot вместо Bot API, затем шлёт по HTTP
+синтетические апдейты «Меню» / «События» от засеянных пользователей.
+Для каждого значения --concurrency печатает апдейты/с и p50/p99 от приёма
+апдейта до ответа бота; --concurrency 1 — обработка по одному, как в
+run_polling по умолчанию. Заодно проверяется, что апдейты одного пользователя
+обработаны в том порядке, в котором их принял сервер.
+
+    python -m benchmarks.webhook_load --updates 2000 --concurrency 1 8 32
+
+С --url апдейты уходят в уже запущенный бот (BOT_MODE=webhook), и меряется
+только скорость приёма.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks.common import use_db
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/botlaba_bench.db', help="файл SQLite; засевается, если пуст")
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--active', type=int, default=200, help="сколько пользователей пишут боту")
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--senders', type=int, default=20, help="параллельных HTTP-соединений")
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка Bot API, с")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 32])
+    parser.add_argument('--port', type=int, default=18443)
+    parser.add_argument('--url', help="слать в уже запущенный бот вместо встроенного")
+    parser.add_argument('--secret', help="WEBHOOK_SECRET запущенного бота")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+use_db(ARGS.db)
+
+import httpx
+
+import bot
+import webhook
+from benchmarks.fakes import OfflineBot
+from benchmarks.seed import seed, is_seeded
+from migrations import run_migrations
+
+PATH = "/telegram"
+SECRET = "bench-secret"
+TEXTS = ("Меню", "События")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def synthetic_updates(n: int):
+    rnd = random.Random(7)
+    for update_id in range(1, n + 1):
+        user_id = rnd.randint(1, min(ARGS.active, ARGS.users))
+        yield {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id, 'date': int(time.time()), 'text': rnd.choice(TEXTS),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f"U{user_id}"},
+            },
+        }
+
+
+async def post_all(url: str, updates: list, secret: str = None) -> float:
+    """Отправляет апдейты через --senders keep-alive соединений; возвращает время отправки."""
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    queue = iter(updates)
+    limits = httpx.Limits(max_connections=ARGS.senders, max_keepalive_connections=ARGS.senders)
+
+    async with httpx.AsyncClient(limits=limits, headers=headers) as client:
+        async def sender():
+            for payload in queue:
+                response = await client.post(url, json=payload)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(ARGS.senders)))
+        return time.perf_counter() - started
+
+
+class TimedServer(webhook.WebhookServer):
+    """Запоминает, когда пришёл каждый апдейт."""
+
+    def __init__(self, app, path):
+        super().__init__(app, path, SECRET)
+        self.received_at = {}
+
+    async def _handle(self, method, path, headers, body):
+        self.received_at[json.loads(body)['update_id']] = time.perf_counter()
+        return await super()._handle(method, path, headers, body)
+
+
+class CheckedProcessor(webhook.PerUserUpdateProcessor):
+    """Запоминает порядок обработки апдейтов каждого пользователя и время до ответа."""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.order = defaultdict(list)
+        self.latencies = []
+        self.received_at = {}
+
+    async def do_process_update(self, update, coroutine) -> None:
+        async def recorded():
+            self.order[webhook.update_key(update)].append(update.update_id)
+            await coroutine
+            self.latencies.append(time.perf_counter() - self.received_at[update.update_id])
+
+        await super().do_process_update(update, recorded())
+
+    def in_order(self) -> bool:
+        """Апдейты каждого пользователя обработаны в порядке прихода на сервер."""
+        return all(ids == sorted(ids, key=self.received_at.get) for ids in self.order.values())
+
+
+async def run_local(concurrency: int, updates: list) -> dict:
+    processor = CheckedProcessor(concurrency)
+    app = bot.build_application(OfflineBot(ARGS.latency), processor)
+    server = TimedServer(app, PATH)
+    processor.received_at = server.received_at
+
+    async with app:
+        await app.start()
+        await server.start('127.0.0.1', ARGS.port)
+        started = time.perf_counter()
+        posted = await post_all(f"http://127.0.0.1:{ARGS.port}{PATH}", updates, SECRET)
+        await server.stop()
+        await app.stop()  # дожидается обработки всех принятых апдейтов
+        elapsed = time.perf_counter() - started
+
+    return {
+        'posted_s': posted,
+        'elapsed_s': elapsed,
+        'updates_per_s': len(updates) / elapsed,
+        'p50_ms': statistics.median(processor.latencies) * 1000,
+        'p99_ms': percentile(processor.latencies, 99) * 1000,
+        'in_order': processor.in_order(),
+    }
+
+
+async def main():
+    updates = list(synthetic_updates(ARGS.updates))
+    if ARGS.url:
+        elapsed = await post_all(ARGS.url, updates, ARGS.secret)
+        print(f"Отправлено {len(updates)} апдейтов за {elapsed:.2f} с ({len(updates) / elapsed:.0f}/с)")
+        return
+
+    run_migrations()
+    if not is_seeded():
+        print(f"Засеваем {ARGS.db}: {ARGS.users} пользователей…")
+        seed(ARGS.users, min(ARGS.users, 10_000), 20, 100, bot.POSITIONS)
+
+    print(f"{len(updates)} апдейтов от {min(ARGS.active, ARGS.users)} пользователей, "
+          f"задержка Bot API {ARGS.latency * 1000:.0f} мс")
+    for concurrency in ARGS.concurrency:
+        res = await run_local(concurrency, updates)
+        print(
+            f"concurrency {concurrency:<4} {res['updates_per_s']:8.1f} апд/с  "
+            f"p50 {res['p50_ms']:8.1f} мс  p99 {res['p99_ms']:8.1f} мс  "
+            f"порядок {'OK' if res['in_order'] else 'НАРУШЕН'}"
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
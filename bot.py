@@ -23,20 +23,48 @@ TOKEN        = os.getenv("BOT_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL")
 ADMIN_ID     = int(os.getenv("ADMIN_TELEGRAM_ID"))
 
+import asyncio
+import calendar
 import logging
-from datetime import datetime, date, timedelta, time, timezone
+import warnings
+from datetime import datetime, date, time, timedelta
 from telegram import (
     Update, ReplyKeyboardMarkup, ReplyKeyboardRemove,
     InlineKeyboardButton, InlineKeyboardMarkup,
 )
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler,
-    CallbackQueryHandler, ConversationHandler, ContextTypes,
+    CallbackQueryHandler, ConversationHandler, ContextTypes, TypeHandler,
     filters,
 )
-from models import SessionLocal, User, Event, Reminder
-
-MSK = timezone(timedelta(hours=3))
+from telegram.warnings import PTBUserWarning
+from models import SessionLocal, User, Event, Reminder, event_recipients, init_db, birth_md_key
+import picker
+import reachability
+import recurrence
+import reminders
+from reminders import MSK
+from cache import user_cache, get_user_record
+from pagination import (
+    PAGE_PATTERN, events_page, archive_page, users_page, nav_row, parse_callback,
+    event_key, parse_event_key, user_key, parse_user_key,
+)
+import archive
+import broadcast
+import db
+import delivery
+import digest
+import jobs
+import leader
+import metrics
+import models
+import outbox
+import repository
+import roster
+import search
+import webhook
+from db import run_db, run_db_write
+from persistence import DbPersistence
 
 from datetime import timedelta
 
@@ -60,12 +88,10 @@ async def test_me(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def test_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = SessionLocal()
     tg_id = update.effective_user.id
-    user = session.query(User).filter_by(telegram_id=tg_id).first()
+    user = await get_user_record(tg_id)
     if not user:
         await update.message.reply_text("❌ Вы не зарегистрированы в БД.")
-        session.close()
         return
 
     bday = date.today() + timedelta(days=7)
@@ -73,7 +99,6 @@ async def test_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Пошлём тестово и себе
     await context.bot.send_message(chat_id=tg_id, text=text, parse_mode="Markdown")
-    session.close()
     await update.message.reply_text("Тестовое поздравление отправлено вам!")
 
 
@@ -81,7 +106,8 @@ async def test_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # Состояния разговоров
 REGISTER_NAME, REGISTER_POSITION, REGISTER_BIRTHDATE = range(3)
-EVENT_TITLE, EVENT_DESC, EVENT_INTERVAL, EVENT_DATE, EVENT_USERS = range(3, 8)
+EVENT_TITLE, EVENT_DESC, EVENT_INTERVAL, EVENT_DATE, EVENT_USERS, EVENT_REPEAT = range(3, 9)
+SEARCH_QUERY = 9
 
 # Должности
 POSITIONS = [
@@ -95,59 +121,66 @@ INTERVAL_OPTIONS = [
     ("Каждый день",     1),
 ]
 
-def schedule_birthday_reminder(job_queue, user_id: int, birth_date: date):
-    today = date.today()
-    this_year_bday = date(today.year, birth_date.month, birth_date.day)
-    if this_year_bday < today:
-        next_bday = date(today.year + 1, birth_date.month, birth_date.day)
-    else:
-        next_bday = this_year_bday
+# Повторение события: (кнопка, частота, каждые N)
+REPEAT_OPTIONS = [
+    ("Один раз",         None,                 None),
+    ("Каждую неделю",    recurrence.WEEKLY,    1),
+    ("Каждые 2 недели",  recurrence.WEEKLY,    2),
+    ("Каждый месяц",     recurrence.MONTHLY,   1),
+]
 
-    remind_date = next_bday - timedelta(days=7)
-    run_dt = datetime.combine(remind_date, time(13, 0), MSK)
-    if run_dt <= datetime.now(MSK):
-        return
+def birthday_keys(day: date) -> list:
+    """Ключи birth_md, чьи дни рождения приходятся на day."""
+    keys = [birth_md_key(day)]
+    # родившиеся 29 февраля в невисокосный год празднуют 28-го
+    if (day.month, day.day) == (2, 28) and not calendar.isleap(day.year):
+        keys.append(229)
+    return keys
 
-    job_id = f"bday_{user_id}_{next_bday.year}"
-    # удаляем старую, если есть
-    for job in job_queue.get_jobs_by_name(job_id):
-        job.schedule_removal()
-
-    # создаём новую
-    job_queue.run_once(
-        send_birthday_reminder,
-        when=run_dt,
-        name=job_id,
-        data={'user_id': user_id, 'bday': next_bday}
-    )
+
+def _birthday_recipients(bday: date):
+    """Именинники на bday [(id, ФИО)] и все пользователи [(id, chat_id, digest, tz, notify_hour)]."""
+    session = SessionLocal()
+    celebrants = repository.celebrants(session, birthday_keys(bday))
+    everyone = repository.notification_targets(session) if celebrants else []
+    session.close()
+    return celebrants, everyone
 
 
 async def send_birthday_reminder(context: ContextTypes.DEFAULT_TYPE):
     """
-    Отправляет всем, кроме именинника, напоминание «через неделю день рождения».
+    Ежедневная задача: всем, кроме именинника, напоминание о днях рождения
+    через неделю. Именинники ищутся по индексу birth_md; уведомления ставятся
+    в очередь на время доставки каждого получателя (см. delivery.py).
     """
-    job_data = context.job.data
-    user_id = job_data['user_id']
-    bday    = job_data['bday']  # ближайший день рождения, datetime.date
-
-    session = SessionLocal()
-    user = session.get(User, user_id)
-    if not user:
-        session.close()
-        return
-
-    # выбираем всех кроме именинника
-    others = session.query(User).filter(User.id != user_id).all()
-    text = (
-        f"🎂 Через неделю ({bday.strftime('%d.%m.%Y')}) — день рождения **{user.full_name}**! 🎉"
-    )
-    for u in others:
-        await context.bot.send_message(
-            chat_id=u.telegram_id,
-            text=text,
-            parse_mode="Markdown"
+    now = datetime.now(MSK)
+    # после смены ведущего задача может запуститься второй раз за день: ключи
+    # bday:<дата>:<именинник>:<чат> уникальны в outbox, повтор ничего не добавит,
+    # а запуск, упавший до enqueue_all, догонит новый ведущий
+    metrics.job_lag("send_birthday_reminder", datetime.combine(now.date(), reminders.ENQUEUE_AT, MSK).timestamp())
+    bday = now.date() + timedelta(days=7)
+
+    celebrants, everyone = await run_db(_birthday_recipients, bday)
+    messages = []
+    for user_id, full_name in celebrants:
+        text = (
+            f"🎂 Через неделю ({bday.strftime('%d.%m.%Y')}) — день рождения **{full_name}**! 🎉"
         )
-    session.close()
+        line = f"🎂 {bday.strftime('%d.%m.%Y')} — день рождения {full_name}"
+        # всем кроме именинника
+        for uid, tg, setting, tz, hour in everyone:
+            if uid == user_id:
+                continue
+            key = f"bday:{bday.isoformat()}:{user_id}:{tg}"
+            at = delivery.deliver_at(tg, now.date(), tz, hour)
+            if digest.wants_digest(setting):
+                messages.append(outbox.message(key, tg, line, digest_day=now.date(), deliver_at=at, user_id=user_id))
+            else:
+                messages.append(outbox.message(
+                    key, tg, text, parse_mode="Markdown", deliver_at=at, user_id=user_id
+                ))
+    await run_db_write(outbox.enqueue_all, messages)
+    await outbox.drain(context.bot)
 
 
 
@@ -156,7 +189,7 @@ def build_main_menu(is_admin: bool):
     rows = [
         ["События", "Управление событиями"],
         ["Создать событие", "Справка"],
-        ["Меню"]
+        ["Поиск", "Меню"]
     ]
     if is_admin:
         rows.insert(1, ["Панель администратора"])
@@ -164,7 +197,7 @@ def build_main_menu(is_admin: bool):
 
 # Меню до регистрации
 REG_MENU = ReplyKeyboardMarkup(
-    [["Регистрация", "События"], ["Создать событие", "Справка"], ["Меню"]],
+    [["Регистрация", "События"], ["Создать событие", "Справка"], ["Поиск", "Меню"]],
     resize_keyboard=True
 )
 
@@ -186,23 +219,23 @@ def register_user(tg_id, name, pos, bdate):
     )
     session.add(user)
     session.commit()
+    user_cache.invalidate(tg_id)
     uid, full, position, bd, is_admin = (
         user.id, user.full_name, user.position, user.birth_date, user.is_admin
     )
     session.close()
     return uid, full, position, bd, is_admin
 
+
 # /start и кнопка «Меню»
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tg_id = update.effective_user.id
-    session = SessionLocal()
-    user = session.query(User).filter_by(telegram_id=tg_id).first()
-    session.close()
+    user = await get_user_record(tg_id)
 
     if user:
         menu = build_main_menu(user.is_admin)
         admin_line = "🛡 Администратор\n" if user.is_admin else ""
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             f"С возвращением, {user.full_name}!\n"
             f"🆔 {user.id}\n"
             f"{admin_line}"
@@ -211,7 +244,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=menu
         )
     else:
-        await update.message.reply_text("Выберите действие:", reply_markup=REG_MENU)
+        await update.effective_message.reply_text("Выберите действие:", reply_markup=REG_MENU)
 
 # --- Регистрация ---
 async def registration_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -245,7 +278,8 @@ async def register_birthdate(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return REGISTER_BIRTHDATE
 
     tg_id = update.effective_user.id
-    uid, full, pos, bd, is_admin = register_user(
+    uid, full, pos, bd, is_admin = await run_db_write(
+        register_user,
         tg_id,
         context.user_data['full_name'],
         context.user_data['position'],
@@ -261,12 +295,6 @@ async def register_birthdate(update: Update, context: ContextTypes.DEFAULT_TYPE)
         f"🎂 {bd.strftime('%d.%m.%Y')}",
         reply_markup=menu
     )
-
-    schedule_birthday_reminder(
-        context.application.job_queue,
-        tg_id,  # или user.id, если вы получаете его из register_user
-        bdate
-    )
     return ConversationHandler.END
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -316,190 +344,309 @@ async def event_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         return EVENT_DATE
 
     context.user_data['evt_date'] = evt_dt
-
-    session = SessionLocal()
-    users = session.query(User).all()
-    session.close()
-
-    kb = [[u.full_name] for u in users] + [["Готово"]]
-    context.user_data['evt_notify_list'] = []
+    kb = [[opt[0]] for opt in REPEAT_OPTIONS]
     await update.message.reply_text(
-        "Выберите пользователей для уведомлений (можно несколько). Нажмите «Готово» для завершения:",
-        reply_markup=ReplyKeyboardMarkup(kb, resize_keyboard=True)
+        "Повторять событие?",
+        reply_markup=ReplyKeyboardMarkup(kb, one_time_keyboard=True, resize_keyboard=True)
     )
+    return EVENT_REPEAT
+
+async def event_repeat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    choice = update.message.text.strip()
+    mapping = {opt[0]: opt[1:] for opt in REPEAT_OPTIONS}
+    if choice not in mapping:
+        await update.message.reply_text("Пожалуйста, выберите вариант с клавиатуры.")
+        return EVENT_REPEAT
+    context.user_data['evt_repeat'] = mapping[choice]
+    context.user_data['evt_notify_ids'] = set()
+    context.user_data['evt_search'] = ""
+
+    await update.message.reply_text("Выберите пользователей для уведомлений:", reply_markup=ReplyKeyboardRemove())
+    text, markup = await _picker_view(context)
+    await update.message.reply_text(text, reply_markup=markup)
     return EVENT_USERS
 
-def schedule_reminders(job_queue, event_id: int, interval: int):
-    session = SessionLocal()
-    evt = session.query(Event).get(event_id)
-    session.close()
+async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Периодическая задача: ставит наступившие напоминания о событиях в outbox
+    и отправляет очередь. Расписание хранится в БД (см. reminders.py),
+    повторы недоставленного — в outbox.py.
+    """
+    while await run_db_write(reminders.claim_due) == reminders.BATCH_SIZE:
+        pass
+    await outbox.drain(context.bot)
 
-    today = date.today()
-    run_date = today
-    while run_date <= evt.event_date:
-        # запланировать на run_date 13:00 МСК
-        run_dt = datetime.combine(run_date, time(13, 0), MSK)
-        if run_dt >= datetime.now(MSK):
-            job_queue.run_once(
-                send_reminder,
-                when=run_dt,
-                data={'event_id': event_id, 'target_date': run_date}
-            )
-        run_date += timedelta(days=interval)
+async def advance_recurring(context: ContextTypes.DEFAULT_TYPE):
+    """Ежедневная задача: повторяющиеся события переходят к следующему вхождению."""
+    await run_db_write(recurrence.advance_all, reminders.msk_day(reminders.utc_now()))
 
-async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
-    job_data = context.job.data
-    ev_id      = job_data['event_id']
-    target_day = job_data['target_date']
+async def archive_events(context: ContextTypes.DEFAULT_TYPE):
+    """Ежедневная задача: прошедшие события переносятся в архив порциями (archive.py)."""
+    before = archive.cutoff(reminders.msk_day(reminders.utc_now()))
+    while await run_db_write(archive.archive_chunk, before) == archive.ARCHIVE_CHUNK:
+        pass
+
+async def send_outbox(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Периодическая задача: собирает сводки, у которых наступило время
+    доставки, и отправляет очередь — уведомления по слотам получателей,
+    повторы и всё, что осталось после перезапуска.
+    """
+    await run_db_write(digest.build_digests)
+    await outbox.drain(context.bot)
+
+async def prune_outbox(context: ContextTypes.DEFAULT_TYPE):
+    """Ежечасно: чистит outbox."""
+    await run_db_write(outbox.prune)
+
+async def count_orphans(context: ContextTypes.DEFAULT_TYPE):
+    """Ежечасно на каждом экземпляре: bot_orphaned_jobs (jobs.py) не устаревает у ведомых."""
+    await run_db(jobs.count_orphans)
+
+async def leader_tick(context: ContextTypes.DEFAULT_TYPE):
+    """Продлевает аренду ведущего; новый ведущий догоняет то, что мог пропустить."""
+    if not await leader.leadership.tick():
+        return
+    await run_db_write(recurrence.advance_all, reminders.msk_day(reminders.utc_now()))
+    await run_db_write(reminders.backfill_schedule)
+    context.job_queue.run_once(metrics.track(leader.leader_only(archive_events)), when=0, name="archive_catchup")
+    if datetime.now(MSK).time() >= reminders.ENQUEUE_AT:
+        context.job_queue.run_once(
+            metrics.track(leader.leader_only(send_birthday_reminder)), when=0, name="birthdays_catchup"
+        )
 
-    # Получаем из БД данные о событии
+def create_event(creator_tg_id, title, descr, evt_date, interval, user_ids, repeat=(None, None)):
+    """
+    Сохраняет событие, напоминание и получателей; возвращает id события.
+    repeat — (частота, каждые N) из REPEAT_OPTIONS, (None, None) — разовое.
+    """
     session = SessionLocal()
-    evt = session.query(Event).get(ev_id)
-
-    if evt and date.today() == target_day:
-        for u in evt.recipients:
-            try:
-                await context.bot.send_message(
-                    chat_id=u.telegram_id,
-                    text=(
-                        f"⏰ Напоминание: событие «{evt.title}» запланировано на "
-                        f"{evt.event_date.strftime('%d.%m.%Y')}.\n\n"
-                        f"Описание события: «{evt.description}»"
-                    ),
-                )
-            except Exception as e:
-                logger.error(f"Не удалось отправить напоминание {evt.id} пользователю {u.id}: {e}")
-                # здесь можно, например, запланировать повтор через минуту:
-                context.job_queue.run_once(
-                    send_reminder,
-                    when=timedelta(minutes=1),
-                    data=job_data,
-                    name=f"retry_{evt.id}_{u.id}"
-                )
+    creator_id = repository.user_id(session, creator_tg_id)
+    freq, every = repeat
+
+    # 1) Создаём событие, чтобы получить его ID
+    evt = Event(
+        title=title,
+        description=descr,
+        event_date=evt_date,
+        creator_id=creator_id,
+        repeat=freq,
+        repeat_every=every,
+        repeat_anchor=evt_date if freq else None,
+    )
+    session.add(evt)
+    session.flush()
+    eid = evt.id
+
+    # 2) Создаём запись о напоминании и её расписание в БД
+    rem = Reminder(event=evt, interval_days=interval)
+    session.add(rem)
+    reminders.schedule_reminder(session, rem, evt)
+
+    # 3) Привязываем получателей одной пачкой — только тех, кто ещё существует
+    existing = repository.existing_user_ids(session, list(user_ids))
+    if existing:
+        session.execute(
+            event_recipients.insert(),
+            [{'event_id': eid, 'user_id': uid} for uid in existing]
+        )
+    session.commit()
     session.close()
-
+    return eid
+
+# --- Выбор получателей ---
+async def _picker_view(context, key=None, forward=True):
+    """Текст и клавиатура выбора получателей; запоминает ключи страницы."""
+    prefix = context.user_data['evt_search']
+    page = await run_db(picker.search_page, prefix, key, forward)
+    context.user_data['evt_pick_anchor'] = (key, forward)
+    context.user_data['evt_pick_first'], context.user_data['evt_pick_last'] = picker.page_keys(page)
+    selected = context.user_data['evt_notify_ids']
+    return picker.picker_text(selected, prefix), picker.picker_markup(page, selected, prefix)
+
+async def _finish_event(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await run_db_write(
+        create_event,
+        update.effective_user.id,
+        context.user_data['evt_title'],
+        context.user_data['evt_desc'],
+        context.user_data['evt_date'],
+        context.user_data['evt_interval'],
+        context.user_data['evt_notify_ids'],
+        context.user_data.get('evt_repeat', (None, None)),
+    )
+    await update.effective_message.reply_text("✅ Событие и получатели сохранены!")
+    await start(update, context)
+    return ConversationHandler.END
 
 async def event_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Текст в режиме выбора получателей — поиск по началу ФИО."""
     text = update.message.text.strip()
     if text == "Готово":
-        session = SessionLocal()
-        creator = session.query(User).filter_by(telegram_id=update.effective_user.id).first()
-
-        # 1) Создаём событие и сохраняем, чтобы получить его ID
-        evt = Event(
-            title=context.user_data['evt_title'],
-            description=context.user_data['evt_desc'],
-            event_date=context.user_data['evt_date'],
-            creator=creator
-        )
-        session.add(evt)
-        session.commit()
-        eid = evt.id
-
-        # 2) Создаём запись о напоминании в БД
-        rem = Reminder(event=evt, interval_days=context.user_data['evt_interval'])
-        session.add(rem)
-
-        # 3) Выбираем получателей и сохраняем их chat_id
-        recs = session.query(User).filter(User.full_name.in_(context.user_data['evt_notify_list'])).all()
-        chat_ids = [u.telegram_id for u in recs]
-
-        # 4) Привязываем получателей к событию и сохраняем всё
-        evt.recipients = recs
-        session.commit()
+        return await _finish_event(update, context)
 
-        # 5) Забираем нужные поля до закрытия сессии
-        title  = evt.title
-        evdate = evt.event_date
-        descr  = evt.description
-        session.close()
-
-        # 6) Планируем отложенные напоминания через JobQueue
-        schedule_reminders(context.application.job_queue, eid, context.user_data['evt_interval'])
+    context.user_data['evt_search'] = text
+    text, markup = await _picker_view(context)
+    await update.message.reply_text(text, reply_markup=markup)
+    return EVENT_USERS
 
-        await update.message.reply_text("✅ Событие и получатели сохранены!", reply_markup=ReplyKeyboardRemove())
-        await start(update, context)
+async def event_pick_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    action = query.data.split(":", 2)[1:]
+    data = context.user_data
+    if 'evt_notify_ids' not in data:
         return ConversationHandler.END
-
-    # если добавляется очередной получатель
-    if text not in context.user_data['evt_notify_list']:
-        context.user_data['evt_notify_list'].append(text)
-        await update.message.reply_text(f"Добавлен: {text}")
-    else:
-        await update.message.reply_text(f"{text} уже в списке.")
+    selected = data['evt_notify_ids']
+
+    if action == ["done"]:
+        await query.edit_message_reply_markup(reply_markup=None)
+        return await _finish_event(update, context)
+    if action == ["g"]:
+        await query.edit_message_reply_markup(reply_markup=picker.positions_markup(POSITIONS))
+        return EVENT_USERS
+
+    key, forward = data['evt_pick_anchor']
+    if action[0] == "t":
+        selected ^= {int(action[1])}
+    elif action[0] == "g":
+        selected |= set(await run_db(picker.ids_by_position, POSITIONS[int(action[1])]))
+    elif action == ["n"]:
+        key, forward = data['evt_pick_last'], True
+    elif action == ["p"]:
+        key, forward = data['evt_pick_first'], False
+    elif action == ["clr"]:
+        data['evt_search'], key, forward = "", None, True
+
+    text, markup = await _picker_view(context, key, forward)
+    await query.edit_message_text(text, reply_markup=markup)
     return EVENT_USERS
 
 
-
 # --- Управление своими событиями ---
-async def manage_events(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    session = SessionLocal()
-    tg_id = update.effective_user.id
-    rows = (
-        session.query(Event, User.full_name)
-        .join(User, Event.creator)
-        .filter(User.telegram_id == tg_id)
-        .order_by(Event.event_date)
-        .all()
-    )
-    session.close()
-
-    if not rows:
-        await update.message.reply_text("У вас ещё нет событий.", reply_markup=build_main_menu(False))
-        return
+def _render_my_events(page):
+    if not page.rows:
+        return "У вас нет предстоящих событий.", None
 
     text_lines = ["Ваши события:"]
     buttons = []
-    for evt, _ in rows:
-        text_lines.append(f"• {evt.title} ({evt.event_date.strftime('%d.%m.%Y')})")
+    for evt in page.rows:
+        text_lines.append(f"• {evt.title} ({evt.event_date.strftime('%d.%m.%Y')}){' 🔁' if evt.repeat else ''}")
         buttons.append([InlineKeyboardButton(f"Удалить «{evt.title}»", callback_data=f"delete_evt_{evt.id}")])
+    return "\n".join(text_lines), _with_nav(buttons, "evm", page, event_key)
+
+async def manage_events(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = await get_user_record(update.effective_user.id)
+    if not user:
+        await update.message.reply_text("У вас ещё нет событий.", reply_markup=build_main_menu(False))
+        return
+    page = await run_db(events_page, creator_id=user.id)
+
+    text, markup = _render_my_events(page)
+    await update.message.reply_text(text, reply_markup=markup or build_main_menu(user.is_admin))
 
-    await update.message.reply_text("\n".join(text_lines))
-    await update.message.reply_text("Выберите действие:", reply_markup=InlineKeyboardMarkup(buttons))
+def _delete_own_event(evt_id, tg_id):
+    session = SessionLocal()
+    if repository.delete_event(session, evt_id, creator_tg_id=tg_id):
+        session.commit()
+    session.close()
 
 async def delete_evt_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
     evt_id = int(query.data.split("_")[-1])
 
-    session = SessionLocal()
-    evt = session.query(Event).get(evt_id)
-    if evt and evt.creator.telegram_id == query.from_user.id:
-        session.delete(evt)
-        session.commit()
-    session.close()
+    await run_db_write(_delete_own_event, evt_id, query.from_user.id)
     await query.edit_message_text("Событие удалено.")
 
 # --- Вывод всех событий ---
+ARCHIVE_BUTTON = InlineKeyboardButton("🗄 Архив прошедших", callback_data="archive")
+
+def _render_all_events(page):
+    if not page.rows:
+        return "Предстоящих событий нет.", InlineKeyboardMarkup([[ARCHIVE_BUTTON]])
+
+    lines = []
+    for evt in page.rows:
+        lines.append(
+            f"• «{evt.title}»{' 🔁' if evt.repeat else ''}\n"
+            f"   Дата: {evt.event_date.strftime('%d.%m.%Y')}\n"
+            f"   Создатель: {evt.creator_name}"
+        )
+    text = "📋 Предстоящие события:\n\n" + "\n\n".join(lines)
+    return text, _with_nav([[ARCHIVE_BUTTON]], "evl", page, event_key)
+
+def _render_archive(page):
+    if not page.rows:
+        return "Архив пуст.", None
+
+    lines = [
+        f"• «{evt.title}»{' 🔁' if evt.repeat else ''} — {evt.event_date.strftime('%d.%m.%Y')}"
+        + (f" ({evt.creator_name})" if evt.creator_name else "")
+        for evt in page.rows
+    ]
+    return "🗄 Архив событий:\n\n" + "\n".join(lines), _with_nav([], "arc", page, event_key)
+
+async def archive_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    page = await run_db(archive_page)
+
+    text, markup = _render_archive(page)
+    await query.edit_message_text(text, reply_markup=markup)
+
 async def events_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    session = SessionLocal()
-    rows = (
-        session.query(Event, User.full_name)
-        .join(User, Event.creator)
-        .order_by(Event.event_date)
-        .all()
-    )
-    session.close()
+    page = await run_db(events_page)
 
-    if not rows:
-        await update.message.reply_text("Событий пока нет.", reply_markup=build_main_menu(False))
-        return
+    text, markup = _render_all_events(page)
+    await update.message.reply_text(text, reply_markup=markup or build_main_menu(False))
+
+# --- Поиск событий ---
+def _render_search(text, page):
+    if not page.rows:
+        return f"По запросу «{text}» ничего не найдено.", None
 
     lines = []
-    for idx, (evt, creator_name) in enumerate(rows, start=1):
+    for evt in page.rows:
         lines.append(
-            f"{idx}. «{evt.title}»\n"
+            f"• «{evt.title}»{' 🔁' if evt.repeat else ''}\n"
             f"   Дата: {evt.event_date.strftime('%d.%m.%Y')}\n"
-            f"   Создатель: {creator_name}"
+            f"   Создатель: {evt.creator_name}"
         )
-    text = "📋 Список событий:\n\n" + "\n\n".join(lines)
-    await update.message.reply_text(text, reply_markup=build_main_menu(False))
+    header = f"🔎 Найдено по запросу «{text}»:\n\n"
+    return header + "\n\n".join(lines), _with_nav([], "srh", page, search.hit_key)
+
+async def _show_search(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    # запрос нужен кнопкам «Назад»/«Вперёд»: в callback_data помещается только место в выдаче
+    context.user_data['search_q'] = text
+    page = await run_db(search.search_page, text)
+
+    reply, markup = _render_search(text, page)
+    await update.message.reply_text(reply, reply_markup=markup or build_main_menu(False))
+
+async def search_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """/search <слова> ищет сразу; без слов и по кнопке «Поиск» — спрашивает, что искать."""
+    text = " ".join(context.args or [])
+    if search.terms(text):
+        await _show_search(update, context, text)
+        return ConversationHandler.END
+    await update.message.reply_text("🔎 Введите слова из названия или описания события:")
+    return SEARCH_QUERY
+
+async def search_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    text = update.message.text
+    if not search.terms(text):
+        await update.message.reply_text("Введите хотя бы одно слово.")
+        return SEARCH_QUERY
+    await _show_search(update, context, text)
+    return ConversationHandler.END
 
 # --- Панель администратора ---
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = [
         [InlineKeyboardButton("👥 Управление пользователями", callback_data="manage_users")],
         [InlineKeyboardButton("🗓 Управление событиями",   callback_data="manage_events_admin")],
+        [InlineKeyboardButton("📥 Импорт пользователей",   callback_data="import_users")],
     ]
     await update.message.reply_text(
         "🔧 Панель администратора:",
@@ -507,125 +654,368 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     )
 
 # --- Управление пользователями ---
-async def manage_users_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    await query.answer()
-    session = SessionLocal()
-    users = session.query(User).order_by(User.id).all()
-    session.close()
+# callback_data: "usel:t:<id>" — отметить, "usel:promote|delete" — действие над отмеченными,
+# "usel:clr" — снять отметки
+USER_SELECT_PATTERN = r"^usel:(t:\d+|promote|delete|clr)$"
 
-    if not users:
-        await query.edit_message_text("Пользователей пока нет.")
-        return
+def _render_users(page, selected=frozenset()):
+    if not page.rows:
+        return "Пользователей пока нет.", None
 
     text = "👥 Список пользователей:\n\n"
     buttons = []
-    for u in users:
-        text += f"• {u.id}: {u.full_name}  ({'АДМИН' if u.is_admin else u.position})\n"
+    for u in page.rows:
+        mark = " 🚫" if u.unreachable_at else ""
+        text += f"• {u.id}: {u.full_name}  ({'АДМИН' if u.is_admin else u.position}){mark}\n"
         buttons.append([
+            InlineKeyboardButton("✅" if u.id in selected else "▫️", callback_data=f"usel:t:{u.id}"),
             InlineKeyboardButton("🔼 Сделать админом", callback_data=f"promote_{u.id}"),
             InlineKeyboardButton("❌ Удалить",           callback_data=f"delete_user_{u.id}")
         ])
+    if selected:
+        buttons.append([
+            InlineKeyboardButton(f"🔼 Выбранных в админы ({len(selected)})", callback_data="usel:promote"),
+            InlineKeyboardButton(f"❌ Удалить выбранных ({len(selected)})",  callback_data="usel:delete"),
+        ])
+        buttons.append([InlineKeyboardButton("✖️ Снять отметки", callback_data="usel:clr")])
+    return text, _with_nav(buttons, "usr", page, user_key)
 
-    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+async def manage_users_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    context.user_data['usr_at'] = (None, True)
+    page = await run_db(users_page)
+
+    text, markup = _render_users(page, context.user_data.get('usr_sel', set()))
+    await query.edit_message_text(text, reply_markup=markup)
+
+def promote_user(user_id):
+    """Делает пользователя админом; возвращает его ФИО или None."""
+    names = roster.promote([user_id])
+    return names[0] if names else None
+
+def delete_user(user_id):
+    """Удаляет пользователя и его события; возвращает его ФИО или None."""
+    names = roster.delete([user_id])
+    return names[0] if names else None
+
+def _names(names, limit=20):
+    more = f" и ещё {len(names) - limit}" if len(names) > limit else ""
+    return ", ".join(names[:limit]) + more
+
+async def users_select_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отметки в списке пользователей и действия сразу над всеми отмеченными."""
+    query = update.callback_query
+    await query.answer()
+    admin = await get_user_record(query.from_user.id)
+    if not admin or not admin.is_admin:
+        return
+    selected = context.user_data.setdefault('usr_sel', set())
+    action = query.data.split(":")[1:]
+
+    if action[0] in ("promote", "delete") and selected:
+        ids = sorted(selected)
+        selected.clear()
+        if action[0] == "promote":
+            names = await run_db_write(roster.promote, ids)
+            await query.edit_message_text(f"✅ Теперь администраторы ({len(names)}): {_names(names)}.")
+        else:
+            names = await run_db_write(roster.delete, ids)
+            await query.edit_message_text(f"🗑 Удалено пользователей: {len(names)} — {_names(names)}.")
+        return
+    if action[0] == "t":
+        selected ^= {int(action[1])}
+    elif action[0] == "clr":
+        selected.clear()
+
+    key, forward = context.user_data.get('usr_at', (None, True))
+    page = await run_db(users_page, key, forward)
+    text, markup = _render_users(page, selected)
+    await query.edit_message_text(text, reply_markup=markup)
+
+async def import_users_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text(
+        "📥 Пришлите файл .csv или .json со списком пользователей.\n\n"
+        "Колонки: telegram_id, full_name, position, birth_date (ДД.ММ.ГГГГ), "
+        "необязательно is_admin (1/0).\n"
+        f"Должности: {', '.join(POSITIONS)}.\n\n"
+        "Файл проверяется целиком: при любой ошибке ничего не записывается. "
+        "Уже зарегистрированные пропускаются."
+    )
+
+async def import_users_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Админ прислал CSV/JSON — все пользователи из него записываются одной транзакцией."""
+    user = await get_user_record(update.effective_user.id)
+    if not user or not user.is_admin:
+        return
+    doc = update.message.document
+    data = bytes(await (await doc.get_file()).download_as_bytearray())
+    rows, errors = await asyncio.to_thread(roster.parse, data, doc.file_name or "", POSITIONS)
+    if errors:
+        lines = [f"• строка {line}: {message}" if line else f"• {message}" for line, message in errors[:10]]
+        more = f"\n… и ещё {len(errors) - 10}" if len(errors) > 10 else ""
+        await update.message.reply_text("⚠️ Ничего не импортировано:\n" + "\n".join(lines) + more)
+        return
+    added, skipped = await run_db_write(roster.import_users, rows)
+    await update.message.reply_text(f"✅ Добавлено пользователей: {added}, уже были зарегистрированы: {skipped}.")
 
 async def promote_user_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
     user_id = int(query.data.split("_")[1])
-    session = SessionLocal()
-    u = session.query(User).get(user_id)
-    if u:
-        u.is_admin = True
-        session.commit()
-        await query.edit_message_text(f"✅ {u.full_name} теперь администратор.")
+    full_name = await run_db_write(promote_user, user_id)
+    if full_name:
+        await query.edit_message_text(f"✅ {full_name} теперь администратор.")
     else:
         await query.edit_message_text("⚠️ Пользователь не найден.")
-    session.close()
 
 async def delete_user_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
     user_id = int(query.data.split("_")[2])
-    session = SessionLocal()
-    u = session.query(User).get(user_id)
-    if u:
-        session.delete(u)
-        session.commit()
-        await query.edit_message_text(f"🗑 Пользователь {u.full_name} удалён.")
+    full_name = await run_db_write(delete_user, user_id)
+    if full_name:
+        await query.edit_message_text(f"🗑 Пользователь {full_name} удалён.")
     else:
         await query.edit_message_text("⚠️ Пользователь не найден.")
-    session.close()
 
 # --- Админ: управление событиями ---
-async def manage_events_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    await query.answer()
-    session = SessionLocal()
-    rows = (
-        session.query(Event, User.full_name)
-               .join(User, Event.creator)
-               .order_by(Event.event_date)
-               .all()
-    )
-    session.close()
-
-    if not rows:
-        await query.edit_message_text("Событий пока нет.")
-        return
+def _render_admin_events(page):
+    if not page.rows:
+        return "Предстоящих событий нет.", None
 
     text_lines = ["🗓 Все события:"]
     buttons = []
-    for evt, creator_name in rows:
+    for evt in page.rows:
         text_lines.append(
-            f"• {evt.id}. «{evt.title}» — {evt.event_date.strftime('%d.%m.%Y')} (создатель: {creator_name})"
+            f"• {evt.id}. «{evt.title}»{' 🔁' if evt.repeat else ''} — {evt.event_date.strftime('%d.%m.%Y')} "
+            f"(создатель: {evt.creator_name})"
         )
         buttons.append([
             InlineKeyboardButton("❌ Удалить", callback_data=f"admin_delete_evt_{evt.id}")
         ])
+    return "\n".join(text_lines), _with_nav(buttons, "eva", page, event_key)
 
-    await query.edit_message_text(
-        "\n".join(text_lines),
-        reply_markup=InlineKeyboardMarkup(buttons)
-    )
+async def manage_events_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    page = await run_db(events_page)
+
+    text, markup = _render_admin_events(page)
+    await query.edit_message_text(text, reply_markup=markup)
+
+def delete_event(evt_id):
+    """Удаляет событие; возвращает его название или None."""
+    session = SessionLocal()
+    title = repository.delete_event(session, evt_id)
+    if title:
+        session.commit()
+    session.close()
+    return title
 
 async def admin_delete_evt_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
     evt_id = int(query.data.split("_")[-1])
 
-    session = SessionLocal()
-    evt = session.query(Event).get(evt_id)
-    if evt:
-        title = evt.title
-        session.delete(evt)
-        session.commit()
+    title = await run_db_write(delete_event, evt_id)
+    if title:
         await query.edit_message_text(f"✅ Событие «{title}» удалено.")
     else:
         await query.edit_message_text("⚠️ Событие не найдено.")
-    session.close()
+
+# --- Листание списков ---
+def _with_nav(buttons, kind, page, key_fn):
+    """Добавляет к кнопкам строку «Назад»/«Вперёд»; None, если кнопок нет."""
+    nav = nav_row(kind, page, key_fn)
+    if nav:
+        buttons.append(nav)
+    return InlineKeyboardMarkup(buttons) if buttons else None
+
+async def page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Кнопки «Назад»/«Вперёд» во всех постраничных списках."""
+    query = update.callback_query
+    await query.answer()
+    kind, forward, raw = parse_callback(query.data)
+
+    if kind == "arc":
+        page = await run_db(archive_page, parse_event_key(raw), forward)
+        text, markup = _render_archive(page)
+    elif kind == "srh":
+        text = context.user_data.get('search_q')
+        if not text:
+            await query.edit_message_text("Поиск устарел — повторите /search.")
+            return
+        page = await run_db(search.search_page, text, search.page_offset(raw, forward))
+        text, markup = _render_search(text, page)
+    elif kind == "usr":
+        context.user_data['usr_at'] = (parse_user_key(raw), forward)
+        page = await run_db(users_page, parse_user_key(raw), forward)
+        text, markup = _render_users(page, context.user_data.get('usr_sel', set()))
+    elif kind == "evm":
+        user = await get_user_record(query.from_user.id)
+        if not user:
+            return
+        page = await run_db(events_page, parse_event_key(raw), forward, creator_id=user.id)
+        text, markup = _render_my_events(page)
+    else:
+        page = await run_db(events_page, parse_event_key(raw), forward)
+        render = _render_all_events if kind == "evl" else _render_admin_events
+        text, markup = render(page)
+    await query.edit_message_text(text, reply_markup=markup)
 
 # Обновлённый хэндлер справки
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = (
         "❓ *Справка по боту*\n\n"
         "🔹 *Регистрация* — запишите свои ФИО, должность и дату рождения.\n"
-        "🔹 *События* — просмотреть список всех запланированных событий.\n"
-        "🔹 *Создать событие* — задать своё мероприятие, выбрать участников и частоту напоминаний.\n"
+        "🔹 *События* — предстоящие события; прошедшие — по кнопке «Архив прошедших».\n"
+        "🔹 *Создать событие* — задать своё мероприятие, выбрать участников, частоту напоминаний "
+        "и повторение (семинары, заседания — каждую неделю или месяц).\n"
         "🔹 *Управление событиями* — посмотреть и удалить только свои события.\n"
-        "🔹 *Дни рождения* — бот автоматически напомнит всем о ваших днях рождения за неделю.\n\n"
-        "Напоминания приходят в 13:00 МСК по выбранному графику.\n"
+        "🔹 *Поиск* (/search слова) — найти событие по словам из названия или описания.\n"
+        "🔹 *Дни рождения* — бот автоматически напомнит всем о ваших днях рождения за неделю.\n"
+        "🔹 */digest* — получать всё одной сводкой раз в день.\n"
+        "🔹 */time* — выбрать час и часовой пояс уведомлений.\n\n"
+        "Напоминания приходят по выбранному графику, по умолчанию около 13:00 МСК.\n"
         "Если есть вопросы или предложения — пишите администратору."
     )
     # Отправляем как Markdown, чтобы выделить пункты
     await update.message.reply_text(text, parse_mode="Markdown", reply_markup=build_main_menu(False))
 
 
+def set_digest(telegram_id: int, value) -> bool:
+    """Режим сводки пользователя: True / False / None (как у всех); False — не зарегистрирован."""
+    session = SessionLocal()
+    updated = session.query(User).filter_by(telegram_id=telegram_id).update({User.digest: value})
+    session.commit()
+    session.close()
+    return bool(updated)
+
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/digest on|off|default — одна сводка в день вместо отдельных уведомлений."""
+    choice = {'on': True, 'off': False, 'default': None}
+    arg = context.args[0].lower() if context.args else None
+    if arg not in choice:
+        await update.message.reply_text(
+            "📬 Ежедневная сводка собирает напоминания, дни рождения и ближайшие события "
+            "в одно сообщение в ваше время доставки (/time).\n\n"
+            "/digest on — включить\n/digest off — отдельные сообщения\n"
+            f"/digest default — как у всех (сейчас {'включена' if digest.DIGEST_DEFAULT else 'выключена'})"
+        )
+        return
+    if not await run_db_write(set_digest, update.effective_user.id, choice[arg]):
+        await update.message.reply_text("Сначала зарегистрируйтесь.")
+        return
+    enabled = digest.wants_digest(choice[arg])
+    await update.message.reply_text("✅ Сводка включена." if enabled else "✅ Уведомления будут приходить отдельно.")
+
+
+def set_delivery_time(telegram_id: int, hour, tz) -> bool:
+    """Час и часовой пояс уведомлений; False — пользователь не зарегистрирован."""
+    session = SessionLocal()
+    updated = (
+        session.query(User).filter_by(telegram_id=telegram_id)
+        .update({User.notify_hour: hour, User.tz: tz})
+    )
+    session.commit()
+    session.close()
+    return bool(updated)
+
+
+async def time_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/time <час> [часовой пояс] — когда присылать уведомления."""
+    args = context.args or []
+    if args[:1] == ['default']:
+        hour, tz = None, None
+    else:
+        try:
+            hour = int(args[0])
+            if not 0 <= hour <= 23:
+                raise ValueError
+        except (IndexError, ValueError):
+            hour = None
+        tz = args[1] if len(args) > 1 else None
+        if hour is None or (tz and not delivery.is_valid_zone(tz)):
+            await update.message.reply_text(
+                "🕐 Когда присылать напоминания и поздравления:\n\n"
+                "/time 9 — в 9:00 по Москве\n"
+                "/time 9 Asia/Yekaterinburg — в 9:00 по вашему времени\n"
+                f"/time default — как у всех ({delivery.DELIVERY_HOUR}:00 МСК)\n\n"
+                f"Уведомления приходят в течение {delivery.DELIVERY_WINDOW:g} мин после этого часа."
+            )
+            return
+    if not await run_db_write(set_delivery_time, update.effective_user.id, hour, tz):
+        await update.message.reply_text("Сначала зарегистрируйтесь.")
+        return
+    if hour is None:
+        await update.message.reply_text(f"✅ Уведомления — в {delivery.DELIVERY_HOUR}:00 МСК.")
+    else:
+        await update.message.reply_text(f"✅ Уведомления — в {hour}:00 ({tz or 'МСК'}).")
+
+
+async def cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/cache_stats — статистика кэша пользователей (только для админов)."""
+    user = await get_user_record(update.effective_user.id)
+    if not user or not user.is_admin:
+        return
+    st = user_cache.stats()
+    await update.message.reply_text(
+        f"👥 Кэш пользователей: {st['size']} записей\n"
+        f"попаданий {st['hits']}, промахов {st['misses']} ({st['hit_rate']:.0%}), "
+        f"вытеснено {st['evictions']}"
+    )
+
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/stats — метрики бота (только для админов)."""
+    user = await get_user_record(update.effective_user.id)
+    if not user or not user.is_admin:
+        return
+    await update.message.reply_text(metrics.render_stats())
+
+
+def _cache_metrics():
+    st = user_cache.stats()
+    return {
+        ("bot_user_cache_hits_total", ()): st['hits'],
+        ("bot_user_cache_misses_total", ()): st['misses'],
+        ("bot_user_cache_evictions_total", ()): st['evictions'],
+        ("bot_user_cache_size", ()): st['size'],
+    }
+
+
+async def post_init(app) -> None:
+    app.bot_data['metrics_server'] = await metrics.start_http_server()
+
+
+async def post_shutdown(app) -> None:
+    await leader.leadership.release()
+    server = app.bot_data.get('metrics_server')
+    if server:
+        server.close()
+        await server.wait_closed()
+
+
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error("Ошибка:", exc_info=context.error)
 
-if __name__ == '__main__':
-    app = ApplicationBuilder().token(TOKEN).build()
+def build_application(bot=None, update_processor=None, persistence=None):
+    """Приложение со всеми хэндлерами; bot, обработчик апдейтов и хранилище подменяются в бенчмарках."""
+    app = (
+        ApplicationBuilder()
+        # ответы хэндлеров делят лимит Telegram с рассылками, но идут первыми
+        .bot(bot or metrics.InstrumentedBot(TOKEN, rate_limiter=broadcast.OutboundRateLimiter()))
+        .concurrent_updates(update_processor or webhook.PerUserUpdateProcessor(webhook.UPDATE_CONCURRENCY))
+        # незаконченные регистрации и черновики событий переживают перезапуск
+        .persistence(persistence or DbPersistence())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Разговорчики регистрации и событий
     reg_conv = ConversationHandler(
@@ -637,25 +1027,54 @@ if __name__ == '__main__':
         },
         fallbacks=[CommandHandler('cancel', cancel), MessageHandler(filters.Regex('^Меню$'), start)],
         allow_reentry=True,
+        name="registration",
+        persistent=True,
     )
-    evt_conv = ConversationHandler(
-        entry_points=[MessageHandler(filters.Regex('^Создать событие$'), event_start)],
+    # per_message=False — осознанно: кнопки выбора получателей относятся к
+    # диалогу пользователя, а не к отдельному сообщению (per_message=True
+    # несовместим с MessageHandler в тех же состояниях). Предупреждение PTB
+    # об этом сочетании поэтому глушим.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="If 'per_message=False'", category=PTBUserWarning)
+        evt_conv = ConversationHandler(
+            entry_points=[MessageHandler(filters.Regex('^Создать событие$'), event_start)],
+            states={
+                EVENT_TITLE:     [MessageHandler(filters.TEXT & ~filters.COMMAND, event_title)],
+                EVENT_DESC:      [MessageHandler(filters.TEXT & ~filters.COMMAND, event_desc)],
+                EVENT_INTERVAL:  [MessageHandler(filters.TEXT & ~filters.COMMAND, event_interval)],
+                EVENT_DATE:      [MessageHandler(filters.TEXT & ~filters.COMMAND, event_date)],
+                EVENT_REPEAT:    [MessageHandler(filters.TEXT & ~filters.COMMAND, event_repeat)],
+                EVENT_USERS:     [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND & ~filters.Regex('^Меню$'), event_users),
+                    CallbackQueryHandler(event_pick_callback, pattern=picker.PICK_PATTERN),
+                ],
+            },
+            fallbacks=[CommandHandler('cancel', cancel), MessageHandler(filters.Regex('^Меню$'), start)],
+            allow_reentry=True,
+            name="event",
+            persistent=True,
+            per_message=False,
+        )
+
+    search_conv = ConversationHandler(
+        entry_points=[CommandHandler('search', search_start), MessageHandler(filters.Regex('^Поиск$'), search_start)],
         states={
-            EVENT_TITLE:     [MessageHandler(filters.TEXT & ~filters.COMMAND, event_title)],
-            EVENT_DESC:      [MessageHandler(filters.TEXT & ~filters.COMMAND, event_desc)],
-            EVENT_INTERVAL:  [MessageHandler(filters.TEXT & ~filters.COMMAND, event_interval)],
-            EVENT_DATE:      [MessageHandler(filters.TEXT & ~filters.COMMAND, event_date)],
-            EVENT_USERS:     [MessageHandler(filters.TEXT & ~filters.COMMAND, event_users)],
+            SEARCH_QUERY: [MessageHandler(filters.TEXT & ~filters.COMMAND & ~filters.Regex('^Меню$'), search_query)],
         },
         fallbacks=[CommandHandler('cancel', cancel), MessageHandler(filters.Regex('^Меню$'), start)],
         allow_reentry=True,
+        name="search",
+        persistent=True,
     )
 
     # Handlers
+    # раньше всех: написавший пользователь снова доступен для рассылок
+    app.add_handler(TypeHandler(Update, reachability.check), group=-1)
     app.add_handler(CommandHandler("start", start))
     app.add_handler(MessageHandler(filters.Regex('^Меню$'), start))
     app.add_handler(reg_conv)
     app.add_handler(evt_conv)
+    app.add_handler(search_conv)
     app.add_handler(MessageHandler(filters.Regex('^События$'), events_list))
     app.add_handler(MessageHandler(filters.Regex('^Управление событиями$'), manage_events))
     app.add_handler(CallbackQueryHandler(delete_evt_callback, pattern=r"^delete_evt_\d+$"))
@@ -663,30 +1082,77 @@ if __name__ == '__main__':
     app.add_handler(CommandHandler("test_me", test_me))
     app.add_handler(CommandHandler("test_bday", test_birthday))
     app.add_handler(CommandHandler("test", test_notification))
+    app.add_handler(CommandHandler("cache_stats", cache_stats))
+    app.add_handler(CommandHandler("stats", stats))
+    app.add_handler(CommandHandler("digest", digest_command))
+    app.add_handler(CommandHandler("time", time_command))
 
     # Admin: users
     app.add_handler(CallbackQueryHandler(manage_users_callback,   pattern=r"^manage_users$"))
     app.add_handler(CallbackQueryHandler(promote_user_callback,   pattern=r"^promote_\d+$"))
     app.add_handler(CallbackQueryHandler(delete_user_callback,    pattern=r"^delete_user_\d+$"))
+    app.add_handler(CallbackQueryHandler(users_select_callback,   pattern=USER_SELECT_PATTERN))
+    app.add_handler(CallbackQueryHandler(import_users_help,       pattern=r"^import_users$"))
+    app.add_handler(MessageHandler(
+        filters.Document.FileExtension("csv") | filters.Document.FileExtension("json"), import_users_file
+    ))
 
     # Admin: events
     app.add_handler(CallbackQueryHandler(manage_events_admin_callback, pattern=r"^manage_events_admin$"))
     app.add_handler(CallbackQueryHandler(admin_delete_evt_callback,     pattern=r"^admin_delete_evt_\d+$"))
 
+    # Листание списков
+    app.add_handler(CallbackQueryHandler(archive_callback, pattern=r"^archive$"))
+    app.add_handler(CallbackQueryHandler(page_callback, pattern=PAGE_PATTERN))
+
     app.add_handler(MessageHandler(filters.Regex('^Справка$'), help_command))
     app.add_error_handler(error_handler)
+    metrics.instrument_handlers(app)
+    return app
 
-    session = SessionLocal()
-    for u in session.query(User).all():
-        schedule_birthday_reminder(
-            app.job_queue,
-            u.id,
-            u.birth_date
-        )
-    session.close()
 
+if __name__ == '__main__':
+    metrics.instrument_engine(models.engine)
+    metrics.REGISTRY.collectors.append(_cache_metrics)
+    metrics.REGISTRY.collectors.append(leader.collect)
+    metrics.REGISTRY.collectors.append(broadcast.collect)
+    metrics.REGISTRY.collectors.append(jobs.collect)
+    app = build_application()
+
+    init_db()
+    # рассылки выполняет только ведущий экземпляр (см. leader.py), хэндлеры — все
+    app.job_queue.run_repeating(leader_tick, interval=leader.LEASE_RENEW, first=0, name="leader")
+    app.job_queue.run_repeating(
+        metrics.track(leader.leader_only(send_reminder)),
+        interval=reminders.DISPATCH_INTERVAL, first=1, name="reminders"
+    )
+
+    app.job_queue.run_repeating(
+        metrics.track(leader.leader_only(send_outbox)),
+        interval=outbox.OUTBOX_INTERVAL, first=5, name="outbox"
+    )
+    app.job_queue.run_repeating(leader.leader_only(prune_outbox), interval=3600, first=60, name="outbox_prune")
+    app.job_queue.run_repeating(count_orphans, interval=3600, first=90, name="orphans")
 
+    app.job_queue.run_daily(
+        metrics.track(leader.leader_only(advance_recurring)),
+        time=time(0, 0, tzinfo=MSK), name="recurrence"
+    )
+    # после advance_all: закончившиеся серии уже не сдвинутся
+    app.job_queue.run_daily(
+        metrics.track(leader.leader_only(archive_events)),
+        time=time(0, 30, tzinfo=MSK), name="archive"
+    )
 
+    # одна ежедневная проверка дней рождения вместо задачи на каждого пользователя
+    app.job_queue.run_daily(
+        metrics.track(leader.leader_only(send_birthday_reminder)),
+        time=reminders.ENQUEUE_AT.replace(tzinfo=MSK), name="birthdays"
+    )
 
-    print("Бот запущен. Нажмите Ctrl+C для остановки.")
-    app.run_polling()
+    print(f"Бот запущен ({webhook.BOT_MODE}). Нажмите Ctrl+C для остановки.")
+    if webhook.BOT_MODE == 'webhook':
+        webhook.run_webhook(app)
+    else:
+        app.run_polling()
+    db.shutdown()
@@ -0,0 +1,288 @@
+# broadcast.py
+"""
+Массовая рассылка сообщений с учётом лимитов Telegram.
+
+Глобально бот может отправлять ~30 сообщений в секунду, в один чат — не чаще
+одного в секунду. Оба ограничения реализованы через token bucket, а сами
+отправки выполняются параллельно несколькими воркерами.
+
+Глобальный бюджет общий для всех исходящих запросов бота (outbound): ответы
+хэндлеров идут через OutboundRateLimiter в полосе INTERACTIVE, рассылки — в
+полосе BULK. Ответы пользователям обслуживаются первыми, но пока ждут обе
+полосы, рассылке достаётся не меньше BULK_SHARE бюджета.
+
+    BULK_SHARE=0.2
+
+Замер: python -m benchmarks.lanes
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE     = 30    # сообщений в секунду на всего бота
+PER_CHAT_RATE   = 1     # сообщений в секунду в один чат
+MAX_CONCURRENCY = 30    # одновременных запросов к Bot API
+MAX_RETRIES     = 3     # повторов одного сообщения после RetryAfter
+IDLE_BUCKET_TTL = 60    # через сколько секунд простоя забываем бакет чата
+BULK_SHARE      = float(os.getenv('BULK_SHARE', '0.2'))  # гарантированная доля рассылок
+
+INTERACTIVE, BULK = 0, 1
+LANE_NAMES = ("interactive", "bulk")
+
+
+def _seconds(value) -> float:
+    """retry_after бывает и int, и timedelta — приводим к секундам."""
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Запрещает выдачу токенов на seconds секунд (после RetryAfter)."""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated = self.paused_until
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class PriorityLimiter:
+    """
+    Глобальный token bucket с очередями по полосам. Токены по одному раздаёт
+    диспетчер: сначала INTERACTIVE, но пока ждут обе полосы, каждый
+    (1 - bulk_share) / bulk_share-й токен уходит в BULK.
+    """
+
+    def __init__(self, rate: float = GLOBAL_RATE, bulk_share: float = BULK_SHARE):
+        self.bucket = TokenBucket(rate)
+        # кредит BULK растёт на каждый токен, отданный INTERACTIVE при ждущей рассылке
+        self.bulk_credit = bulk_share / (1 - bulk_share) if bulk_share < 1 else float('inf')
+        self._credit = 0.0
+        self._waiters = (deque(), deque())   # по полосам: futures ожидающих
+        self._dispatcher = None
+
+    def pause(self, seconds: float) -> None:
+        self.bucket.pause(seconds)
+
+    def waiting(self, lane: int) -> int:
+        return len(self._waiters[lane])
+
+    async def acquire(self, lane: int = INTERACTIVE) -> None:
+        started = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(fut)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await fut
+        metrics.observe("bot_outbound_wait_seconds", time.monotonic() - started, lane=LANE_NAMES[lane])
+
+    def _next(self):
+        """Чей следующий токен; None — никто не ждёт."""
+        for queue in self._waiters:
+            while queue and queue[0].done():     # ожидание отменили
+                queue.popleft()
+        interactive, bulk = self._waiters
+        if bulk and (not interactive or self._credit >= 1):
+            self._credit = self._credit - 1 if interactive else 0.0
+            return bulk.popleft()
+        if interactive:
+            if bulk:
+                self._credit += self.bulk_credit
+            return interactive.popleft()
+        return None
+
+    async def _dispatch(self) -> None:
+        while any(self._waiters):
+            await self.bucket.acquire()
+            fut = self._next()
+            if fut is None:
+                self.bucket.tokens += 1          # все ожидавшие ушли — токен не тратим
+                return
+            fut.set_result(None)
+
+
+# Общий бюджет всех исходящих запросов бота
+outbound = PriorityLimiter()
+
+def collect() -> dict:
+    """Для metrics.REGISTRY.collectors: сколько запросов ждёт лимита в каждой полосе."""
+    return {("bot_outbound_waiting", (("lane", name),)): float(outbound.waiting(lane))
+            for lane, name in enumerate(LANE_NAMES)}
+
+
+# Запрос уже оплачен токеном BULK (Broadcaster.send) — OutboundRateLimiter его не считает
+_prepaid = contextvars.ContextVar('prepaid', default=False)
+
+
+class OutboundRateLimiter(BaseRateLimiter):
+    """
+    Rate limiter для ExtBot: запросы в чаты (с chat_id) проходят через
+    outbound в полосе INTERACTIVE, если это не отправка из рассылки.
+    """
+
+    def __init__(self, limiter: PriorityLimiter = None):
+        self.limiter = limiter or outbound
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if data.get('chat_id') is not None and not _prepaid.get():
+            await self.limiter.acquire(INTERACTIVE)
+        try:
+            return await callback(*args, **kwargs)
+        except RetryAfter as e:
+            # Telegram всё-таки ограничил: притормаживаем обе полосы
+            self.limiter.pause(_seconds(e.retry_after))
+            raise
+
+
+@dataclass
+class BroadcastReport:
+    """Итоги одной рассылки."""
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    errors: dict = field(default_factory=dict)  # chat_id -> исключение
+
+    @property
+    def rate(self) -> float:
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"отправлено {self.sent}/{self.total}, ошибок {self.failed}, "
+            f"повторов {self.retries}, {self.elapsed:.1f} с ({self.rate:.1f} сообщ./с)"
+        )
+
+
+class Broadcaster:
+    """
+    Рассылает одно сообщение множеству получателей.
+
+    Бакеты общие для всех рассылок одного экземпляра, поэтому параллельные
+    рассылки (напоминания + дни рождения) делят один лимит; общий экземпляр
+    делит его ещё и с ответами хэндлеров (outbound).
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE,
+                 concurrency: int = MAX_CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 limiter: PriorityLimiter = None):
+        self.limiter = limiter or PriorityLimiter(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._chat_buckets: dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10_000:
+                self._prune_buckets()
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate)
+        return bucket
+
+    def _prune_buckets(self) -> None:
+        deadline = time.monotonic() - IDLE_BUCKET_TTL
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            if bucket.updated < deadline and not bucket._lock.locked():
+                del self._chat_buckets[chat_id]
+
+    async def send(self, bot, chat_id: int, text: str, report: BroadcastReport, **kwargs) -> bool:
+        """Отправляет одно сообщение, соблюдая лимиты и повторяя после RetryAfter."""
+        for attempt in range(self.max_retries + 1):
+            await self._chat_bucket(chat_id).acquire()
+            await self.limiter.acquire(BULK)
+            prepaid = _prepaid.set(True)
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                report.sent += 1
+                return True
+            except RetryAfter as e:
+                delay = _seconds(e.retry_after)
+                logger.warning(f"Flood control: пауза {delay} с (чат {chat_id})")
+                self.limiter.pause(delay)
+                if attempt < self.max_retries:
+                    report.retries += 1
+                    continue
+                error = e
+            except TelegramError as e:
+                error = e
+            finally:
+                _prepaid.reset(prepaid)
+            break
+        report.failed += 1
+        report.errors[chat_id] = error
+        return False
+
+    async def broadcast(self, bot, chat_ids, text: str, **kwargs) -> BroadcastReport:
+        """
+        Отправляет text всем chat_ids параллельно и возвращает отчёт.
+        kwargs передаются в bot.send_message (parse_mode и т.п.).
+        """
+        chat_ids = list(dict.fromkeys(chat_ids))  # без дублей, порядок сохраняем
+        report = BroadcastReport(total=len(chat_ids))
+        queue = iter(chat_ids)
+        started = time.monotonic()
+
+        async def worker():
+            for chat_id in queue:
+                await self.send(bot, chat_id, text, report, **kwargs)
+
+        workers = min(self.concurrency, len(chat_ids))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        report.elapsed = time.monotonic() - started
+        logger.info(f"Рассылка: {report}")
+        metrics.inc("bot_broadcast_messages_total", report.sent, result="sent")
+        metrics.inc("bot_broadcast_messages_total", report.failed, result="failed")
+        metrics.inc("bot_broadcast_retries_total", report.retries)
+        metrics.observe("bot_broadcast_seconds", report.elapsed)
+        return report
+
+
+# Общий экземпляр для всего бота
+broadcaster = Broadcaster(limiter=outbound)
@@ -0,0 +1,129 @@
+# cache.py
+"""
+Кэш пользователей по telegram_id.
+
+Запрос «кто это» выполняется почти на каждое сообщение (кнопка «Меню»),
+поэтому компактные записи о пользователях держим в памяти: LRU с ограничением
+размера и TTL. Все изменения пользователя в этом процессе вызывают
+invalidate(). Правки из других процессов (promote.py, roster.py из
+командной строки) до кэша работающего бота не доходят: их устаревание
+ограничено только USER_CACHE_TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+
+import repository
+from db import run_db
+from models import SessionLocal
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL  = float(os.getenv('USER_CACHE_TTL', '300'))  # секунд
+
+
+@dataclass(frozen=True, slots=True)
+class UserRecord:
+    id: int
+    telegram_id: int
+    full_name: str
+    position: str
+    birth_date: date
+    is_admin: bool
+    # бот заблокирован или чат удалён (reachability.py)
+    unreachable: bool = False
+
+    @classmethod
+    def from_row(cls, row) -> "UserRecord":
+        """Из repository.user_row() — без загрузки ORM-объекта."""
+        return cls(*row)
+
+
+_MISSING = object()
+
+
+class UserCache:
+    """LRU + TTL; None тоже кэшируется — «такого пользователя нет»."""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        # растёт при каждой инвалидации: загрузка, начатая до неё, не попадёт в кэш
+        self.generation = 0
+        self._data = OrderedDict()  # telegram_id -> (expires_at, UserRecord | None)
+        # пишут и event loop, и потоки БД (db.run_db_write)
+        self._lock = threading.Lock()
+
+    def get(self, tg_id: int):
+        """Запись, None (пользователя нет) или _MISSING, если в кэше пусто."""
+        with self._lock:
+            item = self._data.get(tg_id)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[tg_id]
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(tg_id)
+            self.hits += 1
+            return item[1]
+
+    def put(self, tg_id: int, record, generation: int = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[tg_id] = (time.monotonic() + self.ttl, record)
+            self._data.move_to_end(tg_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tg_id: int = None) -> None:
+        """Сбрасывает запись пользователя или, без аргумента, весь кэш."""
+        with self._lock:
+            self.generation += 1
+            if tg_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(tg_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+user_cache = UserCache()
+
+
+def _load_from_db(tg_id: int):
+    generation = user_cache.generation
+    session = SessionLocal()
+    row = repository.user_row(session, tg_id)
+    record = UserRecord.from_row(row) if row else None
+    session.close()
+    user_cache.put(tg_id, record, generation)
+    return record
+
+
+def load_user(tg_id: int):
+    """Синхронно: UserRecord из кэша или БД, None — если не зарегистрирован."""
+    record = user_cache.get(tg_id)
+    if record is _MISSING:
+        record = _load_from_db(tg_id)
+    return record
+
+
+async def get_user_record(tg_id: int):
+    """Как load_user, но промах уходит в пул потоков БД, а попадание — без него."""
+    record = user_cache.get(tg_id)
+    if record is _MISSING:
+        record = await run_db(_load_from_db, tg_id)
+    return record
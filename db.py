@@ -0,0 +1,37 @@
+# db.py
+"""
+Неблокирующий доступ к БД для хэндлеров.
+
+SQLAlchemy-сессии остаются синхронными, но выполняются в ограниченном пуле
+потоков, поэтому медленная запись в SQLite не останавливает event loop.
+Записи идут через отдельный поток-писатель: SQLite всё равно допускает только
+одного писателя, и ожидающие блокировки записи не занимают потоки читателей.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Размер пула читателей
+DB_WORKERS = int(os.getenv('DB_WORKERS', '4'))
+
+_readers = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db-read')
+_writer  = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+
+
+async def run_db(fn, *args, **kwargs):
+    """Выполняет читающую функцию fn(*args, **kwargs) в пуле потоков БД."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, partial(fn, *args, **kwargs))
+
+
+async def run_db_write(fn, *args, **kwargs):
+    """Выполняет пишущую функцию fn(*args, **kwargs) в потоке-писателе."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, partial(fn, *args, **kwargs))
+
+
+def shutdown() -> None:
+    """Дожидается завершения запросов в пулах (при остановке бота)."""
+    _readers.shutdown(wait=True)
+    _writer.shutdown(wait=True)
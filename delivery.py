@@ -0,0 +1,61 @@
+# delivery.py
+"""
+Время доставки уведомлений.
+
+Расписание ставит уведомления дня в очередь заранее (reminders.ENQUEUE_AT),
+а каждому получателю назначается свой момент доставки: его час
+(users.notify_hour, по умолчанию DELIVERY_HOUR) в его часовом поясе
+(users.tz, по умолчанию МСК) плюс постоянное смещение внутри окна
+DELIVERY_WINDOW, вычисленное из telegram_id. Пользователь каждый день
+получает уведомления в одно и то же время, а отправки равномерно
+распределены по окну вместо одной секунды.
+
+    DELIVERY_HOUR=13
+    DELIVERY_WINDOW=60     минут; 0 — всем ровно в начале часа
+
+Замер пика: python -m benchmarks.peak
+"""
+import os
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import reminders
+
+DELIVERY_HOUR   = int(os.getenv('DELIVERY_HOUR', '13'))
+DELIVERY_WINDOW = float(os.getenv('DELIVERY_WINDOW', '60'))  # минут
+
+DELIVERY_AT = time(DELIVERY_HOUR)
+
+
+def zone(name: str = None):
+    """Часовой пояс по имени IANA (Europe/Samara); МСК, если не задан или неизвестен."""
+    if not name:
+        return reminders.MSK
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return reminders.MSK
+
+
+def is_valid_zone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def slot_offset(telegram_id: int, window: float = None) -> float:
+    """
+    Смещение пользователя внутри окна, в секундах. Мультипликативный хэш
+    равномерно раскладывает и подряд идущие id, и случайные.
+    """
+    window = DELIVERY_WINDOW * 60 if window is None else window
+    return (telegram_id * 2654435761 % 2 ** 32) / 2 ** 32 * window
+
+
+def deliver_at(telegram_id: int, day, tz: str = None, hour: int = None, now: datetime = None) -> datetime:
+    """Момент доставки уведомлений дня day получателю (naive UTC); если он прошёл — сейчас."""
+    local = datetime.combine(day, time(DELIVERY_HOUR if hour is None else hour), zone(tz))
+    at = local.astimezone(timezone.utc).replace(tzinfo=None) + timedelta(seconds=slot_offset(telegram_id))
+    return max(at, now or reminders.utc_now())
@@ -0,0 +1,123 @@
+# digest.py
+"""
+Ежедневная сводка уведомлений.
+
+Пользователь в режиме сводки получает вместо отдельных сообщений одно:
+напоминания о событиях, дни рождения коллег и ближайшие события, в которых
+он участвует. Рассылки кладут такие уведомления в outbox как пункты сводки
+(digest_day) со временем доставки получателя (см. delivery.py), а
+build_digests() в это время собирает наступившие пункты каждого получателя
+в одно сообщение и ставит его в обычную очередь.
+
+    DIGEST_MODE=off          off | on — для тех, кто не выбрал режим сам (/digest)
+    DIGEST_UPCOMING_DAYS=7   на сколько дней вперёд показывать события
+
+Пункт, появившийся уже после времени доставки, уходит следующей маленькой
+сводкой.
+"""
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+import metrics
+import outbox
+import reminders
+from models import engine, Event, OutboxMessage, User, event_recipients
+
+DIGEST_DEFAULT       = os.getenv('DIGEST_MODE', 'off').lower() == 'on'
+DIGEST_UPCOMING_DAYS = int(os.getenv('DIGEST_UPCOMING_DAYS', '7'))
+
+CHUNK = 500             # chat_id в одном IN (...)
+MAX_MESSAGE = 4096      # лимит длины сообщения Telegram
+
+_outbox = OutboxMessage.__table__
+
+
+def wants_digest(setting) -> bool:
+    """users.digest: True / False — выбор пользователя, None — как в .env."""
+    return DIGEST_DEFAULT if setting is None else setting
+
+
+def render(day, items: list, upcoming: list) -> list:
+    """Текст сводки; если он длиннее лимита Telegram — несколько сообщений по строкам."""
+    lines = [f"📬 Сводка на {day.strftime('%d.%m.%Y')}", ""]
+    lines += items
+    if upcoming:
+        lines += ["", "📅 Ближайшие события:"]
+        lines += [f"• {d.strftime('%d.%m')} — «{title}»" for d, title in upcoming]
+
+    parts, current = [], ""
+    for line in lines:
+        line = line[:MAX_MESSAGE]
+        if current and len(current) + 1 + len(line) > MAX_MESSAGE:
+            parts.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    parts.append(current)
+    return parts
+
+
+def _upcoming(conn, chat_ids: list, day) -> dict:
+    """{chat_id: [(event_id, дата, название), ...]} на DIGEST_UPCOMING_DAYS вперёд."""
+    result = {}
+    for i in range(0, len(chat_ids), CHUNK):
+        rows = conn.execute(
+            select(User.telegram_id, Event.id, Event.event_date, Event.title)
+            .join(event_recipients, event_recipients.c.user_id == User.id)
+            .join(Event, Event.id == event_recipients.c.event_id)
+            .where(
+                User.telegram_id.in_(chat_ids[i:i + CHUNK]),
+                Event.event_date >= day,
+                Event.event_date <= day + timedelta(days=DIGEST_UPCOMING_DAYS),
+            )
+            .order_by(Event.event_date, Event.id)
+        )
+        for chat_id, event_id, event_date, title in rows:
+            result.setdefault(chat_id, []).append((event_id, event_date, title))
+    return result
+
+
+def build_digests(now: datetime = None) -> int:
+    """
+    Собирает наступившие пункты сводок в сообщения (одно на получателя, если
+    влезает) и ставит их в outbox; возвращает число сообщений. Пункты
+    помечаются отправленными в той же транзакции.
+    """
+    now = now or reminders.utc_now()
+    day = reminders.msk_day(now)
+    with engine.begin() as conn:
+        items = conn.execute(
+            select(_outbox.c.id, _outbox.c.chat_id, _outbox.c.text, _outbox.c.event_id,
+                   _outbox.c.next_attempt_at)
+            .where(_outbox.c.next_attempt_at <= now, _outbox.c.digest_day.isnot(None))
+            .order_by(_outbox.c.chat_id, _outbox.c.id)
+        ).all()
+        if not items:
+            return 0
+
+        by_chat = {}
+        for item in items:
+            by_chat.setdefault(item.chat_id, []).append(item)
+        upcoming = _upcoming(conn, list(by_chat), day)
+
+        messages = []
+        for chat_id, chat_items in by_chat.items():
+            mentioned = {it.event_id for it in chat_items}
+            events = [(d, title) for evt_id, d, title in upcoming.get(chat_id, ()) if evt_id not in mentioned]
+            # ключ по первому пункту: повторный запуск соберёт только новые пункты
+            key = f"digest:{chat_id}:{chat_items[0].id}"
+            parts = render(day, [it.text for it in chat_items], events)
+            messages += [outbox.message(f"{key}:{n}", chat_id, text) for n, text in enumerate(parts)]
+        outbox.enqueue(conn, messages, now)
+
+        ids = [it.id for it in items]
+        for i in range(0, len(ids), CHUNK):
+            conn.execute(
+                update(_outbox).where(_outbox.c.id.in_(ids[i:i + CHUNK]))
+                .values(sent_at=now, next_attempt_at=None)
+            )
+    for item in items:
+        metrics.observe("bot_job_lag_seconds", (now - item.next_attempt_at).total_seconds(), job="digest")
+    return len(messages)
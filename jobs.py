@@ -0,0 +1,91 @@
+# jobs.py
+"""
+Отложенная работа, привязанная к событиям и пользователям, и её отмена.
+
+Вся отложенная работа бота — строки в БД, а не задачи JobQueue:
+
+- reminder_schedule — следующее напоминание о событии (индекс по event_id);
+- outbox — сообщения, ждущие слота доставки или повтора: о каком событии
+  (event_id), о каком пользователе (user_id, именинник) и кому (chat_id) —
+  по каждому полю есть индекс.
+
+Удаление события или пользователя, а также недоступность получателя
+(reachability.py) отменяют ровно их строки — несколькими
+UPDATE/DELETE по индексам в той же транзакции, без просмотра очереди, так
+что стоимость не зависит ни от размера очереди, ни от числа получателей.
+Отменённое сообщение остаётся в outbox с last_error = CANCELLED и удаляется
+вместе с отправленными (outbox.prune).
+
+Осиротевшие строки (событие или пользователь удалены, а работа осталась)
+раз в час пересчитывает count_orphans() — на каждом экземпляре, а не только
+на ведущем; число публикуется как bot_orphaned_jobs и в норме равно нулю.
+"""
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from models import engine, Event, OutboxMessage, ReminderSchedule, User
+
+CANCELLED = "отменено"
+
+_outbox = OutboxMessage.__table__
+_pending = _outbox.c.next_attempt_at.isnot(None)
+
+# последний подсчёт count_orphans(): {вид: строк}
+orphans = {}
+
+
+def _cancel(conn, condition) -> int:
+    """conn — Session или Connection: отмена идёт в транзакции вызывающего."""
+    return conn.execute(
+        update(_outbox).where(condition, _pending).values(next_attempt_at=None, last_error=CANCELLED)
+    ).rowcount
+
+
+def cancel_events(session: Session, evt_ids) -> int:
+    """
+    Снимает расписание и неотправленные уведомления событий (evt_ids —
+    список или подзапрос); возвращает число отменённых сообщений.
+    """
+    session.execute(
+        delete(ReminderSchedule).where(ReminderSchedule.event_id.in_(evt_ids))
+        .execution_options(synchronize_session=False)
+    )
+    return _cancel(session, _outbox.c.event_id.in_(evt_ids))
+
+
+def cancel_users(session: Session, user_ids: list, telegram_ids: list) -> int:
+    """Отменяет неотправленные уведомления о пользователях и им самим."""
+    return _cancel(session, _outbox.c.user_id.in_(user_ids)) + cancel_chats(session, telegram_ids)
+
+
+def cancel_chats(conn, chat_ids: list) -> int:
+    """Отменяет неотправленные сообщения в чаты chat_ids (получатели недоступны)."""
+    return _cancel(conn, _outbox.c.chat_id.in_(chat_ids))
+
+
+def count_orphans() -> dict:
+    """Неотменённая работа удалённых событий и пользователей."""
+    with engine.connect() as conn:
+        counts = {
+            'schedule': conn.execute(
+                select(func.count()).select_from(ReminderSchedule)
+                .outerjoin(Event, Event.id == ReminderSchedule.event_id).where(Event.id.is_(None))
+            ).scalar(),
+            'outbox_event': conn.execute(
+                select(func.count()).select_from(_outbox)
+                .outerjoin(Event, Event.id == _outbox.c.event_id)
+                .where(_pending, _outbox.c.event_id.isnot(None), Event.id.is_(None))
+            ).scalar(),
+            'outbox_user': conn.execute(
+                select(func.count()).select_from(_outbox)
+                .outerjoin(User, User.id == _outbox.c.user_id)
+                .where(_pending, _outbox.c.user_id.isnot(None), User.id.is_(None))
+            ).scalar(),
+        }
+    orphans.update(counts)
+    return counts
+
+
+def collect() -> dict:
+    """Для metrics.REGISTRY.collectors."""
+    return {("bot_orphaned_jobs", (("kind", kind),)): float(n) for kind, n in orphans.items()}
@@ -0,0 +1,144 @@
+# leader.py
+"""
+Выбор ведущего экземпляра через аренду (lease) в БД.
+
+Несколько процессов бота могут работать с одной БД: хэндлеры обслуживают
+все, а рассылки (напоминания, дни рождения) выполняет только ведущий.
+Ведущий продлевает аренду каждые LEASE_RENEW секунд; если он упал, через
+LEASE_TTL аренду забирает другой экземпляр. При штатной остановке аренда
+освобождается сразу.
+
+    INSTANCE_ID=bot-1      имя экземпляра (по умолчанию host:pid)
+    LEASE_TTL=15           секунд
+    LEASE_RENEW=5          секунд
+
+Захват — один условный UPDATE (или INSERT новой аренды), поэтому он атомарен
+и в SQLite, и в Postgres. Сроки считаются по часам процессов, так что на
+разных машинах часы должны быть синхронизированы (NTP).
+
+Проверка на нескольких локальных процессах: python -m benchmarks.failover
+"""
+import functools
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+import metrics
+from db import run_db_write
+from models import engine, Lease
+from reminders import utc_now
+
+logger = logging.getLogger(__name__)
+
+INSTANCE_ID = os.getenv('INSTANCE_ID') or f"{socket.gethostname()}:{os.getpid()}"
+LEASE_TTL   = float(os.getenv('LEASE_TTL', '15'))
+LEASE_RENEW = float(os.getenv('LEASE_RENEW', '5'))
+
+SCHEDULER_LEASE = 'scheduler'
+PRUNE_EVERY     = 3600      # раз в час удаляем аренды, истёкшие больше суток назад
+
+
+def try_acquire(name: str, owner: str, ttl: float = LEASE_TTL, now=None) -> bool:
+    """Захватывает или продлевает аренду; False — она у другого и ещё не истекла."""
+    now = now or utc_now()
+    expires = now + timedelta(seconds=ttl)
+    try:
+        with engine.begin() as conn:
+            taken = conn.execute(
+                update(Lease)
+                .where(Lease.name == name, or_(Lease.owner == owner, Lease.expires_at < now))
+                .values(owner=owner, expires_at=expires)
+            ).rowcount
+            if taken:
+                return True
+            if conn.execute(select(Lease.name).where(Lease.name == name)).first():
+                return False
+            conn.execute(insert(Lease).values(name=name, owner=owner, expires_at=expires))
+        return True
+    except IntegrityError:
+        return False  # новую аренду одновременно создал другой экземпляр
+
+
+def release(name: str, owner: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            update(Lease).where(Lease.name == name, Lease.owner == owner).values(expires_at=utc_now())
+        )
+
+
+def prune(older_than: timedelta = timedelta(days=1)) -> int:
+    with engine.begin() as conn:
+        return conn.execute(delete(Lease).where(Lease.expires_at < utc_now() - older_than)).rowcount
+
+
+class Leadership:
+    """
+    Состояние ведущего в этом процессе. tick() вызывается каждые LEASE_RENEW
+    секунд; is_leader истекает локально не позже, чем аренда в БД, даже если
+    продлить её не удалось.
+    """
+
+    def __init__(self, name: str = SCHEDULER_LEASE, owner: str = INSTANCE_ID, ttl: float = LEASE_TTL):
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.valid_until = 0.0      # time.monotonic()
+        self._pruned_at = 0.0
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self.valid_until
+
+    async def tick(self) -> bool:
+        """Продлевает или захватывает аренду; True — если этот экземпляр только что стал ведущим."""
+        was_leader = self.is_leader
+        started = time.monotonic()
+        try:
+            acquired = await run_db_write(try_acquire, self.name, self.owner, self.ttl)
+        except SQLAlchemyError as e:
+            logger.error(f"Аренда {self.name}: ошибка БД: {e}")
+            acquired = False
+        # срок отсчитываем от начала запроса — в БД он наступит не раньше
+        self.valid_until = started + self.ttl if acquired else 0.0
+
+        if acquired and not was_leader:
+            logger.info(f"{self.owner}: стал ведущим ({self.name})")
+            metrics.inc("bot_leader_elections_total")
+        elif was_leader and not acquired:
+            logger.warning(f"{self.owner}: потерял аренду {self.name}")
+
+        if acquired and started - self._pruned_at > PRUNE_EVERY:
+            self._pruned_at = started
+            await run_db_write(prune)
+        return acquired and not was_leader
+
+    async def release(self) -> None:
+        if self.is_leader:
+            self.valid_until = 0.0
+            await run_db_write(release, self.name, self.owner)
+            logger.info(f"{self.owner}: аренда {self.name} освобождена")
+
+
+# Общий экземпляр для всего бота
+leadership = Leadership()
+
+
+def collect() -> dict:
+    """Для metrics.REGISTRY.collectors."""
+    return {("bot_is_leader", ()): float(leadership.is_leader)}
+
+
+def leader_only(callback):
+    """Задача JobQueue, которая выполняется только на ведущем экземпляре."""
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        if leadership.is_leader:
+            return await callback(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,289 @@
+# metrics.py
+"""
+Метрики горячих путей бота.
+
+- задержка и ошибки хэндлеров и задач JobQueue;
+- число и длительность SQL-запросов (события движка SQLAlchemy);
+- задержка и ошибки запросов к Bot API (send_message и др.);
+- отставание задач от расписания (job lag).
+
+Гистограммы с фиксированными корзинами: запись — пара сравнений и сложений,
+поэтому инструментацию можно не выключать в продакшене. Снимок доступен
+админам командой /stats и в формате Prometheus по HTTP, если задан METRICS_PORT.
+"""
+import asyncio
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+from telegram.error import TelegramError
+from telegram.ext import ConversationHandler, ExtBot
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 — HTTP-эндпоинт выключен
+
+# корзины в секундах: от 1 мс до 1 минуты
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # последняя — +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины (как histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lo + (hi - lo) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+class Registry:
+    """Гистограммы и счётчики по (имя, метки); метки — кортеж пар."""
+
+    def __init__(self):
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(float)
+        self.collectors = []        # функции, возвращающие {(имя, метки): значение}
+        self._lock = threading.Lock()  # SQL-события приходят из потоков БД
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.histograms[key].observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += amount
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self.histograms.get((name, tuple(sorted(labels.items()))), Histogram())
+
+    def by_label(self, name: str, label: str) -> dict:
+        """{значение метки: Histogram} для одной метрики."""
+        with self._lock:
+            histograms = list(self.histograms.items())
+        return {dict(labels).get(label): h for (n, labels), h in histograms if n == name}
+
+    def counters_snapshot(self) -> dict:
+        """Копия счётчиков: потоки БД могут добавлять ключи во время обхода."""
+        with self._lock:
+            return dict(self.counters)
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+        counters = self.counters_snapshot()
+        for collect in self.collectors:
+            counters.update(collect())
+
+        typed = set()
+        for (name, labels), h in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), h.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{fmt(labels)} {h.total}")
+            lines.append(f"{name}_count{fmt(labels)} {h.count}")
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                typed.add(name)
+                kind = "counter" if name.endswith("_total") else "gauge"
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+observe = REGISTRY.observe
+inc = REGISTRY.inc
+
+
+# --- Хэндлеры и задачи ---
+def track(callback, name: str = None):
+    """Оборачивает корутину-хэндлер/задачу: время выполнения и исключения."""
+    label = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            inc("bot_handler_errors_total", handler=label)
+            raise
+        finally:
+            observe("bot_handler_seconds", time.perf_counter() - started, handler=label)
+
+    wrapper.__wrapped_metrics__ = True
+    return wrapper
+
+
+def _wrap_handler(handler) -> None:
+    if isinstance(handler, ConversationHandler):
+        for h in handler.entry_points + handler.fallbacks:
+            _wrap_handler(h)
+        for handlers in handler.states.values():
+            for h in handlers:
+                _wrap_handler(h)
+        return
+    if not getattr(handler.callback, '__wrapped_metrics__', False):
+        handler.callback = track(handler.callback)
+
+
+def instrument_handlers(app) -> None:
+    """Подключает метрики ко всем уже зарегистрированным хэндлерам приложения."""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _wrap_handler(handler)
+
+
+def job_lag(job: str, scheduled_ts: float) -> None:
+    """Отставание фактического запуска от запланированного (секунды epoch)."""
+    observe("bot_job_lag_seconds", max(0.0, time.time() - scheduled_ts), job=job)
+
+
+# --- SQL ---
+def instrument_engine(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('query_started')
+        if not stack:
+            return
+        started = stack.pop()
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        observe("bot_db_query_seconds", time.perf_counter() - started, kind=kind)
+
+
+# --- Bot API ---
+class InstrumentedBot(ExtBot):
+    """ExtBot, измеряющий каждый запрос к Bot API."""
+
+    async def _post(self, endpoint: str, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super()._post(endpoint, *args, **kwargs)
+        except TelegramError as e:
+            inc("bot_api_errors_total", method=endpoint, error=type(e).__name__)
+            raise
+        finally:
+            observe("bot_api_request_seconds", time.perf_counter() - started, method=endpoint)
+
+
+# --- Отчёты ---
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}"
+
+
+def render_stats() -> str:
+    """Краткая сводка для /stats."""
+    counters = REGISTRY.counters_snapshot()
+    lines = ["📊 Метрики бота (p50 / p99, мс):", "", "Хэндлеры:"]
+    for name, h in sorted(REGISTRY.by_label("bot_handler_seconds", "handler").items()):
+        errors = counters.get(("bot_handler_errors_total", (("handler", name),)), 0)
+        lines.append(f"• {name}: {h.count} выз., {_ms(h.quantile(.5))} / {_ms(h.quantile(.99))}"
+                     + (f", ошибок {errors:.0f}" if errors else ""))
+
+    lines += ["", "SQL:"]
+    for kind, h in sorted(REGISTRY.by_label("bot_db_query_seconds", "kind").items()):
+        lines.append(f"• {kind}: {h.count} запр., {_ms(h.quantile(.5))} / {_ms(h.quantile(.99))}")
+
+    lines += ["", "Bot API:"]
+    for method, h in sorted(REGISTRY.by_label("bot_api_request_seconds", "method").items()):
+        errors = sum(v for (n, labels), v in counters.items()
+                     if n == "bot_api_errors_total" and dict(labels).get("method") == method)
+        lines.append(f"• {method}: {h.count} запр., {_ms(h.quantile(.5))} / {_ms(h.quantile(.99))}"
+                     + (f", ошибок {errors:.0f}" if errors else ""))
+
+    lag = REGISTRY.by_label("bot_job_lag_seconds", "job")
+    if lag:
+        lines += ["", "Отставание задач:"]
+        for job, h in sorted(lag.items()):
+            lines.append(f"• {job}: p50 {_ms(h.quantile(.5))}, p99 {_ms(h.quantile(.99))}")
+
+    waits = REGISTRY.by_label("bot_outbound_wait_seconds", "lane")
+    if waits:
+        lines += ["", "Ожидание лимита Telegram:"]
+        for lane, h in sorted(waits.items()):
+            lines.append(f"• {lane}: {h.count} запр., {_ms(h.quantile(.5))} / {_ms(h.quantile(.99))}")
+
+    extra = {}
+    for collect in REGISTRY.collectors:
+        extra.update(collect())
+    if extra:
+        lines += ["", "Прочее:"]
+        for (name, labels), value in sorted(extra.items()):
+            suffix = ",".join(f"{k}={v}" for k, v in labels)
+            lines.append(f"• {name}{'{' + suffix + '}' if suffix else ''}: {value:g}")
+    return "\n".join(lines)
+
+
+# --- HTTP-эндпоинт Prometheus ---
+async def _serve_client(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass  # заголовки не нужны
+        path = request_line.split()[1] if len(request_line.split()) > 1 else b"/"
+        if path == b"/metrics":
+            status, body = "200 OK", REGISTRY.render_prometheus().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Запускает /metrics на host:port; None, если порт не задан."""
+    if not port:
+        return None
+    server = await asyncio.start_server(_serve_client, host, port)
+    logger.info(f"Метрики Prometheus: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,308 @@
+# migrations.py
+"""
+Версионные миграции схемы.
+
+Новые таблицы создаёт Base.metadata.create_all, а изменения уже существующих
+(колонки, индексы) описываются здесь нумерованными шагами. Текущая версия
+хранится в таблице schema_version; при старте выполняются только новые шаги.
+Шаги написаны так, чтобы их можно было безопасно применить к БД, где часть
+изменений уже есть (например, созданной create_all по свежим моделям).
+
+create_all, шаги и запись версии идут в одной транзакции под блокировкой
+(SQLite — BEGIN IMMEDIATE, PostgreSQL — pg_advisory_xact_lock): экземпляры,
+стартующие одновременно, ждут первого и после него видят уже новую версию.
+
+    python migrations.py          — применить миграции
+    python migrations.py check    — проверить, что горячие запросы идут по индексам
+"""
+import logging
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import OperationalError
+
+from models import (
+    Base, engine, User, Event, EventArchive, ReminderSchedule, OutboxMessage, event_recipients,
+    birth_md_key, name_search_key,
+)
+import search
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK = 0x426f744c  # ключ pg_advisory_xact_lock
+
+
+def _columns(conn, table: str) -> set:
+    return {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table: str, column: str, ddl: str) -> bool:
+    """ALTER TABLE ADD COLUMN, если колонки ещё нет; True — если добавили."""
+    if column in _columns(conn, table):
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+def _datetime(value) -> datetime:
+    """DATETIME из text()-запроса: в SQLite это строка."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _backfill(conn, select_sql: str, update_sql: str, fn) -> None:
+    rows = conn.execute(text(select_sql)).all()
+    if rows:
+        conn.execute(text(update_sql), [fn(*row) for row in rows])
+
+
+# --- Шаги ---
+def m001_birth_md(conn):
+    """users.birth_md для ежедневного поиска именинников."""
+    if _add_column(conn, 'users', 'birth_md', 'INTEGER'):
+        _backfill(
+            conn, "SELECT id, birth_date FROM users",
+            "UPDATE users SET birth_md = :md WHERE id = :id",
+            lambda uid, bd: {'id': uid, 'md': birth_md_key(date.fromisoformat(str(bd)))},
+        )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_birth_md ON users (birth_md)"))
+
+
+def m002_name_key(conn):
+    """users.name_key и индекс по должности для выбора получателей."""
+    if _add_column(conn, 'users', 'name_key', 'VARCHAR(255)'):
+        _backfill(
+            conn, "SELECT id, full_name FROM users",
+            "UPDATE users SET name_key = :key WHERE id = :id",
+            lambda uid, name: {'id': uid, 'key': name_search_key(name)},
+        )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_name_key ON users (name_key)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_position ON users (position)"))
+
+
+def m003_hot_path_indexes(conn):
+    """Индексы под списки событий, «мои события» и получателей."""
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_events_event_date ON events (event_date)",
+        "CREATE INDEX IF NOT EXISTS ix_events_creator_date ON events (creator_id, event_date)",
+        "CREATE INDEX IF NOT EXISTS ix_event_recipients_user_id ON event_recipients (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_reminders_event_id ON reminders (event_id)",
+        "CREATE INDEX IF NOT EXISTS ix_reminder_schedule_event_id ON reminder_schedule (event_id)",
+    ):
+        conn.execute(text(ddl))
+
+
+def m004_digest(conn):
+    """Ежедневная сводка: users.digest и outbox.digest_day."""
+    _add_column(conn, 'users', 'digest', 'BOOLEAN')
+    _add_column(conn, 'outbox', 'digest_day', 'DATE')
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_outbox_digest_day ON outbox (digest_day)"))
+
+
+def m005_delivery(conn):
+    """Время доставки по пользователям; расписание ставит уведомления в очередь в ENQUEUE_AT."""
+    from reminders import ENQUEUE_AT, msk_day, to_utc
+    _add_column(conn, 'users', 'tz', 'VARCHAR(64)')
+    _add_column(conn, 'users', 'notify_hour', 'INTEGER')
+    _backfill(
+        conn, "SELECT reminder_id, next_run_at FROM reminder_schedule",
+        "UPDATE reminder_schedule SET next_run_at = :at WHERE reminder_id = :id",
+        lambda rid, at: {'id': rid, 'at': to_utc(msk_day(_datetime(at)), ENQUEUE_AT)},
+    )
+
+
+def m006_recurrence(conn):
+    """Правило повторения событий."""
+    _add_column(conn, 'events', 'repeat', 'VARCHAR(10)')
+    _add_column(conn, 'events', 'repeat_every', 'INTEGER')
+    _add_column(conn, 'events', 'repeat_anchor', 'DATE')
+    _add_column(conn, 'events', 'repeat_until', 'DATE')
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_events_recurring_date ON events (event_date) WHERE repeat IS NOT NULL"
+    ))
+
+
+def m007_job_index(conn):
+    """Индексы outbox для отмены работы удалённых событий и пользователей."""
+    if _add_column(conn, 'outbox', 'user_id', 'INTEGER'):
+        # ключ поздравления: bday:<дата>:<id именинника>:<chat_id>
+        _backfill(
+            conn, "SELECT id, idempotency_key FROM outbox "
+                  "WHERE idempotency_key LIKE 'bday:%' AND next_attempt_at IS NOT NULL",
+            "UPDATE outbox SET user_id = :uid WHERE id = :id",
+            lambda msg_id, key: {'id': msg_id, 'uid': int(key.split(':')[2])},
+        )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_outbox_user_id ON outbox (user_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_outbox_chat_id ON outbox (chat_id)"))
+
+
+def m008_reachability(conn):
+    """users.unreachable_at и частичный индекс доступных получателей."""
+    _add_column(conn, 'users', 'unreachable_at', 'TIMESTAMP')
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_reachable ON users (telegram_id, digest, tz, notify_hour, unreachable_at) "
+        "WHERE unreachable_at IS NULL"
+    ))
+
+
+def m009_search(conn):
+    """Полнотекстовый индекс событий (FTS5 с триггерами / GIN по tsvector)."""
+    search.install(conn)
+
+
+MIGRATIONS = [
+    (1, m001_birth_md),
+    (2, m002_name_key),
+    (3, m003_hot_path_indexes),
+    (4, m004_digest),
+    (5, m005_delivery),
+    (6, m006_recurrence),
+    (7, m007_job_index),
+    (8, m008_reachability),
+    (9, m009_search),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def _lock(conn) -> None:
+    """Открывает транзакцию, в которой схему меняет только этот экземпляр."""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK})
+    elif conn.dialect.name == 'sqlite':
+        while True:
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                return
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                conn.rollback()  # busy_timeout истёк: миграции другого экземпляра ещё идут
+                logger.info("Схему обновляет другой экземпляр, ждём…")
+
+
+def _migrate(conn) -> int:
+    fresh = not inspect(conn).has_table('users')
+    Base.metadata.create_all(conn)
+    version = current_version(conn)
+    if fresh:
+        # create_all уже построил схему по последним моделям; индекс поиска — не модель
+        search.install(conn)
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {'v': LATEST})
+        return LATEST
+
+    for number, step in MIGRATIONS:
+        if number <= version:
+            continue
+        step(conn)
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {'v': number})
+        logger.info("Миграция %s: %s", number, step.__doc__)
+        version = number
+    return version
+
+
+def run_migrations() -> int:
+    """Создаёт новые таблицы и применяет недостающие миграции; возвращает версию."""
+    with engine.connect() as conn:
+        _lock(conn)
+        # версию читаем уже под блокировкой: её мог поднять экземпляр, которого мы ждали
+        version = _migrate(conn)
+        conn.commit()
+    return version
+
+
+# --- Проверка планов запросов ---
+def hot_queries():
+    """Горячие запросы бота и индекс, который каждый из них должен использовать."""
+    import archive
+    some_day, some_id = date(2030, 1, 1), 1
+    return [
+        ("пользователь по telegram_id",
+         select(User.id).where(User.telegram_id == some_id), "sqlite_autoindex_users_1"),
+        ("именинники через неделю",
+         select(User.id).where(User.birth_md.in_([228, 229])), "ix_users_birth_md"),
+        ("поиск получателя по ФИО",
+         select(User.id).where(User.name_key >= "ив", User.name_key < "иг")
+         .order_by(User.name_key, User.id).limit(9), "ix_users_name_key"),
+        ("получатели рассылок",
+         select(User.id, User.telegram_id, User.digest, User.tz, User.notify_hour)
+         .where(User.unreachable_at.is_(None)), "ix_users_reachable"),
+        ("получатели по должности",
+         select(User.id).where(User.position == "доцент"), "ix_users_position"),
+        ("страница списка событий",
+         select(Event.id).where(Event.event_date > some_day)
+         .order_by(Event.event_date, Event.id).limit(11), "ix_events_event_date"),
+        ("страница архива",
+         select(EventArchive.id).where(EventArchive.event_date < some_day)
+         .order_by(EventArchive.event_date.desc(), EventArchive.id.desc()).limit(11), "ix_events_archive_date"),
+        ("прошедшие события для архивации",
+         select(Event.id).where(archive.past_events(some_day))
+         .order_by(Event.event_date, Event.id).limit(500), "ix_events_event_date"),
+        ("поиск событий",
+         search._statement(search.terms("семинар кафедры")).limit(11), "events_fts VIRTUAL TABLE"),
+        ("мои события",
+         select(Event.id).where(Event.creator_id == some_id)
+         .order_by(Event.event_date, Event.id).limit(11), "ix_events_creator_date"),
+        ("события пользователя-получателя",
+         select(event_recipients.c.event_id).where(event_recipients.c.user_id == some_id),
+         "ix_event_recipients_user_id"),
+        ("прошедшие вхождения повторяющихся событий",
+         select(Event.id).where(Event.event_date < some_day, Event.repeat.isnot(None)),
+         "ix_events_recurring_date"),
+        ("наступившие напоминания",
+         select(ReminderSchedule.reminder_id).where(ReminderSchedule.next_run_at <= some_day)
+         .order_by(ReminderSchedule.next_run_at).limit(100), "ix_reminder_schedule_next_run_at"),
+        ("очередь исходящих",
+         select(OutboxMessage.id).where(OutboxMessage.next_attempt_at <= some_day)
+         .order_by(OutboxMessage.next_attempt_at).limit(200), "ix_outbox_next_attempt_at"),
+        ("наступившие пункты сводок",
+         select(OutboxMessage.id).where(OutboxMessage.next_attempt_at <= some_day,
+                                        OutboxMessage.digest_day.isnot(None)),
+         "ix_outbox_next_attempt_at"),
+        ("отмена расписания события",
+         select(ReminderSchedule.reminder_id).where(ReminderSchedule.event_id == some_id),
+         "ix_reminder_schedule_event_id"),
+        ("отмена уведомлений о событии",
+         select(OutboxMessage.id).where(OutboxMessage.event_id == some_id), "ix_outbox_event_id"),
+        ("отмена уведомлений о пользователе",
+         select(OutboxMessage.id).where(OutboxMessage.user_id == some_id), "ix_outbox_user_id"),
+        ("отмена уведомлений пользователю",
+         select(OutboxMessage.id).where(OutboxMessage.chat_id == some_id), "ix_outbox_chat_id"),
+    ]
+
+
+def _explain(conn, stmt) -> list:
+    compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    values = [params[name] for name in compiled.positiontup]
+    values = [v.isoformat() if isinstance(v, date) else v for v in values]
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(values)).all()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans() -> bool:
+    """Печатает EXPLAIN QUERY PLAN горячих запросов; False — если индекс не используется."""
+    if engine.dialect.name != 'sqlite':
+        print("Проверка планов реализована только для SQLite")
+        return True
+    ok = True
+    with engine.connect() as conn:
+        for name, stmt, index in hot_queries():
+            plan = _explain(conn, stmt)
+            used = any(index in line for line in plan)
+            ok &= used
+            print(f"{'OK ' if used else 'ПЛОХО'} {name}: {' | '.join(plan)}")
+    return ok
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+    if sys.argv[1:] == ['check']:
+        run_migrations()
+        sys.exit(0 if check_query_plans() else 1)
+    print(f"Версия схемы: {run_migrations()}")
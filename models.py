@@ -2,14 +2,17 @@
 import os
 from datetime import date
 from sqlalchemy import (
-    Column, Integer, String, Date, Boolean,
-    ForeignKey, Table, create_engine
+    Column, Integer, BigInteger, String, Text, Date, DateTime, Boolean,
+    ForeignKey, Table, Index, text
 )
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker, validates
 
 from dotenv import load_dotenv
 
+from storage import make_engine
+
 load_dotenv()  # загрузим .env из корня проекта
 
 Base = declarative_base()
@@ -19,6 +22,8 @@ event_recipients = Table(
     'event_recipients', Base.metadata,
     Column('event_id', Integer, ForeignKey('events.id'), primary_key=True),
     Column('user_id',  Integer, ForeignKey('users.id'),  primary_key=True),
+    # PK (event_id, user_id) не помогает искать события пользователя
+    Index('ix_event_recipients_user_id', 'user_id'),
 )
 
 class User(Base):
@@ -26,9 +31,20 @@ class User(Base):
     id            = Column(Integer, primary_key=True, autoincrement=True)
     telegram_id   = Column(Integer, unique=True, nullable=False)
     full_name     = Column(String(255), nullable=False)
-    position      = Column(String(100), nullable=False)
+    # ФИО в нижнем регистре — для поиска по префиксу через индекс
+    name_key      = Column(String(255), index=True)
+    position      = Column(String(100), nullable=False, index=True)
     birth_date    = Column(Date, nullable=False)
+    # месяц*100 + день рождения — для ежедневного поиска именинников по индексу
+    birth_md      = Column(Integer, index=True)
     is_admin      = Column(Boolean, default=False, nullable=False)
+    # сводка раз в день вместо отдельных уведомлений; NULL — как DIGEST_MODE в .env
+    digest        = Column(Boolean)
+    # когда присылать уведомления (см. delivery.py); NULL — по умолчанию
+    tz            = Column(String(64))
+    notify_hour   = Column(Integer)
+    # когда Telegram ответил «бот заблокирован» / «чат не найден»; NULL — доступен
+    unreachable_at = Column(DateTime)
 
     events_created   = relationship("Event", back_populates="creator")
     events_to_notify = relationship(
@@ -37,13 +53,42 @@ class User(Base):
         back_populates="recipients"
     )
 
+    __table_args__ = (
+        # частичный: получатели рассылок — только доступные (reachability.py); unreachable_at
+        # в ключе, чтобы SQLite считал индекс покрывающим и не читал саму таблицу
+        Index('ix_users_reachable', 'telegram_id', 'digest', 'tz', 'notify_hour', 'unreachable_at',
+              sqlite_where=text('unreachable_at IS NULL'), postgresql_where=text('unreachable_at IS NULL')),
+    )
+
+    @validates('birth_date')
+    def _sync_birth_md(self, key, value):
+        self.birth_md = birth_md_key(value)
+        return value
+
+    @validates('full_name')
+    def _sync_name_key(self, key, value):
+        self.name_key = name_search_key(value)
+        return value
+
+def birth_md_key(day: date) -> int:
+    return day.month * 100 + day.day
+
+def name_search_key(s: str) -> str:
+    """Нормализованная строка для поиска: нижний регистр, «ё» → «е»."""
+    return " ".join(s.lower().replace("ё", "е").split())
+
 class Event(Base):
     __tablename__ = 'events'
     id           = Column(Integer, primary_key=True, autoincrement=True)
     title        = Column(String(255), nullable=False)
     description  = Column(String, nullable=False)
-    event_date   = Column(Date, nullable=False)
+    event_date   = Column(Date, nullable=False, index=True)
     creator_id   = Column(Integer, ForeignKey('users.id'), nullable=False)
+    # правило повторения (см. recurrence.py); event_date — ближайшее вхождение
+    repeat        = Column(String(10))
+    repeat_every  = Column(Integer)
+    repeat_anchor = Column(Date)
+    repeat_until  = Column(Date)
 
     creator      = relationship("User", back_populates="events_created")
     recipients   = relationship(
@@ -53,32 +98,125 @@ class Event(Base):
     )
     reminders    = relationship("Reminder", back_populates="event", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # «мои события» — фильтр по создателю с сортировкой по дате
+        Index('ix_events_creator_date', 'creator_id', 'event_date'),
+        # частичный: только повторяющиеся события, для advance_all
+        Index('ix_events_recurring_date', 'event_date',
+              sqlite_where=text('repeat IS NOT NULL'), postgresql_where=text('repeat IS NOT NULL')),
+    )
+
 class Reminder(Base):
     __tablename__ = 'reminders'
     id             = Column(Integer, primary_key=True, autoincrement=True)
-    event_id       = Column(Integer, ForeignKey('events.id'), nullable=False)
+    event_id       = Column(Integer, ForeignKey('events.id'), nullable=False, index=True)
     interval_days  = Column(Integer, nullable=False)
     event          = relationship("Event", back_populates="reminders")
+    schedule       = relationship(
+        "ReminderSchedule", back_populates="reminder",
+        uselist=False, cascade="all, delete-orphan"
+    )
+
+class ReminderSchedule(Base):
+    """Ближайшее срабатывание напоминания — одна строка на Reminder."""
+    __tablename__ = 'reminder_schedule'
+    reminder_id    = Column(Integer, ForeignKey('reminders.id'), primary_key=True)
+    event_id       = Column(Integer, ForeignKey('events.id'), nullable=False, index=True)
+    interval_days  = Column(Integer, nullable=False)
+    next_run_at    = Column(DateTime, nullable=False, index=True)  # UTC, без tzinfo
+    reminder       = relationship("Reminder", back_populates="schedule")
+
+class OutboxMessage(Base):
+    """Исходящее сообщение: хранится, пока не доставлено (см. outbox.py)."""
+    __tablename__ = 'outbox'
+    id              = Column(Integer, primary_key=True, autoincrement=True)
+    # одно и то же уведомление одному получателю ставится в очередь один раз
+    idempotency_key = Column(String(200), unique=True, nullable=False)
+    chat_id         = Column(BigInteger, nullable=False, index=True)
+    text            = Column(Text, nullable=False)
+    parse_mode      = Column(String(20))
+    event_id        = Column(Integer, index=True)  # для напоминаний о событиях
+    user_id         = Column(Integer, index=True)  # о ком (именинник) — для отмены, см. jobs.py
+    attempts        = Column(Integer, default=0, nullable=False)
+    # NULL — сообщение доставлено или отброшено; индекс покрывает только очередь
+    next_attempt_at = Column(DateTime, index=True)  # UTC, без tzinfo
+    created_at      = Column(DateTime, nullable=False)
+    sent_at         = Column(DateTime)
+    last_error      = Column(String(255))
+    # пункт ежедневной сводки (см. digest.py): не отправляется сам по себе
+    digest_day      = Column(Date, index=True)
+
+class Lease(Base):
+    """Аренда роли между экземплярами бота (см. leader.py)."""
+    __tablename__ = 'leases'
+    name           = Column(String(100), primary_key=True)
+    owner          = Column(String(100), nullable=False)
+    expires_at     = Column(DateTime, nullable=False)  # UTC, без tzinfo
+
+# --- Архив прошедших событий (см. archive.py) ---
+# У архивной копии свой id: SQLite может выдать id удалённого события новому.
+class EventArchive(Base):
+    __tablename__ = 'events_archive'
+    id             = Column(Integer, primary_key=True, autoincrement=True)
+    event_id       = Column(Integer, nullable=False)  # id в events до архивации
+    title          = Column(String(255), nullable=False)
+    description    = Column(String)
+    event_date     = Column(Date, nullable=False)
+    creator_id     = Column(Integer)
+    creator_name   = Column(String(255))  # автор мог быть удалён после архивации
+    repeat         = Column(String(10))
+    repeat_every   = Column(Integer)
+    repeat_anchor  = Column(Date)
+    repeat_until   = Column(Date)
+    archived_at    = Column(DateTime, nullable=False)  # UTC, без tzinfo
+
+    __table_args__ = (
+        Index('ix_events_archive_date', 'event_date', 'id'),
+    )
+
+class ReminderArchive(Base):
+    __tablename__ = 'reminders_archive'
+    id             = Column(Integer, primary_key=True, autoincrement=True)
+    archive_id     = Column(Integer, ForeignKey('events_archive.id'), nullable=False, index=True)
+    interval_days  = Column(Integer, nullable=False)
+
+event_recipients_archive = Table(
+    'event_recipients_archive', Base.metadata,
+    Column('archive_id', Integer, ForeignKey('events_archive.id'), primary_key=True),
+    Column('user_id',    Integer, primary_key=True),
+)
+
+class ConversationState(Base):
+    """Состояние незаконченного разговора (регистрация, создание события), см. persistence.py."""
+    __tablename__ = 'conversation_state'
+    name           = Column(String(50), primary_key=True)   # имя ConversationHandler
+    key            = Column(String(100), primary_key=True)  # ключ разговора в JSON: [chat_id, user_id]
+    state          = Column(Integer, nullable=False)
+
+class UserData(Base):
+    """context.user_data пользователя в JSON (см. persistence.py)."""
+    __tablename__ = 'user_data'
+    user_id        = Column(BigInteger, primary_key=True)
+    data           = Column(Text, nullable=False)
+    updated_at     = Column(DateTime, nullable=False)  # UTC, без tzinfo
 
 # Поддерживаем чтение URL БД из .env, или дефолт
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///bot_database.db')
-engine = create_engine(DATABASE_URL, echo=True, future=True)
+# параметры движка и PRAGMA задаются профилем хранилища (см. storage.py)
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 def init_db():
-    """При первом запуске создаём таблицы и администратора."""
-    # путь к файлу sqlite берётся из DATABASE_URL
-    # для sqlite: sqlite:///path/to/file.db
-    if DATABASE_URL.startswith("sqlite:///"):
-        db_path = DATABASE_URL.replace("sqlite:///", "")
-        if os.path.exists(db_path):
-            return
-    else:
-        # для других СУБД можно не проверять файл
-        pass
-
-    # создаём все таблицы
-    Base.metadata.create_all(engine)
+    """Создаём недостающие таблицы, а при первом запуске — администратора."""
+    # новые таблицы создаёт create_all, изменения старых — миграции
+    from migrations import run_migrations
+    run_migrations()
+
+    session = SessionLocal()
+    has_users = session.query(User.id).first() is not None
+    session.close()
+    if has_users:
+        return
 
     # Telegram ID админа из .env
     admin_tid = os.getenv('ADMIN_TELEGRAM_ID')
@@ -95,7 +233,10 @@ def init_db():
         is_admin=True
     )
     session.add(admin)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()  # админа одновременно создал другой экземпляр бота
     session.close()
 
 if __name__ == '__main__':
@@ -0,0 +1,221 @@
+# outbox.py
+"""
+Очередь исходящих сообщений в БД (outbox).
+
+Рассылки не отправляют сообщения напрямую, а записывают их в таблицу outbox
+(по строке на получателя) в той же транзакции, где сдвигается расписание.
+Затем drain() забирает строки пачками и отправляет через broadcaster:
+
+- доставленное помечается sent_at и больше не отправляется;
+- ошибка стоит одного повтора для одного получателя, с экспоненциальной
+  задержкой (OUTBOX_BACKOFF_BASE · 2^попытка, не больше OUTBOX_BACKOFF_MAX);
+- «бот заблокирован» / «чат не найден» и исчерпанные попытки
+  (OUTBOX_MAX_ATTEMPTS) больше не повторяются, причина — в last_error;
+  недоступный получатель к тому же помечается, и его остальные сообщения
+  отменяются (reachability.py);
+- idempotency_key уникален, так что повторная постановка того же
+  уведомления тому же получателю ничего не добавляет.
+
+Очередь переживает перезапуск. Забранная пачка откладывается на
+CLAIM_TIMEOUT: если процесс упал посреди отправки, её повторит следующий
+запуск (лучше дубль, чем потеря).
+"""
+import asyncio
+import logging
+import os
+import random
+from datetime import timedelta
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import metrics
+import reachability
+import reminders
+from broadcast import broadcaster
+from cache import user_cache
+from db import run_db_write
+from models import engine, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH        = int(os.getenv('OUTBOX_BATCH', '200'))
+OUTBOX_INTERVAL     = int(os.getenv('OUTBOX_INTERVAL', '10'))          # секунд между проверками
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', '30'))    # секунд
+OUTBOX_BACKOFF_MAX  = float(os.getenv('OUTBOX_BACKOFF_MAX', '21600'))  # 6 часов
+OUTBOX_KEEP_DAYS    = int(os.getenv('OUTBOX_KEEP_DAYS', '7'))          # сколько хранить завершённые
+
+CLAIM_TIMEOUT = timedelta(minutes=5)
+INSERT_CHUNK  = 1000
+
+_table = OutboxMessage.__table__
+
+
+def message(key: str, chat_id: int, text: str, parse_mode: str = None, event_id: int = None,
+            digest_day=None, deliver_at=None, user_id: int = None) -> dict:
+    """
+    Строка для enqueue(); deliver_at — не раньше какого момента отправлять
+    (naive UTC, по умолчанию сразу). С digest_day это не сообщение, а пункт
+    сводки на этот день: отдельно он не отправляется (см. digest.py).
+    event_id / user_id — о каком событии или пользователе уведомление: по ним
+    оно отменяется при удалении (jobs.py).
+    """
+    return {
+        'idempotency_key': key, 'chat_id': chat_id, 'text': text,
+        'parse_mode': parse_mode, 'event_id': event_id, 'user_id': user_id,
+        'digest_day': digest_day, 'deliver_at': deliver_at,
+    }
+
+
+def _insert_ignore():
+    """INSERT, пропускающий строки с уже существующим idempotency_key."""
+    if engine.dialect.name == 'sqlite':
+        return sqlite.insert(_table).on_conflict_do_nothing(index_elements=['idempotency_key'])
+    if engine.dialect.name == 'postgresql':
+        return postgresql.insert(_table).on_conflict_do_nothing(index_elements=['idempotency_key'])
+    return insert(_table)
+
+
+def enqueue(conn, messages: list, now=None) -> None:
+    """Ставит сообщения в очередь в транзакции conn (Connection или Session)."""
+    now = now or reminders.utc_now()
+    stmt = _insert_ignore()
+    for i in range(0, len(messages), INSERT_CHUNK):
+        rows = []
+        for m in messages[i:i + INSERT_CHUNK]:
+            row = dict(m, attempts=0, created_at=now)
+            row['next_attempt_at'] = row.pop('deliver_at') or now
+            rows.append(row)
+        conn.execute(stmt, rows)
+
+
+def enqueue_all(messages: list) -> None:
+    """enqueue() в отдельной транзакции."""
+    with engine.begin() as conn:
+        enqueue(conn, messages)
+
+
+def claim_batch(limit: int = OUTBOX_BATCH, now=None) -> list:
+    """Забирает до limit готовых к отправке сообщений: [(id, chat_id, text, parse_mode), ...]."""
+    now = now or reminders.utc_now()
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(_table.c.id, _table.c.chat_id, _table.c.text, _table.c.parse_mode,
+                   _table.c.attempts, _table.c.next_attempt_at)
+            .where(_table.c.next_attempt_at <= now, _table.c.digest_day.is_(None))
+            .order_by(_table.c.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if rows:
+            conn.execute(
+                update(_table)
+                .where(_table.c.id.in_([r.id for r in rows]))
+                .values(attempts=_table.c.attempts + 1, next_attempt_at=now + CLAIM_TIMEOUT)
+            )
+    for r in rows:
+        if not r.attempts:
+            # отставание первой отправки от назначенного слота
+            metrics.observe("bot_job_lag_seconds", (now - r.next_attempt_at).total_seconds(), job="delivery")
+    return [(r.id, r.chat_id, r.text, r.parse_mode) for r in rows]
+
+
+def backoff(attempts: int) -> float:
+    """Задержка перед следующей попыткой, с разбросом ±20%, чтобы повторы не шли залпом."""
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def record_results(sent: list, failed: dict, now=None) -> None:
+    """sent — id доставленных; failed — {id: исключение}."""
+    now = now or reminders.utc_now()
+    unreachable = set()
+    with engine.begin() as conn:
+        if sent:
+            conn.execute(
+                update(_table).where(_table.c.id.in_(sent))
+                .values(sent_at=now, next_attempt_at=None, last_error=None)
+            )
+        if not failed:
+            return
+        rows = conn.execute(
+            select(_table.c.id, _table.c.attempts, _table.c.chat_id).where(_table.c.id.in_(list(failed)))
+        ).all()
+        attempts = {r.id: r.attempts for r in rows}
+        chat_ids = {r.id: r.chat_id for r in rows}
+        params, retried, dropped = [], 0, 0
+        for msg_id, error in failed.items():
+            why = reachability.reason(error)
+            if why:
+                metrics.inc("bot_unreachable_calls_total", reason=why)
+                unreachable.add(chat_ids[msg_id])
+            if why or attempts[msg_id] >= OUTBOX_MAX_ATTEMPTS:
+                next_at = None
+                dropped += 1
+            else:
+                next_at = now + timedelta(seconds=backoff(attempts[msg_id]))
+                retried += 1
+            params.append({'msg_id': msg_id, 'next_at': next_at, 'error': str(error)[:255]})
+        conn.execute(
+            update(_table).where(_table.c.id == bindparam('msg_id'))
+            .values(next_attempt_at=bindparam('next_at'), last_error=bindparam('error')),
+            params,
+        )
+        if unreachable:
+            reachability.mark_unreachable(conn, list(unreachable), now)
+    for chat_id in unreachable:
+        user_cache.invalidate(chat_id)
+    metrics.inc("bot_outbox_messages_total", retried, result="retry")
+    metrics.inc("bot_outbox_messages_total", dropped, result="dropped")
+
+
+def prune(now=None) -> int:
+    """Удаляет завершённые сообщения старше OUTBOX_KEEP_DAYS."""
+    now = now or reminders.utc_now()
+    with engine.begin() as conn:
+        return conn.execute(
+            delete(_table).where(
+                _table.c.next_attempt_at.is_(None),
+                _table.c.created_at < now - timedelta(days=OUTBOX_KEEP_DAYS),
+            )
+        ).rowcount
+
+
+async def deliver(bot, batch: list):
+    """Отправляет пачку; возвращает (id доставленных, {id: исключение})."""
+    groups = {}  # (текст, parse_mode) -> {chat_id: [id, ...]}
+    for msg_id, chat_id, text, parse_mode in batch:
+        groups.setdefault((text, parse_mode), {}).setdefault(chat_id, []).append(msg_id)
+
+    # разные тексты шлём параллельно: лимиты Telegram всё равно держит broadcaster
+    reports = await asyncio.gather(*(
+        broadcaster.broadcast(bot, list(chats), text, **({'parse_mode': parse_mode} if parse_mode else {}))
+        for (text, parse_mode), chats in groups.items()
+    ))
+    sent, failed = [], {}
+    for chats, report in zip(groups.values(), reports):
+        for chat_id, ids in chats.items():
+            error = report.errors.get(chat_id)
+            if error is None:
+                sent.extend(ids)
+            else:
+                logger.warning(f"Не доставлено в чат {chat_id}: {error}")
+                failed.update((msg_id, error) for msg_id in ids)
+    metrics.inc("bot_outbox_messages_total", len(sent), result="sent")
+    return sent, failed
+
+
+async def drain(bot, limit: int = OUTBOX_BATCH) -> int:
+    """Отправляет всё, что готово к отправке; возвращает число доставленных."""
+    delivered = 0
+    while True:
+        batch = await run_db_write(claim_batch, limit)
+        if not batch:
+            break
+        sent, failed = await deliver(bot, batch)
+        await run_db_write(record_results, sent, failed)
+        delivered += len(sent)
+        if len(batch) < limit:
+            break
+    return delivered
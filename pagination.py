@@ -0,0 +1,129 @@
+# pagination.py
+"""
+Постраничные списки событий и пользователей по ключу (keyset pagination).
+
+Страница выбирается условием «строго после/до ключа последней показанной
+строки» и LIMIT, поэтому стоимость страницы не зависит от размера таблицы
+и от того, насколько далеко пролистан список. Ключ страницы кодируется
+прямо в callback_data кнопок «Назад»/«Вперёд».
+"""
+from dataclasses import dataclass
+from datetime import date
+
+from sqlalchemy import and_, or_
+from telegram import InlineKeyboardButton
+
+import reminders
+from models import SessionLocal, User, Event, EventArchive
+
+PAGE_SIZE = 10
+
+# callback_data: "<список>:<n|p>:<ключ>", например "evl:n:739543.17"
+PAGE_PATTERN = r"^(evl|evm|eva|arc|srh|usr):[np]:[\d.]+$"
+
+
+@dataclass
+class Page:
+    rows: list
+    has_prev: bool = False
+    has_next: bool = False
+
+
+def _beyond(cols, key, forward):
+    """Лексикографическое (c1, c2, ...) > key (или < key) без row values."""
+    col, val = cols[0], key[0]
+    strict = col > val if forward else col < val
+    if len(cols) == 1:
+        return strict
+    return or_(strict, and_(col == val, _beyond(cols[1:], key[1:], forward)))
+
+
+def fetch_page(query, cols, key=None, forward=True, limit=PAGE_SIZE) -> Page:
+    """
+    Страница query, упорядоченного по cols: после key (forward) или перед ним.
+    Берём limit + 1 строку, чтобы узнать, есть ли что-то дальше.
+    """
+    if key is not None:
+        query = query.filter(_beyond(cols, key, forward))
+    order = cols if forward else [c.desc() for c in cols]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if forward:
+        return Page(rows, has_prev=key is not None, has_next=more)
+    rows.reverse()
+    return Page(rows, has_prev=more, has_next=True)
+
+
+# --- Ключи в callback_data ---
+def event_key(row) -> str:
+    return f"{row.event_date.toordinal()}.{row.id}"
+
+def parse_event_key(raw: str):
+    day, evt_id = raw.split(".")
+    return date.fromordinal(int(day)), int(evt_id)
+
+def user_key(row) -> str:
+    return str(row.id)
+
+def parse_user_key(raw: str):
+    return (int(raw),)
+
+
+def parse_callback(data: str):
+    """'evl:n:739543.17' → ('evl', True, '739543.17')."""
+    kind, direction, raw = data.split(":", 2)
+    return kind, direction == "n", raw
+
+
+def nav_row(kind: str, page: Page, key_fn) -> list:
+    """Кнопки «Назад»/«Вперёд» (пустой список, если листать некуда)."""
+    row = []
+    if page.has_prev:
+        row.append(InlineKeyboardButton("◀️ Назад", callback_data=f"{kind}:p:{key_fn(page.rows[0])}"))
+    if page.has_next:
+        row.append(InlineKeyboardButton("Вперёд ▶️", callback_data=f"{kind}:n:{key_fn(page.rows[-1])}"))
+    return row
+
+
+# --- Запросы ---
+def events_page(key=None, forward=True, creator_id=None) -> Page:
+    """
+    Страница предстоящих событий по (event_date, id); только нужные для
+    списка колонки. Прошедшие — в архиве (archive_page).
+    """
+    session = SessionLocal()
+    query = (
+        session.query(Event.id, Event.title, Event.event_date, Event.repeat,
+                      User.full_name.label('creator_name'))
+        .join(User, Event.creator)
+        .filter(Event.event_date >= reminders.msk_day(reminders.utc_now()))
+    )
+    if creator_id is not None:
+        query = query.filter(Event.creator_id == creator_id)
+    page = fetch_page(query, (Event.event_date, Event.id), key, forward)
+    session.close()
+    return page
+
+
+def archive_page(key=None, forward=False) -> Page:
+    """Страница архива (archive.py) по (event_date, id); без ключа — самые недавние события."""
+    session = SessionLocal()
+    query = session.query(
+        EventArchive.id, EventArchive.title, EventArchive.event_date, EventArchive.repeat,
+        EventArchive.creator_name,
+    )
+    page = fetch_page(query, (EventArchive.event_date, EventArchive.id), key, forward)
+    session.close()
+    if key is None:
+        page.has_next = False
+    return page
+
+
+def users_page(key=None, forward=True) -> Page:
+    """Страница пользователей по id."""
+    session = SessionLocal()
+    query = session.query(User.id, User.full_name, User.position, User.is_admin, User.unreachable_at)
+    page = fetch_page(query, (User.id,), key, forward)
+    session.close()
+    return page
@@ -0,0 +1,211 @@
+# persistence.py
+"""
+Состояние разговоров и context.user_data в БД проекта.
+
+Без этого перезапуск или падение бота обрывает незаконченные регистрации и
+черновики событий. DbPersistence — бэкенд BasePersistence для
+ApplicationBuilder().persistence(): при старте он читает таблицы
+conversation_state и user_data, а дальше пишет в них только изменения.
+
+Запись отложенная: Application раз в PERSIST_INTERVAL секунд передаёт
+изменённые разговоры и user_data (update_conversation / update_user_data);
+они копятся в буфере, и весь проход записывается одной транзакцией — два
+запроса на таблицу (DELETE ... IN и INSERT пачкой), сколько бы ни было
+изменений. Хэндлеры БД не трогают, так что на горячем пути нет ни одного
+commit. При остановке Application делает последний проход и вызывает
+flush(): буфер дописывается до выхода. Падение процесса теряет не больше
+PERSIST_INTERVAL секунд ввода.
+
+user_data хранится как JSON; множества, кортежи и даты (evt_notify_ids,
+evt_repeat, evt_date) кодируются метками {"__set__": [...]} и т.п.
+chat_data, bot_data и callback_data бот не использует — они не хранятся.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+
+from sqlalchemy import delete, select
+from telegram.ext import BasePersistence, PersistenceInput
+
+import metrics
+import reminders
+from db import run_db, run_db_write
+from models import engine, ConversationState, UserData
+
+logger = logging.getLogger(__name__)
+
+PERSIST_INTERVAL = float(os.getenv('PERSIST_INTERVAL', '15'))  # секунд между записями
+
+_DELETED = object()
+_conversations = ConversationState.__table__
+_user_data = UserData.__table__
+
+
+# --- JSON с множествами, кортежами и датами ---
+def _encode(value):
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode(v) for v in value]}
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': [_encode(v) for v in value]}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+
+def _decode(obj: dict):
+    if len(obj) == 1:
+        (tag, value), = obj.items()
+        if tag == '__tuple__':
+            return tuple(value)
+        if tag == '__set__':
+            return set(value)
+        if tag == '__datetime__':
+            return datetime.fromisoformat(value)
+        if tag == '__date__':
+            return date.fromisoformat(value)
+    return obj
+
+
+def dumps(value) -> str:
+    return json.dumps(_encode(value), ensure_ascii=False)
+
+
+def loads(text: str):
+    return json.loads(text, object_hook=_decode)
+
+
+# --- БД ---
+def load_user_data() -> dict:
+    with engine.connect() as conn:
+        return {uid: loads(data) for uid, data in conn.execute(select(_user_data.c.user_id, _user_data.c.data))}
+
+
+def load_conversations(name: str) -> dict:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(_conversations.c.key, _conversations.c.state).where(_conversations.c.name == name)
+        )
+        return {tuple(json.loads(key)): state for key, state in rows}
+
+
+def write(users: dict, conversations: dict, now=None) -> None:
+    """Записывает буфер одной транзакцией; _DELETED — строку удалить."""
+    now = now or reminders.utc_now()
+    with engine.begin() as conn:
+        if users:
+            conn.execute(delete(_user_data).where(_user_data.c.user_id.in_(list(users))))
+            rows = [{'user_id': uid, 'data': dumps(data), 'updated_at': now}
+                    for uid, data in users.items() if data is not _DELETED]
+            if rows:
+                conn.execute(_user_data.insert(), rows)
+        for name in {name for name, _ in conversations}:
+            keys = {key: state for (n, key), state in conversations.items() if n == name}
+            conn.execute(delete(_conversations).where(
+                _conversations.c.name == name, _conversations.c.key.in_(list(keys))
+            ))
+            rows = [{'name': name, 'key': key, 'state': state}
+                    for key, state in keys.items() if state is not _DELETED]
+            if rows:
+                conn.execute(_conversations.insert(), rows)
+
+
+class DbPersistence(BasePersistence):
+    """Разговоры и user_data в БД с отложенной пакетной записью."""
+
+    def __init__(self, update_interval: float = PERSIST_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._users = {}          # user_id -> user_data | _DELETED
+        self._conversations = {}  # (имя, JSON ключа) -> состояние | _DELETED
+        self._writer = None
+
+    # чтение при старте
+    async def get_user_data(self) -> dict:
+        return await run_db(load_user_data)
+
+    async def get_conversations(self, name: str) -> dict:
+        return await run_db(load_conversations, name)
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # изменения — в буфер
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._users[user_id] = data  # Application уже передаёт глубокую копию
+        self._schedule()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._users[user_id] = _DELETED
+        self._schedule()
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        self._conversations[(name, json.dumps(list(key)))] = _DELETED if new_state is None else new_state
+        self._schedule()
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    # запись
+    def _schedule(self) -> None:
+        """Одна запись на проход update_persistence: остальные update_* этого прохода попадут в неё же."""
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        await asyncio.sleep(0)  # дать отработать остальным update_* из того же gather
+        while self._users or self._conversations:
+            users, conversations = self._users, self._conversations
+            self._users, self._conversations = {}, {}
+            started = time.perf_counter()
+            try:
+                await run_db_write(write, users, conversations)
+            except Exception:
+                logger.exception("Не удалось сохранить состояние разговоров, повтор в следующий проход")
+                # более новые изменения, пришедшие во время записи, важнее
+                self._users = {**users, **self._users}
+                self._conversations = {**conversations, **self._conversations}
+                return
+            metrics.observe("bot_persistence_flush_seconds", time.perf_counter() - started)
+            metrics.inc("bot_persistence_rows_total", len(users), kind="user_data")
+            metrics.inc("bot_persistence_rows_total", len(conversations), kind="conversation")
+
+    async def flush(self) -> None:
+        """При остановке: дождаться текущей записи и дописать остаток буфера."""
+        if self._writer is not None:
+            await self._writer
+        await self._write_pending()
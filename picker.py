@@ -0,0 +1,116 @@
+# picker.py
+"""
+Выбор получателей события: постраничный inline-список с поиском.
+
+Поиск — по началу любого слова ФИО или должности: «иван» находит и
+«Иванов Пётр», и «Петров Иван», «доц» — всех доцентов. Начало ФИО ищется
+запросом-диапазоном по индексу name_key, начала остальных слов — LIKE по
+тому же name_key при обходе индекса в порядке страницы (справочник кафедры
+невелик). Должностей немного: их список берётся из индекса по position и
+сравнивается в Python, потому что LOWER в SQLite не знает кириллицы.
+Кнопкой «Должности» должность добавляется целиком. Выбранные пользователи
+хранятся по id, поэтому однофамильцы не путаются.
+"""
+from sqlalchemy import or_
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from models import SessionLocal, User, name_search_key
+from pagination import Page, fetch_page
+
+PICK_PAGE_SIZE = 8
+
+# callback_data: "pick:t:<id>" — отметить, "pick:n|p" — листать,
+# "pick:g" — должности, "pick:g:<idx>" — добавить должность, "pick:b" — назад,
+# "pick:clr" — сбросить поиск, "pick:done" — сохранить событие
+PICK_PATTERN = r"^pick:(t:\d+|n|p|g|g:\d+|b|clr|done)$"
+
+
+def _prefix_range(prefix: str):
+    """Границы [lo, hi) для name_key LIKE 'prefix%', которые понимает индекс."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _word_start(text: str, prefix: str) -> bool:
+    return text.startswith(prefix) or f" {prefix}" in text
+
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _positions_matching(session, prefix: str) -> list:
+    """Должности, одно из слов которых начинается с prefix."""
+    positions = [pos for (pos,) in session.query(User.position).distinct()]
+    return [pos for pos in positions if _word_start(name_search_key(pos), prefix)]
+
+
+def search_page(prefix: str = "", key=None, forward=True) -> Page:
+    """Страница пользователей по (name_key, id), при prefix — только совпадения."""
+    session = SessionLocal()
+    query = session.query(User.id, User.full_name, User.position, User.name_key)
+    prefix = name_search_key(prefix)
+    if prefix:
+        lo, hi = _prefix_range(prefix)
+        query = query.filter(or_(
+            (User.name_key >= lo) & (User.name_key < hi),
+            User.name_key.like(f"% {_like_escape(prefix)}%", escape="\\"),
+            User.position.in_(_positions_matching(session, prefix)),
+        ))
+    page = fetch_page(query, (User.name_key, User.id), key, forward, limit=PICK_PAGE_SIZE)
+    session.close()
+    return page
+
+
+def ids_by_position(position: str) -> list:
+    session = SessionLocal()
+    ids = [uid for (uid,) in session.query(User.id).filter(User.position == position)]
+    session.close()
+    return ids
+
+
+def page_keys(page: Page):
+    """Ключи первой и последней строки — хранятся в user_data, в callback_data не влезают."""
+    if not page.rows:
+        return None, None
+    first, last = page.rows[0], page.rows[-1]
+    return (first.name_key, first.id), (last.name_key, last.id)
+
+
+def picker_text(selected: set, prefix: str) -> str:
+    lines = [f"Выбрано получателей: {len(selected)}."]
+    if prefix:
+        lines.append(f"Поиск: «{prefix}».")
+    lines.append("Отмечайте людей кнопками, напишите начало фамилии, имени или должности для поиска "
+                 "или добавьте должность целиком. Затем нажмите «Готово».")
+    return "\n".join(lines)
+
+
+def picker_markup(page: Page, selected: set, prefix: str) -> InlineKeyboardMarkup:
+    rows = []
+    for u in page.rows:
+        mark = "✅" if u.id in selected else "▫️"
+        rows.append([InlineKeyboardButton(f"{mark} {u.full_name} ({u.position})", callback_data=f"pick:t:{u.id}")])
+    if not page.rows:
+        rows.append([InlineKeyboardButton("Никого не найдено", callback_data="pick:clr")])
+
+    nav = []
+    if page.has_prev:
+        nav.append(InlineKeyboardButton("◀️ Назад", callback_data="pick:p"))
+    if page.has_next:
+        nav.append(InlineKeyboardButton("Вперёд ▶️", callback_data="pick:n"))
+    if nav:
+        rows.append(nav)
+
+    tools = [InlineKeyboardButton("🎓 Должности", callback_data="pick:g")]
+    if prefix:
+        tools.append(InlineKeyboardButton("✖️ Сбросить поиск", callback_data="pick:clr"))
+    rows.append(tools)
+    rows.append([InlineKeyboardButton("Готово", callback_data="pick:done")])
+    return InlineKeyboardMarkup(rows)
+
+
+def positions_markup(positions: list) -> InlineKeyboardMarkup:
+    rows = [[InlineKeyboardButton(f"➕ {pos}", callback_data=f"pick:g:{idx}")]
+            for idx, pos in enumerate(positions)]
+    rows.append([InlineKeyboardButton("◀️ К списку", callback_data="pick:b")])
+    return InlineKeyboardMarkup(rows)
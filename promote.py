@@ -1,16 +1,20 @@
 # promote.py
-from models import SessionLocal, User
+import sys
 
-def promote(user_id: int):
+import repository
+from models import SessionLocal
+
+def promote(*user_ids: int):
+    # отдельный процесс: кэш работающего бота отсюда не сбросить, поэтому его
+    # не трогаем — бот увидит нового админа не позже чем через USER_CACHE_TTL
     session = SessionLocal()
-    user = session.query(User).get(user_id)
-    if not user:
-        print(f"Пользователь с id={user_id} не найден")
-    else:
-        user.is_admin = True
-        session.commit()
-        print(f"Пользователь {user.full_name} (id={user.id}) теперь админ")
+    rows = repository.promote_users(session, list(user_ids))
+    session.commit()
     session.close()
+    if not rows:
+        print(f"Пользователи с id={', '.join(map(str, user_ids))} не найдены")
+    for r in rows:
+        print(f"Пользователь {r.full_name} теперь админ")
 
 if __name__ == '__main__':
-    promote(1)
+    promote(*(map(int, sys.argv[1:]) if len(sys.argv) > 1 else (1,)))
@@ -0,0 +1,77 @@
+# reachability.py
+"""
+Недоступные пользователи: заблокировали бота или удалили аккаунт.
+
+На отправку такому пользователю Telegram отвечает Forbidden или «chat not
+found». Каждая такая отправка — впустую потраченный запрос и место в общем
+лимите, а раньше ещё и повторы с backoff. Поэтому:
+
+- outbox.record_results() помечает получателя (users.unreachable_at) и
+  отменяет остальные его неотправленные сообщения — mark_unreachable();
+- получатели рассылок (repository.notification_targets, due_reminders)
+  выбираются только из доступных, по частичному индексу ix_users_reachable;
+- стоит пользователю снова написать боту, отметка снимается: check()
+  выполняется перед остальными хэндлерами и почти всегда обходится кэшем
+  пользователей, без запроса к БД.
+
+Счётчики: bot_unreachable_calls_total{reason} — запросы к Bot API,
+упёршиеся в недоступного получателя; bot_outbox_messages_total{result=
+"cancelled"} — повторы, которые не пришлось делать;
+bot_unreachable_users_total{change="marked"|"restored"}.
+"""
+from sqlalchemy import update
+from telegram import Update
+from telegram.error import BadRequest, Forbidden
+from telegram.ext import ContextTypes
+
+import jobs
+import metrics
+from cache import get_user_record, user_cache
+from db import run_db_write
+from models import engine, User
+
+_users = User.__table__
+
+
+def reason(error: Exception):
+    """'blocked' / 'chat_not_found' — получатель недоступен; None — другая ошибка."""
+    if isinstance(error, Forbidden):
+        return 'blocked'
+    if isinstance(error, BadRequest) and "chat not found" in str(error).lower():
+        return 'chat_not_found'
+    return None
+
+
+def mark_unreachable(conn, chat_ids: list, now) -> int:
+    """
+    В транзакции conn: помечает chat_ids недоступными и отменяет их
+    неотправленные сообщения; возвращает число отменённых. Кэш пользователей
+    вызывающий сбрасывает после commit.
+    """
+    marked = conn.execute(
+        update(_users).where(_users.c.telegram_id.in_(chat_ids), _users.c.unreachable_at.is_(None))
+        .values(unreachable_at=now)
+    ).rowcount
+    cancelled = jobs.cancel_chats(conn, chat_ids)
+    metrics.inc("bot_unreachable_users_total", marked, change="marked")
+    metrics.inc("bot_outbox_messages_total", cancelled, result="cancelled")
+    return cancelled
+
+
+def mark_reachable(tg_id: int) -> None:
+    with engine.begin() as conn:
+        restored = conn.execute(
+            update(_users).where(_users.c.telegram_id == tg_id, _users.c.unreachable_at.isnot(None))
+            .values(unreachable_at=None)
+        ).rowcount
+    user_cache.invalidate(tg_id)
+    metrics.inc("bot_unreachable_users_total", restored, change="restored")
+
+
+async def check(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Хэндлер группы -1: пользователь, помеченный недоступным, написал — он снова доступен."""
+    if update.effective_user is None:
+        return
+    user = await get_user_record(update.effective_user.id)
+    if user is not None and user.unreachable:
+        await run_db_write(mark_reachable, user.telegram_id)
@@ -0,0 +1,122 @@
+# recurrence.py
+"""
+Повторяющиеся события (семинары, заседания кафедры).
+
+Правило хранится в самом событии, как урезанный RRULE:
+
+    repeat        'weekly' | 'monthly' | NULL — разовое событие
+    repeat_every  каждые N недель / месяцев
+    repeat_anchor первое вхождение: от него отсчитываются все остальные
+    repeat_until  последний допустимый день (NULL — бессрочно)
+
+events.event_date всегда хранит ближайшее вхождение: прошедшее сменяют
+следующим ежедневный advance_all() и reminders.claim_due(), так что списки, сводки и
+индексы работают с повторяющимися событиями как с обычными. Вхождения не
+материализуются: следующее вычисляется арифметикой от якоря за O(1), сколько
+бы лет ни шла серия.
+
+Ежемесячное событие 31-го числа в коротком месяце проходит в его последний
+день, а в следующем снова 31-го (якорь не сдвигается).
+"""
+import calendar
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+from models import SessionLocal, Event
+
+WEEKLY, MONTHLY = 'weekly', 'monthly'
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    freq: str
+    every: int
+    anchor: date
+    until: date = None
+
+    @classmethod
+    def of(cls, evt):
+        """Правило события (ORM-объект или строка с колонками repeat_*); None — разовое."""
+        if not evt.repeat:
+            return None
+        return cls(evt.repeat, evt.repeat_every or 1, evt.repeat_anchor or evt.event_date, evt.repeat_until)
+
+    def nth(self, n: int) -> date:
+        """n-е вхождение, считая якорь нулевым."""
+        if self.freq == WEEKLY:
+            return self.anchor + timedelta(weeks=n * self.every)
+        months = self.anchor.month - 1 + n * self.every
+        year, month = self.anchor.year + months // 12, months % 12 + 1
+        return date(year, month, min(self.anchor.day, calendar.monthrange(year, month)[1]))
+
+    def index_on_or_after(self, day: date) -> int:
+        """Номер первого вхождения не раньше day (без перебора вхождений)."""
+        if day <= self.anchor:
+            return 0
+        if self.freq == WEEKLY:
+            return -(-(day - self.anchor).days // (7 * self.every))
+        months = (day.year - self.anchor.year) * 12 + day.month - self.anchor.month
+        n = max(0, months // self.every)
+        return n if self.nth(n) >= day else n + 1
+
+    def occurrences(self, start: date = None):
+        """Вхождения начиная со start (по умолчанию — с якоря), лениво, до repeat_until."""
+        n = self.index_on_or_after(start) if start else 0
+        while True:
+            day = self.nth(n)
+            if self.until and day > self.until:
+                return
+            yield day
+            n += 1
+
+    def next_on_or_after(self, day: date):
+        """Ближайшее вхождение не раньше day; None — серия закончилась."""
+        return next(self.occurrences(day), None)
+
+    def describe(self) -> str:
+        if self.every == 1:
+            text = "каждую неделю" if self.freq == WEEKLY else "каждый месяц"
+        else:
+            few = 2 <= self.every % 10 <= 4 and not 12 <= self.every % 100 <= 14
+            unit = {WEEKLY: ("недели", "недель"), MONTHLY: ("месяца", "месяцев")}[self.freq]
+            text = f"раз в {self.every} {unit[0] if few else unit[1]}"
+        return f"🔁 {text}" + (f" до {self.until.strftime('%d.%m.%Y')}" if self.until else "")
+
+
+def last_day(evt) -> date:
+    """До какого дня о событии есть смысл напоминать: конец серии или дата разового."""
+    rule = Rule.of(evt)
+    if rule is None:
+        return evt.event_date
+    return rule.until or date.max
+
+
+def advance(evt, day: date) -> bool:
+    """
+    Переносит event_date повторяющегося события на ближайшее вхождение не
+    раньше day. False — событие разовое или серия закончилась (дата не меняется).
+    """
+    rule = Rule.of(evt)
+    if rule is None:
+        return False
+    if evt.event_date >= day:
+        return True
+    upcoming = rule.next_on_or_after(day)
+    if upcoming is None:
+        return False
+    evt.event_date = upcoming
+    return True
+
+
+def advance_all(today: date) -> int:
+    """Ежедневно: прошедшие вхождения повторяющихся событий сменяются следующими."""
+    session = SessionLocal()
+    stale = session.scalars(
+        select(Event).where(Event.event_date < today, Event.repeat.isnot(None))
+    ).all()
+    moved = sum(advance(evt, today) for evt in stale)
+    session.commit()
+    session.close()
+    return moved
@@ -0,0 +1,154 @@
+# reminders.py
+"""
+Расписание напоминаний о событиях в БД.
+
+Для каждого Reminder хранится одна строка ReminderSchedule с ближайшим
+временем срабатывания. Периодический диспетчер забирает наступившие строки
+пачками и сдвигает next_run_at на interval_days, поэтому память и число задач
+в JobQueue не зависят от количества событий, а перезапуск ничего не теряет.
+
+У повторяющегося события строка не удаляется после вхождения: событие
+переходит к следующему вхождению (recurrence.advance), и напоминания идут
+дальше тем же шагом, пока серия не закончится.
+"""
+from datetime import datetime, date, timedelta, time, timezone
+
+from sqlalchemy.orm import Session
+
+import delivery
+import digest
+import metrics
+import outbox
+import recurrence
+import repository
+from models import SessionLocal, Event, Reminder, ReminderSchedule
+
+MSK = timezone(timedelta(hours=3))
+# в это время (МСК) расписание ставит уведомления дня в outbox; доставляются
+# они позже, каждому получателю в его слот (см. delivery.py)
+ENQUEUE_AT = time(0, 5)
+
+DISPATCH_INTERVAL = 60        # как часто диспетчер проверяет расписание, с
+BATCH_SIZE        = 100       # сколько строк расписания забираем за раз
+
+
+def to_utc(day: date, at: time = ENQUEUE_AT) -> datetime:
+    """day + время МСК → naive UTC, в котором хранится next_run_at."""
+    return datetime.combine(day, at, MSK).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def msk_day(run_at: datetime) -> date:
+    """Дата по МСК для naive UTC момента."""
+    return run_at.replace(tzinfo=timezone.utc).astimezone(MSK).date()
+
+
+def first_run_at(interval: int, event_day: date, now: datetime = None):
+    """
+    Первое срабатывание: сегодня (сразу), если обычное время доставки ещё не
+    прошло, иначе через interval дней в ENQUEUE_AT. None, если до события
+    напоминать уже некогда.
+    """
+    now = now or utc_now()
+    run_day = msk_day(now)
+    if now >= to_utc(run_day, delivery.DELIVERY_AT):
+        run_day += timedelta(days=interval)
+    if run_day > event_day:
+        return None
+    return max(to_utc(run_day), now)
+
+
+def schedule_reminder(session: Session, rem: Reminder, evt: Event) -> None:
+    """Добавляет строку расписания для напоминания (без commit)."""
+    run_at = first_run_at(rem.interval_days, recurrence.last_day(evt))
+    if run_at is None:
+        return
+    session.add(ReminderSchedule(
+        reminder=rem,
+        event_id=evt.id,
+        interval_days=rem.interval_days,
+        next_run_at=run_at,
+    ))
+
+
+def backfill_schedule() -> int:
+    """Создаёт строки расписания для напоминаний, у которых их ещё нет."""
+    session = SessionLocal()
+    missing = (
+        session.query(Reminder, Event)
+        .join(Event, Reminder.event)
+        .outerjoin(ReminderSchedule)
+        .filter(ReminderSchedule.reminder_id.is_(None))
+        .filter(Event.event_date >= msk_day(utc_now()))
+        .all()
+    )
+    for rem, evt in missing:
+        schedule_reminder(session, rem, evt)
+    session.commit()
+    session.close()
+    return len(missing)
+
+
+def render_reminder(evt: Event) -> str:
+    rule = recurrence.Rule.of(evt)
+    return (
+        f"⏰ Напоминание: событие «{evt.title}» запланировано на "
+        f"{evt.event_date.strftime('%d.%m.%Y')}"
+        + (f" ({rule.describe()})" if rule else "") + ".\n\n"
+        f"Описание события: «{evt.description}»"
+    )
+
+
+def render_reminder_line(evt: Event) -> str:
+    """Напоминание одной строкой — для ежедневной сводки."""
+    return f"⏰ «{evt.title}» — {evt.event_date.strftime('%d.%m.%Y')}"
+
+
+def claim_due(now: datetime = None, limit: int = BATCH_SIZE) -> int:
+    """
+    Забирает до limit наступивших напоминаний, ставит сообщения получателям
+    в outbox и сдвигает расписание — всё в одной транзакции. Возвращает число
+    обработанных строк расписания.
+
+    Срабатывание, пропущенное из-за простоя бота, отправляется только если
+    оно было запланировано на сегодня; дальше расписание догоняет текущее
+    время, не рассылая накопившиеся дубли.
+    """
+    now = now or utc_now()
+    today = msk_day(now)
+    session = SessionLocal()
+    rows = repository.due_reminders(session, now, limit)
+
+    messages = []
+    for sched, evt in rows:
+        # вхождение повторяющегося события могло пройти, пока напоминание ждало
+        recurrence.advance(evt, today)
+        if msk_day(sched.next_run_at) == today:
+            metrics.job_lag("send_reminder", sched.next_run_at.replace(tzinfo=timezone.utc).timestamp())
+            text, line = render_reminder(evt), render_reminder_line(evt)
+            occurrence = f"rem:{sched.reminder_id}:{sched.next_run_at.isoformat()}"
+            for u in evt.recipients:
+                in_digest = digest.wants_digest(u.digest)
+                messages.append(outbox.message(
+                    f"{occurrence}:{u.telegram_id}", u.telegram_id, line if in_digest else text,
+                    event_id=evt.id, digest_day=today if in_digest else None,
+                    deliver_at=delivery.deliver_at(u.telegram_id, today, u.tz, u.notify_hour, now),
+                ))
+
+        step = timedelta(days=sched.interval_days)
+        next_run = sched.next_run_at + step
+        while next_run <= now:
+            next_run += step
+        # event_date не трогаем: предстоящее вхождение ещё не прошло, прошедшие
+        # сдвигает advance выше и advance_all
+        if msk_day(next_run) > recurrence.last_day(evt):
+            session.delete(sched)
+        else:
+            sched.next_run_at = next_run
+    outbox.enqueue(session, messages, now)
+    session.commit()
+    session.close()
+    return len(rows)
@@ -0,0 +1,136 @@
+# repository.py
+"""
+Запросы к БД под конкретные сценарии бота.
+
+Ленивые связи ORM в циклах превращаются в N+1: каждое обращение к
+evt.recipients или evt.creator — отдельный SELECT. Запросы здесь загружают
+ровно то, что нужно вызывающему:
+
+- связь, которая нужна целиком, — selectinload (один SELECT ... IN на пачку),
+  и только нужные колонки связанных строк;
+- где не нужна identity map — кортежи строк вместо ORM-объектов;
+- удаление и массовые правки — набором DELETE/UPDATE по ключу, без загрузки
+  изменяемого в сессию;
+  отложенная работа удаляемого отменяется там же (jobs.py).
+
+Постраничные списки (pagination.py, picker.py) тоже выбирают только
+показываемые колонки. Число запросов на сценарий проверяют тесты
+tests/test_statements.py и tests/test_cancellation.py (python -m pytest).
+
+Функции принимают открытую сессию и не делают commit.
+"""
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session, selectinload
+
+import jobs
+from models import User, Event, Reminder, ReminderSchedule, event_recipients
+
+
+def user_row(session: Session, telegram_id: int):
+    """(id, telegram_id, full_name, position, birth_date, is_admin, unreachable) или None — для UserRecord."""
+    return session.execute(
+        select(User.id, User.telegram_id, User.full_name, User.position, User.birth_date, User.is_admin,
+               User.unreachable_at.isnot(None))
+        .where(User.telegram_id == telegram_id)
+    ).first()
+
+
+def user_id(session: Session, telegram_id: int):
+    return session.execute(select(User.id).where(User.telegram_id == telegram_id)).scalar()
+
+
+def existing_user_ids(session: Session, ids: list, chunk: int = 500) -> list:
+    """Те из ids, что ещё есть в users (IN-списки по chunk)."""
+    result = []
+    for i in range(0, len(ids), chunk):
+        result += session.execute(select(User.id).where(User.id.in_(ids[i:i + chunk]))).scalars().all()
+    return result
+
+
+def celebrants(session: Session, md_keys: list) -> list:
+    """Именинники [(id, ФИО)] по ключам birth_md."""
+    return session.execute(
+        select(User.id, User.full_name).where(User.birth_md.in_(md_keys))
+    ).all()
+
+
+def notification_targets(session: Session) -> list:
+    """Доступные пользователи с настройками доставки: [(id, chat_id, digest, tz, notify_hour)]."""
+    return session.execute(
+        select(User.id, User.telegram_id, User.digest, User.tz, User.notify_hour)
+        .where(User.unreachable_at.is_(None))
+    ).all()
+
+
+def due_reminders(session: Session, now, limit: int) -> list:
+    """
+    До limit наступивших строк расписания [(ReminderSchedule, Event)], с
+    доступными получателями событий: два запроса на пачку при любом числе событий.
+    Строки расписания — ORM-объекты: вызывающий сдвигает или удаляет их.
+    """
+    return (
+        session.query(ReminderSchedule, Event)
+        .join(Event, ReminderSchedule.event_id == Event.id)
+        .filter(ReminderSchedule.next_run_at <= now)
+        .order_by(ReminderSchedule.next_run_at)
+        .limit(limit)
+        .options(selectinload(Event.recipients.and_(User.unreachable_at.is_(None))).load_only(
+            User.telegram_id, User.digest, User.tz, User.notify_hour
+        ))
+        # Postgres: два экземпляра не заберут одни и те же строки; SQLite это игнорирует
+        .with_for_update(of=ReminderSchedule, skip_locked=True)
+        .all()
+    )
+
+
+def delete_events(session: Session, evt_ids) -> None:
+    """Удаляет события (список или подзапрос id) с напоминаниями, получателями и их работой."""
+    jobs.cancel_events(session, evt_ids)
+    for stmt in (
+        delete(Reminder).where(Reminder.event_id.in_(evt_ids)),
+        delete(event_recipients).where(event_recipients.c.event_id.in_(evt_ids)),
+        delete(Event).where(Event.id.in_(evt_ids)),
+    ):
+        session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def delete_event(session: Session, evt_id: int, creator_tg_id: int = None):
+    """
+    Удаляет событие с напоминаниями, расписанием и получателями; возвращает
+    его название или None, если события нет (или его создал не creator_tg_id).
+    """
+    query = select(Event.title).where(Event.id == evt_id)
+    if creator_tg_id is not None:
+        query = query.join(User, Event.creator_id == User.id).where(User.telegram_id == creator_tg_id)
+    title = session.execute(query).scalar()
+    if title is None:
+        return None
+    delete_events(session, [evt_id])
+    return title
+
+
+def delete_users(session: Session, user_ids: list) -> list:
+    """
+    Удаляет пользователей вместе с созданными ими событиями и отменяет
+    уведомления о них и им; возвращает [(ФИО, telegram_id)] удалённых.
+    Число запросов не зависит от числа пользователей.
+    """
+    rows = session.execute(select(User.full_name, User.telegram_id).where(User.id.in_(user_ids))).all()
+    if not rows:
+        return []
+    delete_events(session, select(Event.id).where(Event.creator_id.in_(user_ids)))
+    jobs.cancel_users(session, user_ids, [r.telegram_id for r in rows])
+    session.execute(delete(event_recipients).where(event_recipients.c.user_id.in_(user_ids)))
+    session.execute(delete(User).where(User.id.in_(user_ids)).execution_options(synchronize_session=False))
+    return rows
+
+
+def promote_users(session: Session, user_ids: list) -> list:
+    """Делает пользователей админами одним UPDATE; возвращает [(ФИО, telegram_id)] найденных."""
+    rows = session.execute(select(User.full_name, User.telegram_id).where(User.id.in_(user_ids))).all()
+    if rows:
+        session.execute(
+            update(User).where(User.id.in_(user_ids), User.is_admin.is_(False)).values(is_admin=True)
+            .execution_options(synchronize_session=False)
+        )
+    return rows
@@ -0,0 +1,194 @@
+# roster.py
+"""
+Массовые операции со списком пользователей.
+
+Кафедру целиком не нужно проводить через регистрацию по одному: админ
+присылает боту CSV или JSON со списком (или запускает этот модуль из
+командной строки), и все пользователи записываются одной транзакцией —
+пачками executemany по IMPORT_CHUNK строк, минуя ORM. Файл сначала
+проверяется целиком: если хоть одна строка с ошибкой, не записывается
+ничего. Уже зарегистрированные telegram_id пропускаются, так что тот же
+файл можно прислать повторно.
+
+Колонки (первая строка CSV, разделитель «,» или «;»; в JSON — ключи
+объектов в списке):
+
+    telegram_id, full_name, position, birth_date[, is_admin]
+
+birth_date — ДД.ММ.ГГГГ или ГГГГ-ММ-ДД, is_admin — 1/0, да/нет, true/false.
+
+Дни рождения отдельно не планируются: ежедневная задача ищет именинников
+по users.birth_md, а импорт заполняет его в том же INSERT. Кэш
+пользователей сбрасывается один раз на файл.
+
+Повышение и удаление выбранных в боте пользователей — тоже набором:
+несколько UPDATE/DELETE по списку id, сколько бы их ни было
+(repository.promote_users / delete_users).
+
+    python roster.py import users.csv
+    python roster.py promote 3 5 8
+    python roster.py delete 13 21
+
+Из командной строки кэш работающего бота не сбросить: изменения он увидит
+через USER_CACHE_TTL (см. cache.py).
+"""
+import csv
+import io
+import json
+import os
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+import repository
+from cache import user_cache
+from models import engine, SessionLocal, User, birth_md_key, name_search_key
+
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', '20000'))
+IMPORT_CHUNK    = 1000
+
+COLUMNS = ('telegram_id', 'full_name', 'position', 'birth_date')
+_TRUE, _FALSE = {'1', 'да', 'true', 'yes'}, {'', '0', 'нет', 'false', 'no'}
+
+
+def _records(data: bytes, filename: str) -> list:
+    """Сырые записи файла: [(номер строки, {колонка: значение})]."""
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith('.json'):
+        items = json.loads(text)
+        if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+            raise ValueError("ожидается список объектов")
+        return [(n, item) for n, item in enumerate(items, 1)]
+    dialect = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=',;\t')
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    missing = set(COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"нет колонок: {', '.join(sorted(missing))}")
+    return [(reader.line_num, row) for row in reader]
+
+
+def _birth_date(value) -> date:
+    value = str(value).strip()
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"дата рождения «{value}» — нужно ДД.ММ.ГГГГ")
+
+
+def _row(item: dict, positions) -> dict:
+    try:
+        tg_id = int(str(item.get('telegram_id', '')).strip())
+    except ValueError:
+        raise ValueError("telegram_id — не число") from None
+    if tg_id <= 0:
+        raise ValueError("telegram_id должен быть положительным")
+    name = " ".join(str(item.get('full_name') or '').split())
+    if not name or len(name) > 255:
+        raise ValueError("пустое или слишком длинное ФИО")
+    position = str(item.get('position') or '').strip()
+    if positions and position not in positions:
+        raise ValueError(f"неизвестная должность «{position}»")
+    bday = _birth_date(item.get('birth_date', ''))
+    admin = str(item.get('is_admin', '')).strip().lower()
+    if admin not in _TRUE | _FALSE:
+        raise ValueError(f"is_admin «{admin}» — нужно 1 или 0")
+    return {
+        'telegram_id': tg_id, 'full_name': name, 'name_key': name_search_key(name),
+        'position': position, 'birth_date': bday, 'birth_md': birth_md_key(bday),
+        'is_admin': admin in _TRUE,
+    }
+
+
+def parse(data: bytes, filename: str, positions=None):
+    """
+    Проверяет файл целиком; возвращает (строки для import_users, ошибки).
+    Ошибки — [(номер строки, текст)]; если они есть, строки не возвращаются.
+    """
+    try:
+        records = _records(data, filename)
+    except (ValueError, csv.Error) as e:  # JSONDecodeError и UnicodeDecodeError — тоже ValueError
+        return [], [(0, f"файл не разобран: {e}")]
+    if len(records) > IMPORT_MAX_ROWS:
+        return [], [(0, f"больше {IMPORT_MAX_ROWS} строк")]
+
+    rows, errors, seen = [], [], set()
+    for line, item in records:
+        try:
+            row = _row(item, positions)
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        if row['telegram_id'] in seen:
+            errors.append((line, f"telegram_id {row['telegram_id']} повторяется"))
+            continue
+        seen.add(row['telegram_id'])
+        rows.append(row)
+    return ([] if errors else rows), errors
+
+
+def import_users(rows: list):
+    """Записывает новых пользователей одной транзакцией; возвращает (добавлено, уже были)."""
+    users = User.__table__
+    with engine.begin() as conn:
+        existing = set()
+        for i in range(0, len(rows), IMPORT_CHUNK):
+            chunk = [r['telegram_id'] for r in rows[i:i + IMPORT_CHUNK]]
+            existing.update(conn.execute(select(users.c.telegram_id).where(users.c.telegram_id.in_(chunk))).scalars())
+        new = [r for r in rows if r['telegram_id'] not in existing]
+        for i in range(0, len(new), IMPORT_CHUNK):
+            conn.execute(users.insert(), new[i:i + IMPORT_CHUNK])
+    if new:
+        # в кэше могли остаться «такого пользователя нет» для импортированных
+        user_cache.invalidate()
+    return len(new), len(existing)
+
+
+def promote(user_ids: list) -> list:
+    """Делает пользователей админами; возвращает ФИО найденных."""
+    session = SessionLocal()
+    rows = repository.promote_users(session, user_ids)
+    session.commit()
+    session.close()
+    for r in rows:
+        user_cache.invalidate(r.telegram_id)
+    return [r.full_name for r in rows]
+
+
+def delete(user_ids: list) -> list:
+    """Удаляет пользователей с их событиями; возвращает ФИО удалённых."""
+    session = SessionLocal()
+    rows = repository.delete_users(session, user_ids)
+    session.commit()
+    session.close()
+    for r in rows:
+        user_cache.invalidate(r.telegram_id)
+    return [r.full_name for r in rows]
+
+
+def main(argv: list) -> int:
+    if len(argv) < 2 or argv[0] not in ('import', 'promote', 'delete'):
+        print(__doc__)
+        return 2
+    command, args = argv[0], argv[1:]
+    if command == 'import':
+        from bot import POSITIONS
+        with open(args[0], 'rb') as f:
+            rows, errors = parse(f.read(), args[0], POSITIONS)
+        for line, message in errors:
+            print(f"строка {line}: {message}")
+        if errors:
+            return 1
+        added, skipped = import_users(rows)
+        print(f"Добавлено {added}, уже были зарегистрированы {skipped}")
+        return 0
+    ids = [int(a) for a in args]
+    names = promote(ids) if command == 'promote' else delete(ids)
+    print(f"{'Теперь админы' if command == 'promote' else 'Удалены'}: {', '.join(names) or 'никто не найден'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,156 @@
+# search.py
+"""
+Полнотекстовый поиск событий по названию и описанию (/search, кнопка «Поиск»).
+
+SQLite: виртуальная таблица FTS5 events_fts без собственной копии текста
+(content=''), rowid = events.id. Её держат в актуальном состоянии триггеры
+на INSERT, DELETE и UPDATE названия/описания events, так что вставки,
+удаления (в том числе архивация) и правки событий попадают в индекс в той
+же транзакции, без кода в хэндлерах. Текст индексируется с «ё» → «е», как
+name_search_key. Результаты упорядочены по bm25 (название весит больше
+описания). Русской морфологии в FTS5 нет, поэтому слово запроса ищется по
+префиксу без гласного окончания: «семинары» → семинар*.
+
+PostgreSQL: GIN-индекс по выражению to_tsvector('russian', ...) — то же
+выражение стоит в запросе, синхронизировать нечего; ранжирование ts_rank.
+
+Страница — OFFSET по рангу: чтобы упорядочить по релевантности, движок всё
+равно оценивает все совпадения, а выбирает их он по индексу, а не
+перебором events. Ищутся события из рабочей таблицы; архив (archive.py) —
+нет.
+
+    python -m benchmarks.search   — задержка поиска на сотнях тысяч событий
+"""
+import re
+from dataclasses import dataclass
+from datetime import date
+
+from sqlalchemy import column, desc, func, literal_column, select, table, text
+
+from models import SessionLocal, engine, User, Event
+from pagination import PAGE_SIZE, Page
+
+MAX_TERMS = 8
+MIN_STEM  = 3       # короче не обрезаем окончание
+ENDINGS   = "аеиоуыэюяйь"
+
+_fts = table('events_fts', column('rowid'), column('rank'))
+
+# документ события для PostgreSQL: одно выражение в индексе и в запросе
+PG_DOCUMENT = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B')"
+)
+
+
+def _fold(col: str) -> str:
+    return f"replace(replace({col}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def install(conn) -> None:
+    """Индекс поиска и триггеры; безопасно вызывать повторно."""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_events_search ON events USING gin (({PG_DOCUMENT}))"))
+        return
+    if conn.dialect.name != 'sqlite':
+        return
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'events_fts'")).first()
+    new = f"new.id, {_fold('new.title')}, {_fold('new.description')}"
+    old = f"old.id, {_fold('old.title')}, {_fold('old.description')}"
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5("
+        "title, description, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+            INSERT INTO events_fts (rowid, title, description) VALUES ({new});
+        END"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts (events_fts, rowid, title, description) VALUES ('delete', {old});
+        END"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description ON events BEGIN
+            INSERT INTO events_fts (events_fts, rowid, title, description) VALUES ('delete', {old});
+            INSERT INTO events_fts (rowid, title, description) VALUES ({new});
+        END"""))
+    if not exists:
+        conn.execute(text("INSERT INTO events_fts (events_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')"))
+        conn.execute(text(
+            f"INSERT INTO events_fts (rowid, title, description) "
+            f"SELECT id, {_fold('title')}, {_fold('description')} FROM events"
+        ))
+
+
+def terms(query: str) -> list:
+    """Слова запроса в нижнем регистре, с «ё» → «е»; не больше MAX_TERMS."""
+    return re.findall(r"\w+", query.lower().replace("ё", "е"))[:MAX_TERMS]
+
+
+def _stem(word: str) -> str:
+    stem = word
+    while len(stem) > MIN_STEM and stem[-1] in ENDINGS:
+        stem = stem[:-1]
+    return stem
+
+
+def fts_query(words: list) -> str:
+    """Запрос FTS5: все слова (И), каждое по префиксу основы."""
+    return " ".join(f'"{_stem(w)}"*' for w in words)
+
+
+def ts_query(words: list) -> str:
+    """Запрос to_tsquery: все слова (И) по префиксу, основу находит словарь russian."""
+    return " & ".join(f"{w}:*" for w in words)
+
+
+@dataclass
+class Hit:
+    pos: int              # место в выдаче, ключ страницы
+    id: int
+    title: str
+    event_date: date
+    repeat: str
+    creator_name: str
+
+
+def _statement(words: list):
+    cols = (Event.id, Event.title, Event.event_date, Event.repeat, User.full_name.label('creator_name'))
+    if engine.dialect.name == 'postgresql':
+        document = literal_column(PG_DOCUMENT)
+        tsq = func.to_tsquery('russian', ts_query(words))
+        return (
+            select(*cols).join(User, User.id == Event.creator_id)
+            .where(document.op('@@')(tsq))
+            .order_by(desc(func.ts_rank(document, tsq)), Event.id)
+        )
+    return (
+        select(*cols).select_from(_fts)
+        .join(Event, Event.id == _fts.c.rowid)
+        .join(User, User.id == Event.creator_id)
+        .where(literal_column('events_fts').op('MATCH')(fts_query(words)))
+        .order_by(_fts.c.rank)  # только rank: FTS5 сортирует сам, без временного B-дерева
+    )
+
+
+def search_page(query: str, offset: int = 0, limit: int = PAGE_SIZE) -> Page:
+    """Страница результатов с места offset; строки — Hit."""
+    words = terms(query)
+    if not words:
+        return Page([])
+    session = SessionLocal()
+    rows = session.execute(_statement(words).limit(limit + 1).offset(offset)).all()
+    session.close()
+    hits = [Hit(offset + i, *row) for i, row in enumerate(rows[:limit])]
+    return Page(hits, has_prev=offset > 0, has_next=len(rows) > limit)
+
+
+# --- Ключи в callback_data ---
+def hit_key(hit: Hit) -> str:
+    return str(hit.pos)
+
+
+def page_offset(raw: str, forward: bool) -> int:
+    """«Вперёд» — после последней показанной строки, «Назад» — страница перед первой."""
+    pos = int(raw)
+    return pos + 1 if forward else max(pos - PAGE_SIZE, 0)
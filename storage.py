@@ -0,0 +1,98 @@
+# storage.py
+"""
+Профили хранилища: настройки движка SQLAlchemy и PRAGMA для SQLite.
+
+Профиль выбирается в .env (DB_PROFILE), отдельные параметры можно
+переопределить переменными SQLITE_* / DB_*:
+
+    DB_PROFILE=balanced        safe | balanced | fast
+    DB_ECHO=0                  0 | 1 | debug — логирование SQL
+    DB_POOL_SIZE=5
+    DB_MAX_OVERFLOW=10
+    SQLITE_JOURNAL_MODE=WAL
+    SQLITE_SYNCHRONOUS=NORMAL
+    SQLITE_BUSY_TIMEOUT=5000   мс
+    SQLITE_CACHE_SIZE=-16000   отрицательное — в КиБ
+    SQLITE_MMAP_SIZE=67108864  байт
+
+Сравнить профили на своей машине: python -m benchmarks.storage_profiles
+"""
+import os
+
+from sqlalchemy import create_engine, event
+
+PROFILES = {
+    # поведение SQLite по умолчанию: журнал отката, полная синхронизация
+    'safe': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'cache_size': -2000,
+        'mmap_size': 0,
+    },
+    # WAL: читатели не ждут писателя; NORMAL в WAL не теряет целостность
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,
+        'mmap_size': 64 * 1024 * 1024,
+    },
+    # без fsync: при сбое питания можно потерять последние транзакции
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'busy_timeout': 5000,
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+    },
+}
+DEFAULT_PROFILE = 'balanced'
+
+
+def _echo(value: str):
+    value = (value or '').strip().lower()
+    if value == 'debug':
+        return 'debug'
+    return value in ('1', 'true', 'yes')
+
+
+def sqlite_pragmas(profile: str = None) -> dict:
+    """PRAGMA профиля с учётом переопределений из окружения."""
+    name = profile or os.getenv('DB_PROFILE', DEFAULT_PROFILE)
+    if name not in PROFILES:
+        raise RuntimeError(f"Неизвестный DB_PROFILE={name!r}, есть: {', '.join(PROFILES)}")
+    pragmas = dict(PROFILES[name])
+    for key in pragmas:
+        override = os.getenv(f'SQLITE_{key.upper()}')
+        if override:
+            pragmas[key] = override
+    return pragmas
+
+
+def make_engine(url: str, profile: str = None):
+    """Создаёт движок по профилю; для SQLite PRAGMA ставятся на каждое соединение."""
+    options = {
+        'echo': _echo(os.getenv('DB_ECHO')),
+        'future': True,
+        'pool_pre_ping': not url.startswith('sqlite'),
+    }
+    in_memory = url in ('sqlite://', 'sqlite:///:memory:')
+    if not in_memory:
+        options['pool_size'] = int(os.getenv('DB_POOL_SIZE', '5'))
+        options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    engine = create_engine(url, **options)
+
+    if engine.dialect.name == 'sqlite':
+        pragmas = sqlite_pragmas(profile)
+        if in_memory:
+            pragmas.pop('journal_mode')
+
+        @event.listens_for(engine, "connect")
+        def _apply_pragmas(dbapi_conn, _record):
+            cursor = dbapi_conn.cursor()
+            for key, value in pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+            cursor.close()
+
+    return engine
@@ -0,0 +1,29 @@
+# tests/conftest.py
+"""
+Общая БД тестов: временный файл SQLite со схемой и USERS пользователями.
+
+DATABASE_URL задаётся до импорта models — движок создаётся при импорте.
+"""
+import os
+import tempfile
+
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ['ADMIN_TELEGRAM_ID'] = '1'
+
+import pytest
+
+from tests.helpers import USERS
+
+
+@pytest.fixture(scope='session')
+def db():
+    """Схема и засеянные пользователи; данные тестов копятся в одной БД."""
+    import models
+    from cache import user_cache
+    from migrations import run_migrations
+    from benchmarks.seed import seed
+
+    run_migrations()
+    seed(USERS, 0, 0, 0, ["доцент", "профессор"])
+    user_cache.invalidate()
+    return models.engine
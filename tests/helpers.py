@@ -0,0 +1,51 @@
+# tests/helpers.py
+"""Данные и вызовы хэндлеров для тестов; БД готовит фикстура db (conftest.py)."""
+import asyncio
+from datetime import date, timedelta
+
+USERS = 400
+ADMIN, OWNER = 1, 2         # telegram_id = users.id; 1 — администратор
+
+_next_user = iter(range(USERS + 1, 10 ** 9))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def new_tg_id() -> int:
+    """telegram_id, которого ещё нет в БД."""
+    return next(_next_user)
+
+
+def new_event(recipients: int, creator: int = OWNER, **kwargs) -> int:
+    import bot
+    return bot.create_event(
+        creator, "Проверка", "Описание", date.today() + timedelta(days=30), 7, range(3, 3 + recipients), **kwargs
+    )
+
+
+def count_statements(fn, *args):
+    """Запросы, выполненные за вызов fn(*args) (корутина — через asyncio.run)."""
+    import models
+    from benchmarks.queries import QueryCounter
+
+    with QueryCounter(models.engine, keep_statements=True) as qc:
+        result = fn(*args)
+        if asyncio.iscoroutine(result):
+            run(result)
+    return qc
+
+
+def check_scenario(name: str, budget: int, setup, call, sizes: tuple) -> None:
+    """
+    Сценарий из таблицы SCENARIOS: имя → (бюджет запросов, подготовка(размер) -> аргумент,
+    вызов(аргумент), размеры (маленький, большой)).
+
+    Число запросов на маленьких и больших данных должно совпадать (нет N+1)
+    и не превышать бюджет.
+    """
+    small, large = (count_statements(call, setup(size)) for size in sizes)
+    listing = "\n".join(s.splitlines()[0][:120] for s in large.statements)
+    assert small.count == large.count, f"N+1 в {name}: {small.count} / {large.count}\n{listing}"
+    assert large.count <= budget, f"{name}: {large.count} запросов при бюджете {budget}\n{listing}"
@@ -0,0 +1,92 @@
+# tests/test_cancellation.py
+"""
+Отмена отложенной работы удаляемых событий и пользователей (jobs.py).
+
+Удаление отменяет расписание и сообщения в outbox за фиксированное число
+запросов — событие с несколькими и с сотнями получателей, пользователь с
+одним и с десятками событий — и не оставляет осиротевшей работы.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+import bot
+import jobs
+import outbox
+import reminders
+from cache import load_user
+from benchmarks.fakes import FakeContext, FakeUpdate
+from tests.helpers import ADMIN, OWNER, check_scenario, new_event, new_tg_id, run
+
+SMALL, LARGE = 3, 300       # получателей у события
+
+
+# --- Подготовка: размер -> аргумент вызова ---
+def queued_event(recipients):
+    """Событие, уведомления о котором уже ждут в outbox своего слота."""
+    evt_id = new_event(recipients)
+    later = reminders.utc_now() + timedelta(hours=1)
+    outbox.enqueue_all([
+        outbox.message(f"check:{evt_id}:{tg}", tg, "⏰", event_id=evt_id, deliver_at=later)
+        for tg in range(3, 3 + recipients)
+    ])
+    return evt_id
+
+
+def doomed_user(size):
+    """Пользователь с size событиями и size * 10 поздравлениями о нём в outbox."""
+    tg = new_tg_id()
+    uid = bot.register_user(tg, f"Удаляемый {tg}", "доцент", date(1990, 1, 1))[0]
+    for _ in range(size):
+        new_event(SMALL, creator=tg)
+    later = reminders.utc_now() + timedelta(hours=1)
+    outbox.enqueue_all([
+        outbox.message(f"check:bday:{uid}:{chat}", chat, "🎂", user_id=uid, deliver_at=later)
+        for chat in range(3, 3 + size * 10)
+    ])
+    return uid
+
+
+def doomed_users(size):
+    """size пользователей, у каждого по событию и поздравлению в outbox."""
+    ids = {doomed_user(1) for _ in range(size)}
+    load_user(ADMIN)
+    return ids
+
+
+# --- Вызовы ---
+async def delete_own(evt_id):
+    await bot.delete_evt_callback(FakeUpdate(OWNER, callback_data=f"delete_evt_{evt_id}"), FakeContext())
+
+async def delete_admin(evt_id):
+    await bot.admin_delete_evt_callback(FakeUpdate(ADMIN, callback_data=f"admin_delete_evt_{evt_id}"), FakeContext())
+
+async def delete_user(user_id):
+    await bot.delete_user_callback(FakeUpdate(ADMIN, callback_data=f"delete_user_{user_id}"), FakeContext())
+
+async def bulk_delete(user_ids):
+    context = FakeContext(user_data={'usr_sel': set(user_ids)})
+    await bot.users_select_callback(FakeUpdate(ADMIN, callback_data="usel:delete"), context)
+
+
+SCENARIOS = {  # формат — см. helpers.check_scenario
+    'delete_evt_callback':       (6, queued_event, delete_own, (SMALL, LARGE)),
+    'admin_delete_evt_callback': (6, queued_event, delete_admin, (SMALL, LARGE)),
+    'delete_user_callback':      (10, doomed_user, delete_user, (1, 30)),
+    'bulk_delete':               (10, doomed_users, bulk_delete, (1, 30)),
+}
+
+
+@pytest.mark.parametrize('name', SCENARIOS)
+def test_cancellation_cost(db, name):
+    check_scenario(name, *SCENARIOS[name])
+    assert not any(jobs.count_orphans().values()), "после удаления осталась осиротевшая работа"
+
+
+def test_orphan_gauge_without_leadership(db):
+    """Задача count_orphans обновляет bot_orphaned_jobs на любом экземпляре, не только на ведущем."""
+    jobs.orphans.clear()
+    run(bot.count_orphans(FakeContext()))
+    assert {labels for _, labels in jobs.collect()} == {
+        (("kind", kind),) for kind in ("schedule", "outbox_event", "outbox_user")
+    }
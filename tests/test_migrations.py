@@ -0,0 +1,37 @@
+# tests/test_migrations.py
+"""Одновременный старт нескольких экземпляров: init_db не падает и доводит схему до LATEST."""
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from migrations import LATEST
+
+ROOT = Path(__file__).resolve().parent.parent
+INSTANCES = 4
+
+
+def start_all(db: Path) -> list:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db}", ADMIN_TELEGRAM_ID='1')
+    procs = [
+        subprocess.Popen([sys.executable, "-c", "import models; models.init_db()"], cwd=ROOT, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        for _ in range(INSTANCES)
+    ]
+    return [(p.wait(timeout=120), p.stderr.read()) for p in procs]
+
+
+@pytest.mark.parametrize('source', ['fresh', 'baseline'])
+def test_concurrent_init_db(tmp_path, source):
+    db = tmp_path / "bot.db"
+    if source == 'baseline':
+        shutil.copy(ROOT / "bot_database.db", db)   # схема до всех миграций
+    for code, stderr in start_all(db):
+        assert code == 0, stderr
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == LATEST
+        assert conn.execute("SELECT COUNT(*) FROM users WHERE is_admin").fetchone()[0] >= 1
@@ -0,0 +1,30 @@
+# tests/test_picker.py
+"""Поиск получателей (picker.search_page): по началу любого слова ФИО и должности."""
+from datetime import date
+
+import bot
+import picker
+from cache import user_cache
+from tests.helpers import new_tg_id
+
+
+def found(prefix: str) -> set:
+    ids, key = set(), None
+    while True:
+        page = picker.search_page(prefix, key)
+        ids |= {row.id for row in page.rows}
+        if not page.has_next:
+            return ids
+        key = picker.page_keys(page)[1]
+
+
+def test_search_by_word_start_and_position(db):
+    tg = new_tg_id()
+    uid = bot.register_user(tg, f"Щукина Ёлка Зиновьевна{tg}", "старший преподаватель", date(1990, 1, 1))[0]
+    user_cache.invalidate()
+    assert uid in found("щук")                 # начало ФИО
+    assert uid in found("елк")                 # имя, «ё» → «е»
+    assert uid in found("Зиновьевна")          # отчество целиком
+    assert uid in found("препод")              # второе слово должности
+    assert uid not in found("укина")           # середина слова — не совпадение
+    assert not found("%")                      # символы LIKE экранируются
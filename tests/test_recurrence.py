@@ -0,0 +1,65 @@
+# tests/test_recurrence.py
+"""Повторяющиеся события: срабатывание напоминания не сдвигает предстоящее вхождение."""
+from datetime import date, timedelta
+
+import pytest
+
+import bot
+import models
+import recurrence
+import reminders
+from tests.helpers import OWNER
+
+
+def event_date(evt_id: int) -> date:
+    with models.engine.connect() as conn:
+        return conn.execute(
+            models.Event.__table__.select().with_only_columns(models.Event.event_date)
+            .where(models.Event.id == evt_id)
+        ).scalar()
+
+
+def schedule_rows(evt_id: int) -> int:
+    with models.engine.connect() as conn:
+        return len(conn.execute(
+            models.ReminderSchedule.__table__.select().where(models.ReminderSchedule.event_id == evt_id)
+        ).all())
+
+
+def fire(evt_id: int, day: date) -> None:
+    """Напоминание события срабатывает в день day."""
+    run_at = reminders.to_utc(day)
+    with models.engine.begin() as conn:
+        conn.execute(
+            models.ReminderSchedule.__table__.update()
+            .where(models.ReminderSchedule.event_id == evt_id).values(next_run_at=run_at)
+        )
+    now = run_at + timedelta(minutes=1)
+    while reminders.claim_due(now):
+        pass
+
+
+@pytest.mark.parametrize('interval, before', [(7, 1), (1, 0)])
+def test_reminder_keeps_upcoming_occurrence(db, interval, before):
+    """Еженедельное событие: напоминание накануне или в сам день не переносит его на неделю."""
+    day = date.today() + timedelta(days=40)
+    evt_id = bot.create_event(OWNER, "Семинар", "Еженедельный", day, interval, [3],
+                              repeat=(recurrence.WEEKLY, 1))
+    fire(evt_id, day - timedelta(days=before))
+    assert event_date(evt_id) == day
+    assert schedule_rows(evt_id) == 1
+
+
+def test_schedule_ends_with_series(db):
+    """Расписание удаляется только после последнего вхождения серии."""
+    day = date.today() + timedelta(days=40)
+    evt_id = bot.create_event(OWNER, "Семинар", "Две недели", day, 7, [3], repeat=(recurrence.WEEKLY, 1))
+    with models.engine.begin() as conn:
+        conn.execute(
+            models.Event.__table__.update().where(models.Event.id == evt_id)
+            .values(repeat_until=day + timedelta(days=7))
+        )
+    fire(evt_id, day)
+    assert schedule_rows(evt_id) == 1
+    fire(evt_id, day + timedelta(days=7))
+    assert schedule_rows(evt_id) == 0
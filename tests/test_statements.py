@@ -0,0 +1,113 @@
+# tests/test_statements.py
+"""
+Число SQL-запросов на сценарий (см. repository.py).
+
+Каждый сценарий выполняется на маленьких и больших данных: число запросов
+не должно зависеть от объёма (нет N+1) и не должно превышать бюджет.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+import bot
+import models
+import reminders
+import roster
+from cache import load_user, user_cache
+from benchmarks.fakes import FakeContext, FakeUpdate
+from tests.helpers import ADMIN, OWNER, check_scenario, new_event, new_tg_id
+
+SMALL = 3                   # получателей у события
+FEW, MANY = 1, 20           # наступивших напоминаний за тик
+
+
+# --- Подготовка: размер -> аргумент вызова ---
+def setup_events(size):
+    for _ in range(size):
+        new_event(SMALL)
+    user_cache.invalidate()
+
+
+def setup_due(size):
+    evt_ids = [new_event(SMALL if size == FEW else 30) for _ in range(size)]
+    with models.engine.begin() as conn:
+        conn.execute(
+            models.ReminderSchedule.__table__.update()
+            .where(models.ReminderSchedule.event_id.in_(evt_ids))
+            .values(next_run_at=reminders.utc_now() - timedelta(minutes=1))
+        )
+
+
+def new_users(size):
+    ids = {bot.register_user(tg, f"Новый {tg}", "доцент", date(1990, 1, 1))[0]
+           for tg in (new_tg_id() for _ in range(size))}
+    load_user(ADMIN)
+    return ids
+
+
+def import_file(size):
+    """CSV на size новых пользователей и одного уже зарегистрированного."""
+    lines = ["telegram_id;full_name;position;birth_date", f"{OWNER};Уже есть;доцент;01.01.1990"]
+    for _ in range(size):
+        tg = new_tg_id()
+        lines.append(f"{tg};Импортов Пётр {tg};профессор;{1 + tg % 28:02d}.03.1985")
+    return "\n".join(lines).encode()
+
+
+def birthday_of(user_id):
+    with models.engine.connect() as conn:
+        return conn.execute(
+            models.User.__table__.select().with_only_columns(models.User.birth_date)
+            .where(models.User.id == user_id)
+        ).scalar()
+
+
+# --- Вызовы ---
+async def bulk_promote(user_ids):
+    context = FakeContext(user_data={'usr_sel': set(user_ids)})
+    await bot.users_select_callback(FakeUpdate(ADMIN, callback_data="usel:promote"), context)
+
+def import_users(data):
+    rows, errors = roster.parse(data, "users.csv", bot.POSITIONS)
+    assert not errors, errors
+    roster.import_users(rows)
+
+def claim_due(_):
+    reminders.claim_due()
+
+async def events_list(_):
+    await bot.events_list(FakeUpdate(ADMIN), FakeContext())
+
+async def manage_events(_):
+    await bot.manage_events(FakeUpdate(OWNER), FakeContext())
+
+async def search_events(_):
+    await bot.search_start(FakeUpdate(ADMIN), FakeContext(args=["проверки"]))
+
+async def manage_users(_):
+    await bot.manage_users_callback(FakeUpdate(ADMIN, callback_data="manage_users"), FakeContext())
+
+async def start_cold(_):
+    user_cache.invalidate()
+    await bot.start(FakeUpdate(OWNER), FakeContext())
+
+def birthday_recipients(day):
+    bot._birthday_recipients(day)
+
+
+SCENARIOS = {  # формат — см. helpers.check_scenario
+    'bulk_promote':          (2, new_users, bulk_promote, (1, 30)),
+    'import_users':          (2, import_file, import_users, (10, 900)),
+    'claim_due':             (4, setup_due, claim_due, (FEW, MANY)),
+    'events_list':           (1, setup_events, events_list, (1, 15)),
+    'manage_events':         (2, setup_events, manage_events, (1, 15)),
+    'search':                (1, setup_events, search_events, (1, 15)),
+    'manage_users_callback': (1, lambda n: None, manage_users, (0, 0)),
+    'start_cold_cache':      (1, lambda n: None, start_cold, (0, 0)),
+    'birthday_recipients':   (2, birthday_of, birthday_recipients, (3, 300)),
+}
+
+
+@pytest.mark.parametrize('name', SCENARIOS)
+def test_statement_count(db, name):
+    check_scenario(name, *SCENARIOS[name])
@@ -0,0 +1,58 @@
+# tests/test_webhook.py
+"""Webhook: параллельная обработка апдейтов (PerUserUpdateProcessor) и сроки чтения запроса (WebhookServer)."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import webhook
+from webhook import PerUserUpdateProcessor, WebhookServer
+
+HANDLER = 0.2               # секунд на апдейт
+
+
+def update(user_id: int):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), effective_chat=None)
+
+
+async def feed(processor, updates) -> dict:
+    """Обрабатывает апдейты (пользователь, номер) как Application; возвращает время завершения и порядок."""
+    started = time.perf_counter()
+    finished, order = {}, []
+
+    async def handler(user_id, n):
+        await asyncio.sleep(HANDLER)
+        order.append((user_id, n))
+        finished[user_id, n] = time.perf_counter() - started
+
+    await asyncio.gather(*(
+        asyncio.create_task(processor.process_update(update(user_id), handler(user_id, n)))
+        for user_id, n in updates
+    ))
+    return finished, order
+
+
+def test_busy_user_does_not_hold_slots():
+    """Очередь одного пользователя не занимает слоты: апдейт второго готов за одну обработку."""
+    processor = PerUserUpdateProcessor(4)
+    finished, order = asyncio.run(feed(processor, [(1, n) for n in range(8)] + [(2, 0)]))
+    assert finished[2, 0] < HANDLER * 1.5, f"второй пользователь ждал {finished[2, 0]:.2f} с"
+    assert [n for user_id, n in order if user_id == 1] == list(range(8))
+
+
+def test_stalled_request_is_dropped(monkeypatch):
+    """Клиент прислал строку запроса и замолчал: 408 и закрытие за READ_TIMEOUT, а не вечное ожидание."""
+    monkeypatch.setattr(webhook, 'READ_TIMEOUT', 0.3)
+
+    async def stalled():
+        server = WebhookServer(None, "/telegram", "secret")
+        await server.start('127.0.0.1', 0)
+        port = server._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"POST /telegram HTTP/1.1\r\nContent-Length: 10\r\n")
+        await writer.drain()
+        reply = await asyncio.wait_for(reader.read(), timeout=2)
+        writer.close()
+        await server.stop()
+        return reply
+
+    assert asyncio.run(stalled()).startswith(b"HTTP/1.1 408")
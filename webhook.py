@@ -0,0 +1,251 @@
+# webhook.py
+"""
+Режим webhook и параллельная обработка апдейтов.
+
+Режим выбирается в .env:
+
+    BOT_MODE=polling             polling | webhook
+    WEBHOOK_URL=https://bot.example.com/telegram   публичный адрес для setWebhook
+    WEBHOOK_LISTEN=0.0.0.0
+    WEBHOOK_PORT=8443
+    WEBHOOK_SECRET=...           обязателен; сверяется с X-Telegram-Bot-Api-Secret-Token
+    UPDATE_CONCURRENCY=32        апдейтов в обработке одновременно (1 — по одному)
+
+Апдейты разных пользователей обрабатываются параллельно, а апдейты одного
+пользователя — строго по очереди, поэтому состояние ConversationHandler и
+user_data не гоняются между собой.
+
+Встроенный HTTP-сервер — на asyncio, как и /metrics: он принимает только
+POST на путь из WEBHOOK_URL с верным секретом, кладёт апдейт в update_queue
+приложения и сразу отвечает 200. Без секрета любой, кто узнал адрес, мог бы
+прислать апдейт от имени администратора, поэтому режим webhook без
+WEBHOOK_SECRET не запускается. Тело принимается только с Content-Length до
+MAX_BODY; chunked и запросы без длины отклоняются, соединение закрывается.
+Заголовки и тело должны прийти за READ_TIMEOUT, иначе 408 и закрытие — так
+медленные клиенты не копят открытые соединения. При остановке сервер
+перестаёт принимать соединения, а Application.stop() дорабатывает уже
+принятые апдейты.
+
+Замер пропускной способности: python -m benchmarks.webhook_load
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+BOT_MODE           = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL        = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_LISTEN     = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT       = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_SECRET     = os.getenv('WEBHOOK_SECRET') or None
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '32'))
+
+MAX_BODY     = 1024 * 1024  # апдейт Telegram заметно меньше
+MAX_PENDING  = 10_000       # апдейтов, принятых в обработку (ждущих очереди или слота)
+IDLE_TIMEOUT = 75           # секунд держим keep-alive соединение без запросов
+READ_TIMEOUT = 10           # секунд на заголовки и тело после строки запроса
+
+
+def update_key(update):
+    """Ключ очерёдности: пользователь, иначе чат; None — порядок не важен."""
+    user = getattr(update, 'effective_user', None)
+    if user:
+        return user.id
+    chat = getattr(update, 'effective_chat', None)
+    return chat.id if chat else None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка с сохранением порядка внутри одного пользователя.
+
+    Application создаёт задачи в порядке поступления апдейтов, а asyncio.Lock
+    пропускает ожидающих по очереди (FIFO), так что апдейты одного
+    пользователя выполняются в том порядке, в котором пришли.
+
+    Слот из max_concurrent_updates берётся уже под замком пользователя:
+    апдейты, ждущие своей очереди, слотов не занимают, и болтливый
+    пользователь не задерживает остальных. Семафор самого PTB (его
+    process_update берёт его до do_process_update) поэтому задан на
+    MAX_PENDING и ограничивает только число принятых апдейтов.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max(max_concurrent_updates, MAX_PENDING))
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates должно быть положительным")
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks = {}  # ключ -> [Lock, сколько задач его ждёт или держит]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        key = update_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class WebhookServer:
+    """Минимальный HTTP/1.1-сервер (keep-alive) для апдейтов Telegram."""
+
+    def __init__(self, app, path: str, secret: str):
+        if not secret:
+            raise ValueError("WebhookServer требует секрет")
+        self.app = app
+        self.path = path
+        self.secret = secret
+        self.received = 0
+        self._server = None
+
+    async def start(self, host: str, port: int) -> None:
+        self._server = await asyncio.start_server(self._serve_client, host, port)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, method: str, path: str, headers: dict, body: bytes) -> str:
+        if path != self.path:
+            return "404 Not Found"
+        if method != "POST":
+            return "405 Method Not Allowed"
+        token = headers.get('x-telegram-bot-api-secret-token', '')
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            return "403 Forbidden"
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Webhook: не удалось разобрать апдейт")
+            return "400 Bad Request"
+        self.received += 1
+        await self.app.update_queue.put(update)
+        return "200 OK"
+
+    @staticmethod
+    def _body_length(method: str, headers: dict):
+        """Длина тела или статус отказа (строка)."""
+        if 'transfer-encoding' in headers:
+            return "501 Not Implemented"
+        raw = headers.get('content-length')
+        if raw is None:
+            return "411 Length Required" if method == "POST" else 0
+        if not raw.isdigit():
+            return "400 Bad Request"
+        if int(raw) > MAX_BODY:
+            return "413 Payload Too Large"
+        return int(raw)
+
+    async def _read_request(self, reader, method: str):
+        """Заголовки и тело после строки запроса: (заголовки, тело или статус отказа)."""
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = self._body_length(method, headers)
+        if isinstance(length, str):
+            return headers, length
+        return headers, await reader.readexactly(length)
+
+    async def _serve_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), timeout=IDLE_TIMEOUT)
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(None, 2)
+                try:
+                    # один срок на весь запрос: медленный клиент не держит соединение вечно
+                    headers, body = await asyncio.wait_for(self._read_request(reader, method), timeout=READ_TIMEOUT)
+                except asyncio.TimeoutError:
+                    headers, body = {}, "408 Request Timeout"
+
+                if isinstance(body, str):
+                    # тело не прочитать надёжно — дальше в потоке мусор, закрываем
+                    status, keep_alive = body, False
+                else:
+                    status = await self._handle(method, urlsplit(path).path, headers, body)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(app, stop: asyncio.Event) -> None:
+    path = urlsplit(WEBHOOK_URL).path or "/"
+    server = WebhookServer(app, path, WEBHOOK_SECRET)
+
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        await app.bot.set_webhook(
+            WEBHOOK_URL, secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES, max_connections=100,
+        )
+        await app.start()
+        await server.start(WEBHOOK_LISTEN, WEBHOOK_PORT)
+        logger.info(f"Webhook: слушаем {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{path}")
+
+        await stop.wait()
+
+        # новые апдейты Telegram придержит у себя и отдаст после перезапуска
+        logger.info("Webhook: остановка, дорабатываем принятые апдейты…")
+        await server.stop()
+        await app.stop()
+    finally:
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+
+def run_webhook(app) -> None:
+    """Аналог app.run_polling() для режима webhook; останавливается по SIGINT/SIGTERM."""
+    if not WEBHOOK_URL:
+        raise RuntimeError("BOT_MODE=webhook требует WEBHOOK_URL в .env")
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("BOT_MODE=webhook требует WEBHOOK_SECRET в .env")
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await _serve(app, stop)
+
+    asyncio.run(main())